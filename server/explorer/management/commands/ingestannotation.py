@@ -0,0 +1,66 @@
+"""
+Copyright 2016, Cisco Systems, Inc
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+@author: Pravin Gohite, Cisco Systems, Inc.
+"""
+
+import sys
+import gzip
+from django.core.management.base import BaseCommand
+import explorer.utils.annotations as annotations
+
+
+class Command(BaseCommand):
+    help = 'Ingest annotation layer (coverage etc.) from a JSON lines file'
+
+    def open(self, path):
+        """ Open input file, '-' for stdin, .gz files are decompressed """
+        if path == '-':
+            return sys.stdin
+        if path.endswith('.gz'):
+            return gzip.open(path, 'rb')
+        return open(path, 'r')
+
+    def handle(self, *args, **options):
+        annotate = {}
+        for pair in options['annotate'] or []:
+            if '=' not in pair:
+                self.stdout.write("Failed: Invalid attribute %s, expected name=value !!" % pair)
+                return
+            key, value = pair.split('=', 1)
+            annotate[key] = value
+
+        f = self.open(options['file'])
+        try:
+            count, modules = annotations.ingest(options['layer'], f, annotate,
+                                                not options['no_propagate'])
+        except ValueError as e:
+            self.stdout.write("Failed: %s" % e)
+            return
+        finally:
+            if f is not sys.stdin:
+                f.close()
+        self.stdout.write("Ingested %d xpaths of %d modules into layer %s" % (count, modules, options['layer']))
+
+    def add_arguments(self, parser):
+        parser.add_argument('--layer', nargs='?', type=str, required=True, help="Annotation layer name (eg. covered)")
+
+        parser.add_argument('--file', nargs='?', default='-', help="JSON lines file (.gz allowed), - for stdin")
+
+        # attributes set on every xpath unless file header overrides them
+        parser.add_argument('--annotate', action='append', help="Attribute name=value, may be repeated")
+
+        parser.add_argument('--no-propagate', action='store_true', default=False,
+                            help="Do not annotate ancestors of listed xpaths")
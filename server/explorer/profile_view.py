@@ -83,6 +83,7 @@ def _build_collection_profile(p):
 def profile_handler(request):
     """ HTTP request handler for profile request """
 
+    fmt = Response.format(request)
     profiles = ET.Element('profiles')
     if request.user.is_authenticated():
         uid = request.user.id
@@ -96,4 +97,5 @@ def profile_handler(request):
         for e in entries:
             profile = _build_collection_profile(e)
             profiles.append(profile)
-    return HttpResponse(Response.success('profile', 'ok', xml=profiles))
+    return HttpResponse(Response.success('profile', 'ok', xml=profiles, fmt=fmt),
+                        content_type=Response.content_type(fmt))
@@ -21,12 +21,16 @@ from explorer import views, profile_view
 
 urlpatterns = [
     url(r'^modules', views.module_handler, name='module_handler'),
+    url(r'^descriptions', views.descriptions_handler, name='descriptions_handler'),
+    url(r'^annotation', views.annotation_handler, name='annotation_handler'),
     url(r'^login', views.login_handler, name='login_handler'),
     url(r'^session', views.session_handler, name='session_handler'),
     url(r'^upload', views.upload_handler, name='upload_handler'),
     url(r'^admin', views.admin_handler, name='admin_handler'),
     url(r'^netconf', views.request_handler, name='request_handler'),
+    url(r'^generate', views.generate_handler, name='generate_handler'),
     url(r'^schema', views.schema_handler, name='schema_handler'),
     url(r'^userprofiles', profile_view.profile_handler, name='profile_handler'),
     url(r'^search', views.search_handler, name='search_handler'),
+    url(r'^complete', views.complete_handler, name='complete_handler'),
 ]
@@ -22,13 +22,18 @@ import logging
 from collections import OrderedDict
 import lxml.etree as ET
 from django.template.loader import render_to_string
-from explorer.utils.netconf import gen_netconf
+from explorer.utils.netconf import gen_netconf, gen_netconf_bulk, gen_netconf_task, parse_table
 from explorer.utils.restconf import gen_restconf
 from explorer.utils.runner import NCClient, RestClient
 from explorer.utils.ncparse import NetconfParser
+from explorer.utils.misc import ServerSettings
+import explorer.utils.workers as workers
 
 from ydk.app_maker import YdkAppMaker
 
+# maximum number of payloads generated by one worker task
+_batch_task_size = 64
+
 class Adapter(object):
     """ Class adapter for NCClient """
     @staticmethod
@@ -156,10 +161,84 @@ class Adapter(object):
         else:
             rpc = Adapter._gen_rpc(username, request)
 
-        logging.debug('gen_rpc: Generated : \n' + rpc)
+        if rpc is not None and logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug('gen_rpc: Generated : \n' + ET.tostring(rpc, pretty_print=True))
 
         ''' returns xml '''
-        return ET.fromstring(rpc, parser=ET.XMLParser(remove_blank_text=True))
+        return rpc
+
+    @staticmethod
+    def gen_rpc_bulk(username, payload, table, chunk=None):
+        """
+        Generate Netconf RPCs for a template payload and a value table
+        (CSV or JSON column arrays), see netconf.gen_netconf_bulk.
+        Raises ValueError for invalid payload or table.
+        """
+        request = ET.fromstring(payload)
+        if request.get('protocol', 'netconf') != 'netconf':
+            raise ValueError('Bulk generation is supported for netconf only')
+
+        columns = parse_table(table)
+        if chunk is None:
+            chunk = ServerSettings.rpc_bulk_chunk_size()
+
+        rpcs = gen_netconf_bulk(username, request, columns, chunk)
+        reply = ET.Element('rpcs')
+        reply.set('entries', str(max([len(values) for values in columns.values()] or [0])))
+        reply.extend(rpcs)
+        return reply
+
+    @staticmethod
+    def gen_rpc_batch(username, entries):
+        """
+        Generate RPCs for a list of (name, payload text) in one pass.
+        Netconf xpath payloads are grouped by the modules they use and
+        generated in batches across the worker pool, restconf payloads
+        are generated here and other payloads are returned as is.
+
+        Returns: <rpcs> element with an <entry name=".."> per payload in
+        order, entry has an error attribute if generation failed
+        """
+        reply = ET.Element('rpcs')
+        groups = OrderedDict()
+        for name, payload in entries:
+            entry = ET.SubElement(reply, 'entry')
+            entry.set('name', name)
+            try:
+                request = ET.fromstring(payload)
+            except ET.XMLSyntaxError as e:
+                entry.set('error', str(e))
+                continue
+
+            if request.get('format', 'raw') != 'xpath':
+                entry.append(request)
+            elif request.get('protocol', None) == 'restconf':
+                try:
+                    entry.text = Adapter.gen_rpc(username, payload)
+                except Exception as e:
+                    logging.exception('gen_rpc_batch: Failed to generate restconf RPC')
+                    entry.set('error', str(e) or e.__class__.__name__)
+            else:
+                modules = set(node.get('path', '').split('/')[0] for node in request.iter('node'))
+                groups.setdefault(tuple(sorted(modules)), []).append((len(reply) - 1, payload))
+
+        tasks = []
+        for payloads in groups.values():
+            for start in range(0, len(payloads), _batch_task_size):
+                tasks.append((username, payloads[start:start + _batch_task_size]))
+
+        for results in workers.imap(gen_netconf_task, tasks):
+            for position, rpc, error in results:
+                if rpc is None:
+                    reply[position].set('error', error)
+                elif isinstance(rpc, basestring):
+                    # serialized by worker process
+                    reply[position].append(ET.fromstring(rpc))
+                else:
+                    reply[position].append(rpc)
+
+        logging.debug('gen_rpc_batch: Generated %d entries in %d tasks' % (len(reply), len(tasks)))
+        return reply
 
     @staticmethod
     def get_ydk_def_names(python_ydk_defs):
@@ -216,7 +295,8 @@ class Adapter(object):
             logging.error('gen_ydk_script: Invalid RPC Generated')
             return None
 
-        logging.debug('gen_ydk_script: generated rpc : \n' + rpc)
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug('gen_ydk_script: generated rpc : \n' + ET.tostring(rpc, pretty_print=True))
 
         # currently we only support Netconf service provider and CRUD services
         parser = NetconfParser(rpc)
@@ -350,7 +430,10 @@ class Adapter(object):
 
     @staticmethod
     def _gen_rpc(username, request, mode = ''):
-        """ Wrapper for rest & netconf module """
+        """
+        Wrapper for rest & netconf module, returns list of restconf
+        requests or netconf RPC element
+        """
         protocol = request.get('protocol', '')
         if mode == '': mode = request.get('operation', '')
 
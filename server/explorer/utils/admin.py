@@ -16,12 +16,15 @@
 import os
 import glob
 import logging
+import binascii
 import lxml.etree as ET
 from django.conf import settings
 from explorer.models import User, UserProfile
 from explorer.utils.yang import Compiler
 from explorer.utils.dygraph import DYGraph
 from explorer.utils.misc import ServerSettings
+import explorer.utils.cxb as cxb
+import explorer.utils.store as store
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -95,6 +98,40 @@ class ModuleAdmin:
                 modules.append(module)
         return modules
 
+    @staticmethod
+    def get_generation(username):
+        """
+        Return generation of user's module set, caches of results derived
+        from user modules are keyed on it.
+        """
+        try:
+            with open(ServerSettings.generation_path(username), 'r') as f:
+                return f.read().strip()
+        except (IOError, OSError):
+            return '0'
+
+    @staticmethod
+    def bump_generation(username):
+        """
+        Start a new generation of user's module set, must be called after
+        modules are changed. Generation is a counter with a random suffix
+        so that concurrent bumps never reuse an old generation.
+        """
+        path = ServerSettings.generation_path(username)
+        count = ModuleAdmin.get_generation(username).split('-')[0]
+        count = int(count) + 1 if count.isdigit() else 1
+        generation = '%d-%s' % (count, binascii.hexlify(os.urandom(4)))
+        try:
+            if not os.path.exists(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(path + '.tmp', 'w') as f:
+                f.write(generation)
+            os.rename(path + '.tmp', path)
+        except (IOError, OSError):
+            logger.exception('ModuleAdmin.bump_generation: failed for ' + username)
+        logger.debug('ModuleAdmin.bump_generation: %s -> %s' % (username, generation))
+        return generation
+
     @staticmethod
     def admin_action(username, payload, request):
         logger.info("ModuleAdmin.admin_action: enter (%s -> %s)" % (username, request))
@@ -133,9 +170,13 @@ class ModuleAdmin:
 
             # delete yang and cxml files for delete request
             if request == 'delete':
-                for _type in [('cxml', '.xml'), ('yang', '.yang')]:
-                    _file = os.path.join('data', 'users', username, _type[0], name + _type[1])
-                    if os.path.exists(_file):
+                cxmlfile = os.path.join('data', 'users', username, 'cxml', name + '.xml')
+                yangfile = os.path.join('data', 'users', username, 'yang', name + '.yang')
+                files = [cxmlfile, yangfile]
+                if not store.is_reference(cxmlfile):
+                    files += Compiler.artifacts(cxmlfile)
+                for _file in files:
+                    if os.path.lexists(_file):
                         os.remove(_file)
                         modified = True
                         logging.debug('Deleted %s (user: %s)' % (_file, username))
@@ -152,6 +193,9 @@ class ModuleAdmin:
                 else:
                     logger.debug('User %s already subscribed to %s module ' % (username, module.text))
 
+        if request in ['delete', 'unsubscribe', 'subscribe']:
+            ModuleAdmin.bump_generation(username)
+
         # if any yang model modified, delete dependency file
         if modified:
             _file = os.path.join(ServerSettings.yang_path(username), 'dependencies.xml')
@@ -188,10 +232,14 @@ the server !!""")
 def is_browsable(username, module):
     cxml_path = os.path.join(ServerSettings.cxml_path(username), module + '.xml')
     browsable = False
-    if os.path.exists(cxml_path):
+    schema = cxb.load(cxml_path)
+    if schema is not None:
+        browsable = len(schema.children(0)) > 0
+        schema.close()
+    elif os.path.exists(cxml_path):
         try:
             root = ET.parse(cxml_path).getroot()
-            if root.find('node'):
+            if root.find('node') is not None:
                 browsable = True
         except:
             logger.error('is_browsable: Exception in parse -> ' + cxml_path)
@@ -12,51 +12,326 @@
     limitations under the License.
 
     @author: Pravin Gohite, Cisco Systems, Inc.
+
+    Annotation layers. Every <layer>.json file in annotation directory
+    (covered.json, deprecation.json ..) is a named layer:
+
+        {
+            "annotate": {"attr": "value"},      attributes for every path
+            "data": ["xpath", ..] or {"xpath": {"attr": "value"}, ..},
+            "propagate": true                   ancestors of listed paths
+        }                                       get their attributes too
+
+    A layer is compiled (once per file mtime & size) into per module maps
+    of node path below module root -> attributes, so xpaths may name the
+    module with or without revision. Overlay of selected layers is applied
+    by Cxml while it creates lazy nodes.
+
+    Large layers are ingested from a stream of JSON lines (see ingest)
+    into a <layer>.d directory with one compiled <module>.json map per
+    module, a request then only loads the maps of modules it shows.
+    Each line is a header object {"annotate": .., "propagate": ..}
+    (before any xpath), an object {"xpath": "..", "annotate": {..}}, a
+    json string or a plain xpath.
 """
 
+import io
 import os
 import json
-from django.core.cache import cache
+import glob
+import shutil
+import logging
+import tempfile
+from explorer.utils.lru import LRUCache
 from explorer.utils.misc import ServerSettings
-from explorer.utils.xpath import XPathTree
 
+_layer_cache_size = 64 * 1024 * 1024
+
+# cost of one compiled path for cache accounting
+_path_cost = 100
+
+# suffix of ingested layer directories and name of their description file
+LAYER_DIR = '.d'
+LAYER_META = 'layer.json'
+
+# maximum number of module spool files kept open during ingest
+_max_spools = 128
 
-def get_annotation_tree():
+
+def get_layers():
+    """ Returns dict of layer name -> layer file or ingested layer directory """
     ann_path = ServerSettings.annotation_path(None)
-    filename = os.path.join(ann_path, 'covered.json')
-    if not os.path.exists(filename):
+    layers = {}
+    for filename in glob.glob(os.path.join(ann_path, '*.json')):
+        layers[os.path.splitext(os.path.basename(filename))[0]] = filename
+    # ingested layer replaces a layer file of same name
+    for directory in glob.glob(os.path.join(ann_path, '*' + LAYER_DIR)):
+        if os.path.exists(os.path.join(directory, LAYER_META)):
+            layers[os.path.basename(directory)[:-len(LAYER_DIR)]] = directory
+    return layers
+
+
+def _selected(layers):
+    """ Returns [(name, filename, tag)] of existing layers, all if layers is None """
+    available = get_layers()
+    if layers is None:
+        layers = sorted(available)
+
+    selected = []
+    for name in layers:
+        filename = available.get(name, None)
+        if filename is None:
+            continue
+        try:
+            if os.path.isdir(filename):
+                # description file is replaced with every ingest
+                st = os.stat(os.path.join(filename, LAYER_META))
+            else:
+                st = os.stat(filename)
+        except OSError:
+            continue
+        selected.append((name, filename, (st.st_mtime, st.st_size, st.st_ino)))
+    return selected
+
+
+def get_annotation_version(layers=None):
+    """ Returns version string of selected layers, empty if none is installed """
+    return ','.join('%s:%r-%d-%d' % ((name,) + tag) for name, _, tag in _selected(layers))
+
+
+def _entry(xpath, attrib, default):
+    """ Returns (module, path below module, attributes) or None """
+    xpath = xpath.strip()
+    if not xpath:
+        return None
+    if attrib:
+        merged = dict(default)
+        merged.update(attrib)
+    else:
+        merged = default
+    if not merged:
         return None
+    module, _, path = xpath.partition('/')
+    return module.split('@')[0], path, merged
+
+
+def _add(paths, path, attrib, propagate):
+    """ Add compiled entry, paths must be added in sorted order """
+    if propagate:
+        paths.setdefault('', attrib)
+        start = path.find('/')
+        while start != -1:
+            paths.setdefault(path[:start], attrib)
+            start = path.find('/', start + 1)
+    paths.setdefault(path, attrib)
+
 
-    tree = cache.get('ui_ann', None)
-    if tree is None:
-        tree = XPathTree('/', None)
-        with open(filename, 'r') as f:
-            profile = json.load(f)
-            for line in profile.get('data', []):
-                tree.insert(line, profile.get('annotate', None))
-            cache.set('ui_ann', tree)
+def compile_layer(filename):
+    """ Returns dict of module -> {relative path: attributes} for a layer file """
+    with open(filename, 'r') as f:
+        profile = json.load(f)
+
+    default = profile.get('annotate', None) or {}
+    propagate = profile.get('propagate', True)
+    data = profile.get('data', [])
+    if isinstance(data, dict):
+        items = data.items()
     else:
-        print 'From cache..'
-    return tree
+        items = [(xpath, None) for xpath in data]
+
+    modules = {}
+    # sorted, so an explicit entry for an ancestor wins over propagation
+    for xpath, attrib in sorted(items):
+        entry = _entry(xpath, attrib, default)
+        if entry is not None:
+            _add(modules.setdefault(entry[0], {}), entry[1], entry[2], propagate)
+    return modules
+
 
+def _parse_line(line):
+    """ Returns (xpath, attributes) or (None, header) for an ingest line """
+    if isinstance(line, bytes):
+        line = line.decode('utf-8')
+    line = line.strip()
+    if not line:
+        return None, None
+    if line[0] not in '{"':
+        return line, None
+    obj = json.loads(line)
+    if not isinstance(obj, dict):
+        return obj, None
+    if 'xpath' in obj:
+        return obj['xpath'], obj.get('annotate', None)
+    return None, obj
 
-def annotate(nodes, tree=None):
+
+def ingest(name, lines, annotate=None, propagate=True):
     """
-    Args:
-        nodes: list lxml element tree nodes with lazy tree instance
-    Returns:
-        Annotated nodes with attribute and value specified in annotation file
+    Compile annotation layer name from an iterable of lines into an
+    ingested layer directory, replacing existing layer of same name.
+    Lines are spooled to one file per module, so memory use is bounded
+    by the largest module and not by the input. Each module map is
+    written as {"attribs": [attributes], "paths": {path: attribs index}}.
+
+    Returns: (number of xpaths, number of modules)
     """
-    if not tree:
-        tree = get_annotation_tree()
-
-    if tree and nodes:
-        for node in nodes:
-            xpath = node.get('path', '')
-            instance = tree.search(xpath)
-            if not instance:
+    ann_path = ServerSettings.annotation_path(None)
+    if not name or os.path.basename(name) != name or name.startswith('.'):
+        raise ValueError('Invalid layer name %s' % name)
+    if not os.path.exists(ann_path):
+        os.makedirs(ann_path)
+
+    default = annotate or {}
+    workdir = tempfile.mkdtemp(prefix='.' + name, dir=ann_path)
+    modules = set()
+    spools = {}
+    try:
+        count = 0
+        for line in lines:
+            xpath, attrib = _parse_line(line)
+            if xpath is None:
+                if attrib is not None and not count:
+                    default = attrib.get('annotate', default) or {}
+                    propagate = attrib.get('propagate', propagate)
+                continue
+            module, _, path = xpath.strip().partition('/')
+            module = module.split('@')[0]
+            if not module or os.path.basename(module) != module:
                 continue
-            for attr, value in instance.attrib.items():
-                node.set(attr, value)
-            annotate(list(node), tree)
-    return nodes
\ No newline at end of file
+            spool = spools.get(module, None)
+            if spool is None:
+                if len(spools) >= _max_spools:
+                    for spool in spools.values():
+                        spool.close()
+                    spools.clear()
+                spool = spools[module] = io.open(os.path.join(workdir, module + '.spool'), 'a', encoding='utf-8')
+                modules.add(module)
+            if attrib:
+                spool.write(u'%s\t%s\n' % (path, json.dumps(attrib)))
+            else:
+                spool.write(path + u'\n')
+            count += 1
+
+        for spool in spools.values():
+            spool.close()
+        spools.clear()
+
+        for module in modules:
+            spoolname = os.path.join(workdir, module + '.spool')
+            with io.open(spoolname, 'r', encoding='utf-8') as f:
+                entries = sorted(line.rstrip(u'\n').partition(u'\t')[::2] for line in f)
+            os.remove(spoolname)
+
+            # attributes are stored once, paths refer to them by index
+            attribs = [default]
+            index = {u'': 0}
+            paths = {}
+            for path, attrib in entries:
+                if attrib not in index:
+                    merged = dict(default)
+                    merged.update(json.loads(attrib))
+                    index[attrib] = len(attribs)
+                    attribs.append(merged)
+                if attribs[index[attrib]]:
+                    _add(paths, path, index[attrib], propagate)
+            with open(os.path.join(workdir, module + '.json'), 'w') as f:
+                f.write(json.dumps({'attribs': attribs, 'paths': paths}, separators=(',', ':')))
+
+        with open(os.path.join(workdir, LAYER_META), 'w') as f:
+            json.dump({'name': name, 'xpaths': count, 'modules': sorted(modules),
+                       'annotate': default, 'propagate': propagate}, f)
+
+        # swap in new layer directory
+        target = os.path.join(ann_path, name + LAYER_DIR)
+        if os.path.exists(target):
+            old = tempfile.mkdtemp(prefix='.' + name, dir=ann_path)
+            os.rename(target, os.path.join(old, 'layer'))
+            os.rename(workdir, target)
+            shutil.rmtree(old, ignore_errors=True)
+        else:
+            os.rename(workdir, target)
+    except:
+        for spool in spools.values():
+            spool.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+        raise
+
+    logging.debug('annotation: Ingested %d xpaths of %d modules into %s' % (count, len(modules), name))
+    return count, len(modules)
+
+
+_layer_cache = LRUCache(_layer_cache_size, 'annotation')
+
+
+def _load_slice(source, tag, module):
+    """ Returns compiled map of a module in a layer file or ingested layer """
+    if not os.path.isdir(source):
+        return _load_layer(source, tag).get(module, {})
+
+    key = ('slice', source, module)
+    paths = _layer_cache.get(key, tag)
+    if paths is None:
+        try:
+            with open(os.path.join(source, module + '.json'), 'r') as f:
+                data = json.loads(f.read())
+            attribs = data['attribs']
+            paths = dict((path, attribs[i]) for path, i in data['paths'].items())
+        except (IOError, OSError, ValueError, KeyError, IndexError):
+            paths = {}
+        _layer_cache.put(key, paths, _path_cost * len(paths), tag)
+    return paths
+
+
+def _load_layer(filename, tag):
+    layer = _layer_cache.get(filename, tag)
+    if layer is None:
+        try:
+            layer = compile_layer(filename)
+        except (IOError, OSError, ValueError, AttributeError):
+            logging.exception('annotation: Failed to compile %s' % filename)
+            layer = {}
+        cost = _path_cost * sum(len(paths) for paths in layer.values())
+        _layer_cache.put(filename, layer, cost, tag)
+    return layer
+
+
+def get_overlay(module, layers=None):
+    """
+    Returns dict of node path below module root -> attributes of a module
+    for selected layers (all layers if None), later layers override
+    earlier ones. Returns None if no selected layer annotates the module.
+    """
+    module = module.split('@')[0]
+    selected = _selected(layers)
+    if not selected:
+        return None
+
+    key = ('overlay', module) + tuple(filename for _, filename, _ in selected)
+    tag = tuple(tag for _, _, tag in selected)
+    overlay = _layer_cache.get(key, tag)
+    if overlay is not None:
+        return overlay or None
+
+    maps = [_load_slice(filename, t, module) for _, filename, t in selected]
+    maps = [paths for paths in maps if paths]
+    if len(maps) == 1:
+        overlay = maps[0]
+    else:
+        overlay = {}
+        for paths in maps:
+            for path, attrib in paths.items():
+                if path in overlay:
+                    merged = dict(overlay[path])
+                    merged.update(attrib)
+                    overlay[path] = merged
+                else:
+                    overlay[path] = attrib
+
+    # single layer overlay is shared with layer or slice entry, account only merges
+    _layer_cache.put(key, overlay, _path_cost * len(overlay) if len(maps) > 1 else 1, tag)
+    return overlay or None
+
+
+def get_cache_stats():
+    """ Returns compiled annotation layer cache counters """
+    return _layer_cache.stats()
@@ -143,18 +143,34 @@ class Collection(object):
             logging.error('Collection entry not found')
             return None
 
-        data = None
-        with open(_file, 'r') as f:
-            data = f.read()
-            data = data.replace('&gt;','>')
-            data = data.replace('&lt;','<')
-            payload = ET.fromstring(data)
-
-        if data is None:
-            logging.error('Collection entry is empty')
-            return None
+        data = Collection._read(_file)
+        payload = ET.fromstring(data)
 
         fmt = payload.get('format', 'raw')
         if fmt == 'xpath':
             return Adapter.gen_rpc(username, data)
         return payload
+
+    @staticmethod
+    def load_batch(username, cname):
+        """ Load all entries of a collection, RPCs are generated in one pass """
+
+        if not Col.objects.filter(name=cname).exists():
+            logging.debug('Collection %s does not exists !!' % cname)
+            return None
+
+        path = os.path.join('data', 'collections', cname)
+        entries = []
+        for _file in sorted(glob.glob(os.path.join(path, '*.xml'))):
+            name = os.path.splitext(os.path.basename(_file))[0]
+            entries.append((name, Collection._read(_file)))
+        return Adapter.gen_rpc_batch(username, entries)
+
+    @staticmethod
+    def _read(_file):
+        """ Returns payload text of a collection entry file """
+        with open(_file, 'r') as f:
+            data = f.read()
+            data = data.replace('&gt;','>')
+            data = data.replace('&lt;','<')
+        return data
@@ -0,0 +1,165 @@
+"""
+    Copyright 2016, Cisco Systems, Inc
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+
+    @author: Pravin Gohite, Cisco Systems, Inc.
+
+    Xpath autocomplete. Every module has an in-memory prefix trie of its
+    schema path segments, each trie node keeps its child names sorted so
+    that prefix matches are a bisect range. Trie nodes are materialized
+    from cxml on first visit, so memory is proportional to the part of
+    the model users actually type into.
+"""
+
+import os
+import heapq
+import bisect
+import lxml.etree as ET
+from explorer.utils.lru import LRUCache
+from explorer.utils.admin import ModuleAdmin
+import explorer.utils.cxml as cxml
+
+_trie_cache_size = 32 * 1024 * 1024
+
+# cost of one materialized trie node for cache accounting
+_node_cost = 200
+
+
+class TrieNode(object):
+    """ Schema node with sorted child names """
+    __slots__ = ('path', 'names', 'attrib', 'children')
+
+    def __init__(self, path, element):
+        self.path = path
+        self.children = {}
+        self.attrib = {}
+        for child in element:
+            if child.tag != 'node':
+                continue
+            name = child.get('name', '')
+            self.attrib[name] = (child.get('type', ''), child.get('access', ''))
+        self.names = sorted(self.attrib)
+
+
+class ModuleTrie(object):
+    """ Lazily materialized prefix trie of one module """
+    def __init__(self, filename):
+        self.filename = filename
+        self.modulename = os.path.splitext(os.path.basename(filename))[0]
+        self.size = 0
+        self.root = self._load(self.modulename)
+
+    def _load(self, path):
+        # parsed module is shared with explorer tree through cxml cache
+        element = cxml.get_cxml(self.filename).get_node(path)
+        if element is None:
+            return None
+        self.size += 1
+        return TrieNode(path, element)
+
+    def find(self, names):
+        """ Returns trie node for list of segment names below module """
+        node = self.root
+        for name in names:
+            if node is None or name not in node.attrib:
+                return None
+            child = node.children.get(name, None)
+            if child is None:
+                child = self._load(node.path + '/' + name)
+                if child is None:
+                    return None
+                node.children[name] = child
+            node = child
+        return node
+
+    def complete(self, names, prefix, limit):
+        """
+        Returns list of (name, path, type, access) of next segments
+        after names starting with prefix (ranked by length, name),
+        followed by names containing prefix.
+        """
+        node = self.find(names)
+        if node is None:
+            return []
+
+        lo = bisect.bisect_left(node.names, prefix)
+        hi = bisect.bisect_left(node.names, prefix + u'\uffff')
+        ranked = heapq.nsmallest(limit, node.names[lo:hi], key=lambda n: (len(n), n))
+        if len(ranked) < limit and prefix:
+            infix = [n for n in node.names if prefix in n and not n.startswith(prefix)]
+            ranked += heapq.nsmallest(limit - len(ranked), infix, key=lambda n: (n.index(prefix), len(n), n))
+
+        return [(name, node.path + '/' + name) + node.attrib[name] for name in ranked]
+
+
+_trie_cache = LRUCache(_trie_cache_size, 'complete')
+
+
+def get_trie(filename):
+    """ Returns ModuleTrie for a cxml file from cache """
+    path = os.path.realpath(filename)
+    st = os.stat(path)
+    tag = (st.st_mtime, st.st_size)
+    trie = _trie_cache.get(path, tag)
+    if trie is None:
+        trie = ModuleTrie(filename)
+    # re-account as trie grows with every completion
+    _trie_cache.put(path, trie, trie.size * _node_cost, tag)
+    return trie
+
+
+def complete(username, xpath, limit=20):
+    """
+    Complete partial xpath (module/node1/par) in user modules
+    Args:
+        username: Request username
+        xpath: Partial xpath, text after last '/' is the prefix
+
+    Returns: An XML object with completions
+    """
+    response = ET.Element('completions')
+    names = xpath.split('/')
+    prefix = names.pop()
+
+    if not names:
+        # complete module names
+        modules = sorted(m.split('@')[0] for m in ModuleAdmin.get_modulelist(username))
+        matches = [m for m in modules if m.startswith(prefix)]
+        for name in heapq.nsmallest(limit, matches, key=lambda n: (len(n), n)):
+            node = ET.Element('node')
+            node.set('name', name)
+            node.set('path', name)
+            node.set('type', 'module')
+            response.append(node)
+        return True, response
+
+    filename = ModuleAdmin.cxml_path(username, names[0])
+    if filename is None:
+        return False, 'Module %s not found' % names[0]
+
+    trie = get_trie(filename)
+    for name, path, _type, access in trie.complete(names[1:], prefix, limit):
+        node = ET.Element('node')
+        node.set('name', name)
+        node.set('path', names[0] + path[len(trie.modulename):])
+        node.set('type', _type)
+        if access:
+            node.set('access', access)
+        response.append(node)
+    return True, response
+
+
+def get_cache_stats():
+    """ Returns autocomplete trie cache counters """
+    return _trie_cache.stats()
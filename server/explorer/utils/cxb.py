@@ -0,0 +1,285 @@
+"""
+    Copyright 2016, Cisco Systems, Inc
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+
+    @author: Pravin Gohite, Cisco Systems, Inc.
+
+    Compact binary form of compiled cxml (.cxb), written next to cxml
+    file at compile time. CXML stays the interchange format, cxb is a
+    read-only artifact which is memory mapped by consumers.
+
+    Layout (little endian):
+        header      : magic, version, counts and section offsets
+        strings     : (offset, length) per string id + utf-8 blob,
+                      string id 0 is empty string (attribute not set)
+        nodes       : fixed size records in breadth first order,
+                      (parent, first_child, child_count) + one string id
+                      per attribute column, children of a node are
+                      contiguous records
+        namespaces  : (prefix, module, import, uri) string ids
+        descriptions: (offset, length) per node + utf-8 blob, kept apart
+                      from strings so that they are paged in only when
+                      a description is requested
+"""
+
+import os
+import mmap
+import struct
+import logging
+import lxml.etree as ET
+from collections import deque
+
+MAGIC = b'CXB1'
+VERSION = 2
+
+COLUMNS = ('name', 'type', 'access', 'datatype', 'key', 'default', 'values',
+           'mandatory', 'is_key', 'presence', 'prefix')
+NS_COLUMNS = ('prefix', 'module', 'import')
+
+_header = struct.Struct('<4sHHQIIIIIIIII')
+_string = struct.Struct('<II')
+_node = struct.Struct('<iII' + 'I' * len(COLUMNS))
+_namespace = struct.Struct('<' + 'I' * (len(NS_COLUMNS) + 1))
+
+
+def cxb_path(filename):
+    """ Returns path of binary artifact for a cxml file """
+    return os.path.splitext(os.path.realpath(filename))[0] + '.cxb'
+
+
+def _description(element):
+    desc = element.find('description')
+    if desc is not None and desc.text:
+        return desc.text.strip()
+    return ''
+
+
+def compile_cxb(filename):
+    """
+    Build binary artifact from cxml file, returns path of artifact or
+    None on failure.
+    """
+    target = cxb_path(filename)
+    try:
+        root = ET.parse(filename).getroot()
+    except:
+        logging.error('compile_cxb: Failed to parse %s' % filename)
+        return None
+
+    strings = {'': 0}
+    slist = ['']
+
+    def add_string(text):
+        sid = strings.get(text, None)
+        if sid is None:
+            sid = len(slist)
+            strings[text] = sid
+            slist.append(text)
+        return sid
+
+    # breadth first numbering, children of a node are contiguous
+    elements = [root]
+    parents = [-1]
+    first = []
+    count = []
+    queue = deque([0])
+    while queue:
+        index = queue.popleft()
+        children = [c for c in elements[index] if c.tag == 'node']
+        first.append(len(elements))
+        count.append(len(children))
+        for child in children:
+            queue.append(len(elements))
+            elements.append(child)
+            parents.append(index)
+
+    nodes = []
+    for index, element in enumerate(elements):
+        row = [parents[index], first[index], count[index]]
+        for column in COLUMNS:
+            row.append(add_string(element.get(column, '')))
+        nodes.append(_node.pack(*row))
+
+    namespaces = []
+    for ns in root:
+        if ns.tag != 'namespace':
+            continue
+        row = [add_string(ns.get(column, '')) for column in NS_COLUMNS]
+        row.append(add_string(ns.text or ''))
+        namespaces.append(_namespace.pack(*row))
+
+    def pack_blobs(texts):
+        blobs = [text.encode('utf-8') for text in texts]
+        index = []
+        offset = 0
+        for blob in blobs:
+            index.append(_string.pack(offset, len(blob)))
+            offset += len(blob)
+        return b''.join(index), b''.join(blobs)
+
+    index, blobs = pack_blobs(slist)
+    desc_index, desc_blobs = pack_blobs([_description(element) for element in elements])
+
+    string_index = _header.size
+    string_data = string_index + len(index)
+    node_offset = string_data + len(blobs)
+    ns_offset = node_offset + _node.size * len(nodes)
+    desc_index_offset = ns_offset + _namespace.size * len(namespaces)
+    desc_data_offset = desc_index_offset + len(desc_index)
+
+    header = _header.pack(MAGIC, VERSION, len(COLUMNS), os.path.getsize(filename),
+                          len(nodes), len(slist), len(namespaces),
+                          string_index, string_data, node_offset, ns_offset,
+                          desc_index_offset, desc_data_offset)
+
+    tmpfile = target + '.tmp'
+    try:
+        with open(tmpfile, 'wb') as f:
+            f.write(header)
+            f.write(index)
+            f.write(blobs)
+            f.write(b''.join(nodes))
+            f.write(b''.join(namespaces))
+            f.write(desc_index)
+            f.write(desc_blobs)
+        os.rename(tmpfile, target)
+    except (IOError, OSError):
+        logging.exception('compile_cxb: Failed to write %s' % target)
+        if os.path.exists(tmpfile):
+            os.remove(tmpfile)
+        return None
+
+    logging.debug('compile_cxb: %s -> %d nodes, %d strings' % (target, len(nodes), len(slist)))
+    return target
+
+
+class CompiledSchema(object):
+    """
+    Read only, memory mapped view of a cxb artifact. Nodes are
+    addressed by integer id, root node id is 0.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self._strings = {}
+        with open(filename, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            (magic, version, ncolumns, self.source_size, self.node_count,
+             self.string_count, self.ns_count, self._string_index,
+             self._string_data, self._node_offset, self._ns_offset,
+             self._desc_index, self._desc_data) = _header.unpack_from(self._map, 0)
+        except struct.error:
+            # truncated artifact, header does not fit in mapped file
+            self.close()
+            raise
+
+        if magic != MAGIC or version != VERSION or ncolumns != len(COLUMNS):
+            self.close()
+            raise ValueError('%s: unsupported cxb file' % filename)
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def string(self, sid):
+        """ Returns interned string for string id """
+        text = self._strings.get(sid, None)
+        if text is None:
+            offset, length = _string.unpack_from(self._map, self._string_index + sid * _string.size)
+            start = self._string_data + offset
+            text = self._map[start:start + length].decode('utf-8')
+            self._strings[sid] = text
+        return text
+
+    def description(self, node):
+        """ Returns description of a node, read from description table """
+        offset, length = _string.unpack_from(self._map, self._desc_index + node * _string.size)
+        start = self._desc_data + offset
+        return self._map[start:start + length].decode('utf-8')
+
+    def _record(self, node):
+        return _node.unpack_from(self._map, self._node_offset + node * _node.size)
+
+    def parent(self, node):
+        """ Returns parent node id, -1 for root """
+        return self._record(node)[0]
+
+    def children(self, node):
+        """ Returns list of child node ids """
+        record = self._record(node)
+        return range(record[1], record[1] + record[2])
+
+    def get(self, node, column, default=''):
+        """ Returns attribute value of a node """
+        sid = self._record(node)[3 + COLUMNS.index(column)]
+        return self.string(sid) if sid else default
+
+    def attrib(self, node):
+        """ Returns dictionary of all attributes set on a node """
+        record = self._record(node)
+        return dict((column, self.string(sid))
+                    for column, sid in zip(COLUMNS, record[3:]) if sid)
+
+    def element(self, node):
+        """ Returns cxml element of a node with its description, without child nodes """
+        record = self._record(node)
+        element = ET.Element('node')
+        for column, sid in zip(COLUMNS, record[3:]):
+            if sid:
+                element.set(column, self.string(sid))
+        desc = self.description(node)
+        if desc:
+            ET.SubElement(element, 'description').text = desc
+        return element
+
+    def find(self, path):
+        """ Returns node id for path (module/node1/node2) or None """
+        node = 0
+        for name in path.split('/')[1:]:
+            for child in self.children(node):
+                if self.get(child, 'name') == name:
+                    node = child
+                    break
+            else:
+                return None
+        return node
+
+    def namespaces(self):
+        """ Returns list of (prefix, module, import, uri) tuples """
+        result = []
+        for index in range(self.ns_count):
+            row = _namespace.unpack_from(self._map, self._ns_offset + index * _namespace.size)
+            result.append(tuple(self.string(sid) for sid in row))
+        return result
+
+
+def load(filename):
+    """
+    Returns CompiledSchema for a cxml file, None if artifact is missing
+    or older than cxml file.
+    """
+    target = cxb_path(filename)
+    try:
+        if os.path.getmtime(target) < os.path.getmtime(filename):
+            return None
+        schema = CompiledSchema(target)
+    except (OSError, IOError, ValueError, struct.error):
+        return None
+
+    if schema.source_size != os.path.getsize(filename):
+        schema.close()
+        return None
+    return schema
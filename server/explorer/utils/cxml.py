@@ -17,28 +17,139 @@ limitations under the License.
 """
 
 import os
+import re
+import copy
+import json
+import mmap
+import hashlib
 import logging
 import lxml.etree as ET
+import explorer.utils.cxb as cxb
+from explorer.utils.lru import LRUCache
+from explorer.utils.misc import ServerSettings
 
+# memory budget for second-level subtrees of a partially loaded module
+_subtree_cache_size = 16 * 1024 * 1024
 
-class Cxml:
+# cxml cache cost of a module loaded from compiled schema
+_schema_cost = 1024
+
+
+class Cxml(object):
     def __init__(self, filename):
         self.filename = filename
         self.modulename = os.path.splitext(os.path.basename(filename))[0]
+        self._tree = None
+        self._index = None
+        self._digest = None
+        self._partial = None
         if os.path.exists(filename):
-            logging.debug('Parsing %s' % filename)
-            try:
-                self.cxml = ET.parse(filename)
-            except:
-                self.cxml = None
-                logging.error('ET Failed to parse %s' % filename)
+            # modules are loaded one node at a time from compiled schema,
+            # huge modules without it one subtree at a time if possible
+            self._partial = load_schema(filename)
+            if self._partial is None and os.path.getsize(filename) >= ServerSettings.cxml_partial_size():
+                self._partial = load_offsets(filename)
+            if self._partial is not None:
+                logging.debug('Partial loading %s' % filename)
+            else:
+                self._parse()
         else:
-            self.cxml = None
             logging.error('File %s does not exists' % filename)
 
+    def _parse(self):
+        logging.debug('Parsing %s' % self.filename)
+        try:
+            self._tree = ET.parse(self.filename)
+        except:
+            self._tree = None
+            logging.error('ET Failed to parse %s' % self.filename)
+
+    @property
+    def cxml(self):
+        """ Parsed cxml tree, partially loaded module is parsed on first access """
+        if self._tree is None and self._partial is not None:
+            self._parse()
+            self._partial = None
+            # cache entry was charged for partial loading, charge the full tree
+            _cxml_cache.recost(os.path.realpath(self.filename), self, self.cost())
+        return self._tree
+
+    def valid(self):
+        """ Returns True if module is parsed or can be partially loaded """
+        return self._tree is not None or self._partial is not None
+
+    def cost(self):
+        """ Returns memory cost of this object for cxml cache """
+        if self._partial is not None:
+            return self._partial.cost()
+        return os.path.getsize(self.filename)
+
     def getroot(self):
         return self.cxml.getroot()
 
+    def _root(self):
+        """ Returns root node, only root attributes and namespaces if partially loaded """
+        if self._partial is not None:
+            return self._partial.find('')
+        return self.getroot()
+
+    def get_node(self, path):
+        """ Returns cxml element for path from parsed or partially loaded module """
+        if self._partial is not None:
+            return self._partial.find(path)
+        return self.find_node(path)
+
+    def get_digest(self):
+        """ Returns sha1 hex digest of cxml file content """
+        if self._partial is not None:
+            return self._partial.digest
+        if self._digest is None and self.cxml is not None:
+            self._digest = file_digest(self.filename)
+        return self._digest
+
+    def get_index(self):
+        """
+        Returns dictionary of slash joined node path (without module
+        name) to cxml element, built once per parsed module. Paths are
+        indexed with choice / case names as sent by client tree and
+        also without them (data path) if there is no conflict.
+        """
+        if self._index is not None:
+            return self._index
+
+        index = {'': self.getroot()}
+        aliases = {}
+        stack = [(self.getroot(), '', '')]
+        while stack:
+            element, path, datapath = stack.pop()
+            for child in element:
+                if child.tag != 'node':
+                    continue
+                name = child.get('name', '')
+                cpath = path + '/' + name if path else name
+                if child.get('type', '') in ['choice', 'case']:
+                    cdatapath = datapath
+                else:
+                    cdatapath = datapath + '/' + name if datapath else name
+                    if cdatapath != cpath:
+                        aliases.setdefault(cdatapath, child)
+                index.setdefault(cpath, child)
+                stack.append((child, cpath, cdatapath))
+
+        for path, element in aliases.items():
+            index.setdefault(path, element)
+        self._index = index
+        return index
+
+    def find_node(self, path):
+        """
+        Returns cxml element for path (module/node1/node2) or None
+        """
+        if self.cxml is None:
+            return None
+        elems = path.split('/', 1)
+        return self.get_index().get(elems[1] if len(elems) > 1 else '')
+
     def toxpath(self, path):
         if path:
             path_elems = path.split('/')
@@ -65,7 +176,7 @@ class Cxml:
             xpath = ''
         return xpath
 
-    def get_lazy_node_internal(self, cxml_element, base='', module_prefix=''):
+    def get_lazy_node_internal(self, cxml_element, base='', module_prefix='', lean=False, overlay=None):
         node = ET.Element('node')
         add_placeholder = True
 
@@ -79,7 +190,11 @@ class Cxml:
         try:
             desc = cxml_element.find('description')
             if desc is not None:
-                node.set('description', desc.text.strip())
+                if lean:
+                    # client fetches description on demand
+                    node.set('has_description', 'true')
+                else:
+                    node.set('description', desc.text.strip())
         except:
             pass
 
@@ -94,6 +209,13 @@ class Cxml:
                                                module_prefix)
             node.set('xpath_filter', xpath_filter)
 
+        if overlay:
+            # annotation layers, keyed by path below module (see annotations.get_overlay)
+            attrib = overlay.get(node.get('path').partition('/')[2], None)
+            if attrib:
+                for name, value in attrib.items():
+                    node.set(name, value)
+
         if add_placeholder:
             pnode = ET.Element('node')
             pnode.set('name', 'Loading ..')
@@ -102,22 +224,31 @@ class Cxml:
 
         return node
 
-    def get_lazy_node(self, path='', add_ns=True):
+    def get_lazy_node(self, path='', add_ns=True, depth=1, lean=False, overlay=None):
         """
         Returns yang explorer compatible lazy node xml. A lazy
         node only returns a cxml node which is requested. All
         other node along the path returned as _placeholder_
         nodes for on-demand loading in client tree.
+
+        With depth > 1, children of requested node are expanded up to
+        depth levels (breadth first) as long as total number of nodes
+        stays within lazy node budget, placeholders are left only at
+        the frontier.
+
+        In lean mode node descriptions are replaced by has_description
+        flag (see get_descriptions). Attributes in overlay (path ->
+        attributes) are set on created nodes.
         """
         logging.debug('get_lazy_node: ' + path)
         root = ET.Element('root')
-        if self.cxml is None:
+        if not self.valid():
             return root
 
-        cxml_root = self.getroot()
+        cxml_root = self._root()
 
         if path == '':
-            node = self.get_lazy_node_internal(cxml_root)
+            node = self.get_lazy_node_internal(cxml_root, lean=lean, overlay=overlay)
             nslist = [c.get('prefix') + ',' + c.text for c in cxml_root if c.tag == 'namespace']
             node.set('namespaces', '|'.join(nslist))
             node.set('name', self.modulename)
@@ -127,24 +258,60 @@ class Cxml:
         module_prefix = cxml_root.get('prefix', '')
 
         # move root node to requested node
-        elements = path.split('/')
-        for name in elements[1:]:
-            for child in cxml_root:
-                if child.get('name', '') == name:
-                    cxml_root = child
-                    break
+        cxml_root = self.get_node(path)
+        if cxml_root is None:
+            logging.error('get_lazy_node: %s not found' % path)
+            return root
 
+        frontier = []
         for child in cxml_root:
             if child.tag == 'node':
-                node = self.get_lazy_node_internal(child, path, module_prefix)
+                node = self.get_lazy_node_internal(child, path, module_prefix, lean, overlay)
                 root.append(node)
+                frontier.append((node, child))
 
             if child.tag == 'namespace' and add_ns:
+                # cxml tree is shared through cache, do not move its nodes
+                child = copy.deepcopy(child)
                 if cxml_root.get('prefix', '') == child.get('prefix'):
                     child.set('default', 'true')
                 root.append(child)
+
+        if depth > 1:
+            self._expand(frontier, depth - 1, module_prefix,
+                         ServerSettings.lazy_node_budget() - len(frontier), lean, overlay)
         return root
 
+    def _expand(self, frontier, depth, module_prefix, budget, lean=False, overlay=None):
+        """
+        Materialize placeholders of frontier nodes breadth first, a node
+        is expanded only if all of its children fit in the budget.
+        """
+        for _ in range(depth):
+            next_frontier = []
+            for node, element in frontier:
+                if len(node) == 0 or node[0].get('type') != '__yang_placeholder':
+                    continue
+
+                path = node.get('path')
+                if self._partial is not None:
+                    # partially loaded nodes do not carry their children
+                    element = self._partial.find(path)
+                    if element is None:
+                        continue
+
+                children = [c for c in element if c.tag == 'node']
+                if len(children) > budget:
+                    continue
+
+                budget -= len(children)
+                node.remove(node[0])
+                for child in children:
+                    cnode = self.get_lazy_node_internal(child, path, module_prefix, lean, overlay)
+                    node.append(cnode)
+                    next_frontier.append((cnode, child))
+            frontier = next_frontier
+
     def get_lazy_tree_one(self, path, value):
         """
         Returns yang explorer compatible lazy tree xml. A lazy
@@ -181,104 +348,357 @@ class Cxml:
 
         return tree
 
-    def get_lazy_tree(self, pathvalues):
+    def get_lazy_tree(self, pathvalues, lean=False, overlay=None):
         """
         Returns yang explorer compatible lazy tree xml. A lazy
         tree  returns a cxml nested tree from root to requested
         node.
 
         Other node along the path returned as _placeholder_
-        nodes for on-demand loading in client tree.
+        nodes for on-demand loading in client tree. Lean mode and
+        overlay are applied to created nodes as in get_lazy_node.
         """
 
         logging.debug('get_lazy_tree: Building lazy tree..')
 
-        plist = []
+        # merge requested paths into a tree of node names to expand
+        expand = {}
         vdict = {}
         for (path, value) in pathvalues:
-            plist.append(path.split('/'))
             vdict[path] = value
+            level = expand
+            for name in path.split('/'):
+                level = level.setdefault(name, {})
 
-        level = 0
-        logging.info(str(plist))
-
-        tree = self.get_lazy_node()
+        tree = self.get_lazy_node(lean=lean, overlay=overlay)
         tree = tree[0]
 
-        while True:
-            pending = []
-            for path_elems in plist:
-                if level >= len(path_elems):
-                    continue
-
-                cxpath = '/'.join(path_elems[:level + 1])
-                if cxpath not in pending:
-                    pending.append(cxpath)
-
-            if len(pending) == 0:
-                break
-
-            for cxpath in pending:
-                subtree = self.get_lazy_node(cxpath, False)
-                xpath = self.toxpath(cxpath)
+        cxml_root = self.getroot()
+        module_prefix = cxml_root.get('prefix', '')
+        path = tree.get('path')
+
+        # depth first merge of cxml tree and requested paths
+        stack = []
+        if path in expand:
+            stack.append((tree, cxml_root, path, expand[path]))
+
+        while stack:
+            node, cxml_node, path, level = stack.pop()
+            children = [(self.get_lazy_node_internal(child, path, module_prefix, lean, overlay), child)
+                        for child in cxml_node if child.tag == 'node']
+            if not children:
+                continue
 
-                if len(subtree) == 0:
-                    continue
+            node.remove(node[0])
+            for (child, cxml_child) in children:
+                values = vdict.get(child.get('path', ''), '')
+                if values is not None:
+                    for key in values:
+                        child.set(key, values[key])
+                node.append(child)
 
-                tree.find(xpath).remove(tree.find(xpath)[0])
-                for child in subtree:
-                    cpath = child.get('path', '')
-                    values = vdict.get(cpath, '')
-                    if values is not None:
-                        for key in values:
-                            child.set(key, values[key])
-                    tree.find(xpath).append(child)
-            level += 1
-        # end while
+                sublevel = level.pop(cxml_child.get('name'), None)
+                if sublevel is not None:
+                    stack.append((child, cxml_child, child.get('path'), sublevel))
 
         return tree
 
-    def get_lazy_subtree(self, base, path):
+    def get_lazy_subtree(self, base, path, depth=1, lean=False, overlay=None):
         """
         Returns yang explorer compatible lazy subtree xml. A lazy
         tree  returns a cxml nested tree from base to requested
         node.
 
         Other node along the path returned as _placeholder_
-        nodes for on-demand loading in client tree.
+        nodes for on-demand loading in client tree. Requested node
+        is expanded upto depth levels (see get_lazy_node).
         """
 
-        tree = self.get_lazy_node(base)
-        if not path:
+        path_elems = path.split('/')[1:] if path else []
+        tree = self.get_lazy_node(base, depth=1 if path_elems else depth, lean=lean, overlay=overlay)
+        if not path_elems:
             return tree
 
-        path_elems = path.split('/')
-        xpath = ''
+        parent = tree
         subpath = base
-        for elems in path_elems[1:]:
+        for i, elems in enumerate(path_elems):
             subpath += '/' + elems
-            logging.info('Query: ' + subpath)
-            nodes = self.get_lazy_node(subpath)
-            if not xpath:
-                xpath = 'node[@name="%s"]' % elems
-            else:
-                xpath += '/node[@name="%s"]' % elems
-            temp = tree.find(xpath)
-            if temp is not None and nodes:
-                tree.find(xpath).remove(tree.find(xpath)[0])
-                for child in nodes:
-                    tree.find(xpath).append(child)
+            logging.debug('Query: ' + subpath)
+            last = i == len(path_elems) - 1
+            nodes = self.get_lazy_node(subpath, depth=depth if last else 1, lean=lean, overlay=overlay)
+            temp = None
+            for child in parent:
+                if child.tag == 'node' and child.get('name') == elems:
+                    temp = child
+                    break
+            if temp is not None and len(nodes):
+                temp.remove(temp[0])
+                for child in list(nodes):
+                    temp.append(child)
+                parent = temp
             else:
-                logging.error('Error: %s not found' % xpath)
+                logging.error('Error: %s not found' % subpath)
                 break
         return tree
 
+    def get_description(self, path):
+        """ Returns description of node at path (module/node1/node2) """
+        node = self.get_node(path)
+        if node is None:
+            return None
+        desc = node.find('description')
+        if desc is not None and desc.text:
+            return desc.text.strip()
+        return ''
+
     def get_namespaces(self):
-        if self.cxml is None:
+        if not self.valid():
             return []
 
         return [(ns.get('prefix', ''), ns.get('module', ''), ns.text)
-                for ns in self.cxml.getroot() if ns.tag == 'namespace']
+                for ns in self._root() if ns.tag == 'namespace']
+
+
+def file_digest(filename):
+    """ Returns sha1 hex digest of file content """
+    sha = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def load_schema(filename):
+    """ Returns CxmlSchema for a cxml file, None if compiled schema is missing or stale """
+    schema = cxb.load(filename)
+    if schema is None:
+        return None
+    schema.close()
+    return CxmlSchema(filename)
+
+
+class CxmlSchema(object):
+    """
+    Loads nodes of a cxml file on demand from its memory mapped compiled
+    schema (see cxb), cxml file is not parsed. Same as CxmlOffsets, a
+    node is returned with its child nodes but without their children.
+    Schema is mapped per lookup, so no file handle is held by cached
+    modules.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self._digest = None
+
+    def cost(self):
+        # mapped pages belong to page cache, only this object is charged
+        return _schema_cost
+
+    @property
+    def digest(self):
+        if self._digest is None:
+            self._digest = file_digest(self.filename)
+        return self._digest
+
+    def find(self, path):
+        """ Returns cxml element for path (module/node1/node2) or None """
+        schema = cxb.load(self.filename)
+        if schema is None:
+            return None
+        try:
+            node = schema.find(path)
+            if node is None:
+                return None
+            element = schema.element(node)
+            if node == 0:
+                for prefix, module, imported, uri in schema.namespaces():
+                    ns = ET.SubElement(element, 'namespace')
+                    ns.set('prefix', prefix)
+                    ns.set('module', module)
+                    ns.set('import', imported)
+                    ns.text = uri
+            for child in schema.children(node):
+                element.append(schema.element(child))
+            return element
+        finally:
+            schema.close()
+
+
+_offset_token = re.compile(br'<!\[CDATA\[.*?\]\]>|<node\b[^>]*>|</node>', re.S)
+_offset_name = re.compile(br'\sname="([^"]*)"')
+
+
+def offsets_path(filename):
+    """ Returns path of subtree offsets artifact for a cxml file """
+    return os.path.splitext(os.path.realpath(filename))[0] + '.xoff'
+
+
+def build_offsets(filename):
+    """
+    Record byte offsets of top-level and second-level nodes of a cxml
+    file as (start, head, end), where head is the offset of first child
+    node so that a node can be loaded without its children.
+
+    Top-level entries are [name, start, head, end, child-names,
+    child-offsets] with child offsets flattened.
+    """
+    target = offsets_path(filename)
+    with open(filename, 'rb') as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    try:
+        root = None
+        nodes = []
+        # stack of (depth, span) for open nodes, span is None below level 2
+        stack = []
+        for m in _offset_token.finditer(data):
+            token = m.group(0)
+            if token.startswith(b'<!'):
+                continue
+
+            if token.startswith(b'</'):
+                span = stack.pop()
+                if span is not None:
+                    span[2] = m.end()
+                    if span[1] is None:
+                        span[1] = m.end()
+                continue
+
+            # first child node marks end of parent head
+            if stack and stack[-1] is not None and stack[-1][1] is None:
+                stack[-1][1] = m.start()
+
+            depth = len(stack)
+            span = None
+            if depth == 0:
+                span = root = [m.start(), None, None]
+            elif depth <= 2:
+                name = _offset_name.search(token)
+                name = name.group(1).decode('utf-8') if name else ''
+                span = [m.start(), None, None]
+                if depth == 1:
+                    nodes.append([name, span, [], []])
+                else:
+                    nodes[-1][2].append(name)
+                    nodes[-1][3].append(span)
+
+            if token.endswith(b'/>'):
+                if span is not None:
+                    span[1] = span[2] = m.end()
+            else:
+                stack.append(span)
+
+        if root is None:
+            return None
+
+        offsets = {
+            'sha1': hashlib.sha1(data).hexdigest(),
+            'size': len(data),
+            'root': root,
+            'nodes': [[name] + span + [names, [o for s in spans for o in s]]
+                      for name, span, names, spans in nodes],
+        }
+    finally:
+        data.close()
+
+    with open(target, 'w') as f:
+        f.write(json.dumps(offsets))
+    logging.debug('build_offsets: %s -> %d subtrees' % (target, len(nodes)))
+    return target
+
+
+def load_offsets(filename):
+    """ Returns CxmlOffsets for a cxml file, None if artifact missing or stale """
+    target = offsets_path(filename)
+    try:
+        if os.path.getmtime(target) < os.path.getmtime(filename):
+            return None
+        with open(target, 'r') as f:
+            offsets = json.loads(f.read())
+    except (OSError, IOError, ValueError):
+        return None
+
+    if offsets.get('size', -1) != os.path.getsize(filename):
+        return None
+    return CxmlOffsets(filename, offsets)
+
+
+class CxmlOffsets(object):
+    """
+    Loads nodes of a cxml file on demand using byte offsets recorded at
+    compile time. Top-level and second-level nodes are loaded without
+    their children, deeper nodes are served from parsed second-level
+    subtree.
+    """
+    def __init__(self, filename, offsets):
+        self.filename = filename
+        self.digest = offsets['sha1']
+        self.root = offsets['root']
+        self.nodes = offsets['nodes']
+        self.index = dict((entry[0], entry) for entry in self.nodes)
+        self.subtrees = LRUCache(_subtree_cache_size, 'subtree')
+
+    def cost(self):
+        return self.subtrees.budget + 100 * len(self.nodes)
+
+    @staticmethod
+    def _head(f, start, head, end):
+        f.seek(start)
+        data = f.read(head - start)
+        if head < end:
+            data += b'</node>'
+        return ET.fromstring(data)
+
+    def _child(self, entry, name):
+        """ Returns (start, head, end) of second-level node or None """
+        try:
+            i = entry[4].index(name) * 3
+        except ValueError:
+            return None
+        return entry[5][i:i + 3]
+
+    def find(self, path):
+        """ Returns cxml element for path (module/node1/node2) or None """
+        elems = path.split('/', 1)
+        names = elems[1].split('/') if len(elems) > 1 and elems[1] else []
+
+        if len(names) < 2:
+            # node attributes + attributes of its children
+            with open(self.filename, 'rb') as f:
+                if not names:
+                    node = self._head(f, *self.root)
+                    for entry in self.nodes:
+                        node.append(self._head(f, *entry[1:4]))
+                    return node
+
+                entry = self.index.get(names[0])
+                if entry is None:
+                    return None
+                node = self._head(f, *entry[1:4])
+                offsets = entry[5]
+                for i in range(0, len(offsets), 3):
+                    node.append(self._head(f, *offsets[i:i + 3]))
+                return node
+
+        base = '/'.join(names[:2])
+        node = self.subtrees.get(base)
+        if node is None:
+            entry = self.index.get(names[0])
+            span = self._child(entry, names[1]) if entry else None
+            if span is None:
+                return None
+            with open(self.filename, 'rb') as f:
+                f.seek(span[0])
+                node = ET.fromstring(f.read(span[2] - span[0]))
+            self.subtrees.put(base, node, span[2] - span[0])
+
+        for name in names[2:]:
+            for child in node:
+                if child.tag == 'node' and child.get('name', '') == name:
+                    node = child
+                    break
+            else:
+                return None
+        return node
 
 
 class CxmlIterator(object):
@@ -288,6 +708,10 @@ class CxmlIterator(object):
         @params include-prefixes:list - list of included namespaces/prefixes
         @params include-default:bool - include xpath with root-prefix
         @params add-root-prefix:bool - add root-prefix in xpath
+
+        Nodes are visited depth first in document order using an explicit
+        stack. Subtrees of nodes with an excluded prefix are pruned, path
+        string and prefix state of a node are derived from its parent.
     """
     def __init__(self, filename, cxml=None, options={}):
         if cxml:
@@ -298,121 +722,123 @@ class CxmlIterator(object):
         self.inc_prefixes = options.get('include-prefixes', [])
         self.inc_default = options.get('include-default', False)
         self.add_root_prefix = options.get('add-root-prefix', False)
-        self.current = self.handle.getroot()
-        self.prefix = self.current.get('prefix', None)
-        self.path = [self.current.get('name')]
+        self.reset()
 
     def __iter__(self):
         return self
 
     def reset(self):
-        self.current = self.handle.getroot()
-        self.prefix = self.current.get('prefix', None)
-        self.path = [self.current.get('name')]
-
-    def _get_next_parent(self):
-        _parent = self.current.getparent()
-        while _parent is not None:
-            uncle = _parent.getnext()
-            if uncle is None:
-                _parent = _parent.getparent()
-                self.path.pop()
-                continue
-            if self._filter(uncle):
-                _parent = _parent.getparent()
-                continue
-            return uncle
-        return _parent
+        self.prefix = self.handle.getroot().get('prefix', None)
+        self._walker = self._walk()
 
-    def _set_xpath(self):
-        _name = self.current.get('name', None)
-
-        # add keys in xpath if required
-        if self.inc_keys and self.current.get('type', '') == 'list':
-            _keys = self.current.get('key', '')
-            _name += '[' + _keys + ']'
-
-        # add default prefix in xpath if required
-        if self.add_root_prefix and ':' not in _name:
-            _name = self.prefix + ':' + _name
-
-        # append to xpath list
-        self.path.append(_name)
+    def next(self):
+        return next(self._walker)
 
-    def _get_prefix(self, node):
-        name = node.get('name', None)
-        return name.split(':')[0] if ':' in name else None
+    __next__ = next
 
     def _filter(self, node):
-        """ Filter xpath """
-        if not self.inc_prefixes:
-            return False
+        """ Returns True if subtree of node is excluded """
+        name = node.get('name', '')
+        return ':' in name and name.split(':')[0] not in self.inc_prefixes
+
+    def _children(self, node):
+        """ Returns child nodes which are not excluded, in reverse order """
+        if self.inc_prefixes:
+            children = [c for c in node.iterchildren('node') if not self._filter(c)]
+        else:
+            children = list(node.iterchildren('node'))
+        children.reverse()
+        return children
+
+    def _walk(self):
+        root = self.handle.getroot()
+        included = tuple(pfx + ':' for pfx in self.inc_prefixes)
+        root_prefix = (self.prefix or '') + ':'
+        rootname = root.get('name')
+        inc_keys = self.inc_keys
+        inc_default = self.inc_default
+        add_root_prefix = self.add_root_prefix
+        children = self._children
+
+        # stack of (node, parent path, prefix matched, all default prefix)
+        matched = bool(included) and rootname.startswith(included)
+        stack = [(child, rootname, matched, True) for child in children(root)]
+        pop = stack.pop
+        push = stack.append
+        while stack:
+            node, path, matched, default = pop()
+            name = node.get('name')
+
+            # add keys in xpath if required
+            if inc_keys and node.get('type') == 'list':
+                name += '[' + node.get('key', '') + ']'
+
+            # add default prefix in xpath if required
+            if add_root_prefix and ':' not in name:
+                name = self.prefix + ':' + name
+
+            path += '/' + name
+            if included and not matched:
+                matched = name.startswith(included)
+            if add_root_prefix:
+                default = default and name.startswith(root_prefix)
+            else:
+                default = default and ':' not in name
 
-        pfx = self._get_prefix(node)
-        if pfx is not None:
-            return pfx not in self.inc_prefixes
-        return False
+            if not included or matched or (inc_default and default):
+                yield path, node
 
-    def next(self):
-        # Depth First Traversal
+            for child in children(node):
+                push((child, path, matched, default))
 
-        # Look for children first
-        if len(self.current):
-            for child in self.current.findall('node'):
-                if self._filter(child):
-                    continue
-                self.current = child
-                self._set_xpath()
-                if self.has_prefix():
-                    return '/'.join(self.path), self.current
-                return self.next()
-
-        # Look for siblings next
-        _next = self.current.getnext()
-        self.path.pop()
-        while _next is not None:
-            if self._filter(_next):
-                _next = _next.getnext()
-                continue
-            self.current = _next
-            self._set_xpath()
-            if self.has_prefix():
-                return '/'.join(self.path), self.current
-            return self.next()
-
-        # Look for parent last
-        _parent = self._get_next_parent()
-        if _parent is None:
-            raise StopIteration()
-
-        self.path.pop()
-        if not self._filter(_parent):
-            self.current = _parent
-            self._set_xpath()
-
-        if self.has_prefix():
-            return '/'.join(self.path), self.current
-        return self.next()
-
-    def has_prefix(self):
-        if not self.inc_prefixes:
-            return True
-
-        if self.inc_default:
-            if self.add_root_prefix:
-                if not any(not elem.startswith(self.prefix + ':') for elem in self.path[1:]):
-                    return True
-            else:
-                if not any(':' in elem for elem in self.path[1:]):
-                    return True
 
-        for i_pfx in self.inc_prefixes:
-            if any(elem.startswith(i_pfx + ':') for elem in self.path):
-                return True
-        return False
+_cxml_cache = LRUCache(ServerSettings.cxml_cache_size(), 'cxml')
 
 
 def get_cxml(filename):
-    """ Create and return CXML object from File or LocalCache """
-    cxml = Cxml(filename)
+    """
+    Create and return CXML object from File or LocalCache.
+
+    Parsed objects are shared between requests (and users referring
+    to same stored module), callers must not modify the returned cxml
+    tree.
+    """
+    path = os.path.realpath(filename)
+    try:
+        st = os.stat(path)
+    except OSError:
+        return Cxml(filename)
+
+    tag = (st.st_mtime, st.st_size)
+    cxml = _cxml_cache.get(path, tag)
+    if cxml is None:
+        cxml = Cxml(filename)
+        if cxml.valid():
+            _cxml_cache.put(path, cxml, cxml.cost(), tag)
     return cxml
+
+
+def get_descriptions(filename, paths):
+    """
+    Returns list of (path, description) for node paths of a module,
+    description is None if path is not found. Descriptions are read
+    from compiled schema if available.
+    """
+    schema = cxb.load(filename)
+    if schema is None:
+        module = get_cxml(filename)
+        return [(path, module.get_description(path)) for path in paths]
+
+    try:
+        result = []
+        for path in paths:
+            node = schema.find(path)
+            result.append((path, schema.description(node) if node is not None else None))
+        return result
+    finally:
+        schema.close()
+
+
+def get_cache_stats():
+    """ Returns hit / miss / eviction counters of cxml cache """
+    return _cxml_cache.stats()
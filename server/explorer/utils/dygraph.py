@@ -162,6 +162,24 @@ class DYGraph(object):
         module = self.modules.get(modulename, None)
         return module
 
+    def closure(self, names):
+        """
+        Returns set of module names reachable from names through
+        import and include statements (including names)
+        """
+        result = set()
+        stack = list(names)
+        while stack:
+            name = stack.pop()
+            if name in result:
+                continue
+            result.add(name)
+            module = self.modules.get(name, None)
+            if module is not None:
+                stack.extend(module.imports)
+                stack.extend(module.includes)
+        return result
+
     def digraph(self, files=[]):
         """
         Create a graph object
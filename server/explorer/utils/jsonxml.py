@@ -0,0 +1,145 @@
+"""
+    Copyright 2016, Cisco Systems, Inc
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+
+    @author: Pravin Gohite, Cisco Systems, Inc.
+
+    Compact JSON encoding of explorer xml responses (format=json).
+
+    An element is encoded as an object:
+        '#'     : tag, omitted for 'node'
+        '_'     : text, omitted if not set
+        'c'     : list of child elements, omitted if empty
+        others  : attributes, frequent attribute names use short keys
+
+    Defaults are omitted: path of a node which is parent path + '/' +
+    name and name of __yang_placeholder nodes. Attribute names which
+    clash with a short key or reserved key are escaped with '@'.
+    decode(encode(element)) returns an equivalent element.
+"""
+
+import json
+from collections import OrderedDict
+import lxml.etree as ET
+
+TAG = '#'
+TEXT = '_'
+CHILDREN = 'c'
+
+_short = {
+    'name': 'n',
+    'type': 't',
+    'path': 'p',
+    'access': 'a',
+    'datatype': 'dt',
+    'key': 'k',
+    'default': 'df',
+    'values': 'v',
+    'mandatory': 'm',
+    'is_key': 'ik',
+    'presence': 'pr',
+    'prefix': 'px',
+    'description': 'ds',
+    'has_description': 'hd',
+    'xpath_filter': 'x',
+    'namespaces': 'ns',
+    'module': 'mo',
+}
+_long = dict((v, k) for k, v in _short.items())
+_reserved = (TAG, TEXT, CHILDREN)
+
+PLACEHOLDER = '__yang_placeholder'
+PLACEHOLDER_NAME = 'Loading ..'
+
+
+def _encode_key(name):
+    if name in _short:
+        return _short[name]
+    if name in _long or name in _reserved or name.startswith('@'):
+        return '@' + name
+    return name
+
+
+def _decode_key(key):
+    if key.startswith('@'):
+        return key[1:]
+    return _long.get(key, key)
+
+
+def encode(element, parent_path=None):
+    """ Returns json compatible object for an xml element """
+    obj = OrderedDict()
+    if element.tag != 'node':
+        obj[TAG] = element.tag
+
+    node = element.tag == 'node'
+    placeholder = node and element.get('type') == PLACEHOLDER
+    path = element.get('path')
+    derive = node and not placeholder and parent_path is not None
+
+    for name, value in element.attrib.items():
+        if name == 'path' and derive and value == parent_path + '/' + element.get('name', ''):
+            continue
+        if name == 'name' and placeholder and value == PLACEHOLDER_NAME:
+            continue
+        obj[_encode_key(name)] = value
+
+    if derive and path is None:
+        # path can not be derived, mark it missing
+        obj[_short['path']] = None
+    if placeholder and element.get('name') is None:
+        obj[_short['name']] = None
+
+    if element.text is not None:
+        obj[TEXT] = element.text
+
+    children = [encode(child, path) for child in element if isinstance(child.tag, basestring)]
+    if children:
+        obj[CHILDREN] = children
+    return obj
+
+
+def decode(obj, parent_path=None):
+    """ Returns xml element for an object returned by encode """
+    element = ET.Element(obj.get(TAG, 'node'))
+    node = element.tag == 'node'
+    placeholder = node and obj.get(_short['type']) == PLACEHOLDER
+
+    for key, value in obj.items():
+        if key in _reserved or value is None:
+            continue
+        element.set(_decode_key(key), value)
+
+    if node and not placeholder and parent_path is not None and _short['path'] not in obj:
+        element.set('path', parent_path + '/' + element.get('name', ''))
+    if placeholder and _short['name'] not in obj:
+        element.set('name', PLACEHOLDER_NAME)
+
+    if TEXT in obj:
+        element.text = obj[TEXT]
+
+    path = element.get('path')
+    for child in obj.get(CHILDREN, []):
+        element.append(decode(child, path))
+    return element
+
+
+def dumps(element):
+    """ Returns compact json string for an xml element """
+    return json.dumps(encode(element), separators=(',', ':'))
+
+
+def loads(text):
+    """ Returns xml element for a json string returned by dumps """
+    return decode(json.loads(text, object_pairs_hook=OrderedDict))
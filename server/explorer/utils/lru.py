@@ -0,0 +1,144 @@
+"""
+    Copyright 2016, Cisco Systems, Inc
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+
+    @author: Pravin Gohite, Cisco Systems, Inc.
+"""
+
+import weakref
+import threading
+from collections import OrderedDict
+
+# all caches of this process, see share_budgets
+_caches = weakref.WeakSet()
+
+
+class LRUCache(object):
+    """
+    Process wide LRU cache bounded by total cost of cached entries.
+
+    Every entry carries a tag (for example file mtime & size), a lookup
+    with a different tag drops the entry and is reported as a miss.
+    """
+    def __init__(self, budget, name=''):
+        self.name = name
+        self.budget = budget
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        _caches.add(self)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, tag=None):
+        """ Return cached value for key or None """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            if entry[0] != tag:
+                self.size -= entry[2]
+                self.misses += 1
+                return None
+
+            # re-insert as most recently used
+            self._entries[key] = entry
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value, cost=1, tag=None):
+        """ Add value in cache, evict least recently used entries if required """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self.size -= entry[2]
+
+            return self._insert(key, value, cost, tag)
+
+    def recost(self, key, value, cost):
+        """
+        Charge new cost for value cached under key (grown in place),
+        evict least recently used entries if required. Does nothing
+        if key is no longer cached with this value.
+        """
+        with self._lock:
+            entry = self._entries.get(key, None)
+            if entry is None or entry[1] is not value:
+                return False
+            del self._entries[key]
+            self.size -= entry[2]
+            return self._insert(key, value, cost, entry[0])
+
+    def _insert(self, key, value, cost, tag):
+        if cost > self.budget:
+            return False
+
+        while self._entries and self.size + cost > self.budget:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= evicted[2]
+            self.evictions += 1
+
+        self._entries[key] = (tag, value, cost)
+        self.size += cost
+        return True
+
+    def resize(self, budget):
+        """ Change budget, evict least recently used entries if required """
+        with self._lock:
+            self.budget = budget
+            while self._entries and self.size > budget:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= evicted[2]
+                self.evictions += 1
+
+    def invalidate(self, key):
+        """ Drop cached entry for key """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self.size -= entry[2]
+
+    def clear(self):
+        """ Drop all cached entries """
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def stats(self):
+        """ Return cache counters """
+        with self._lock:
+            return {
+                'name': self.name,
+                'entries': len(self._entries),
+                'size': self.size,
+                'budget': self.budget,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+def share_budgets(processes):
+    """
+    Divide budget of every cache of this process by number of processes
+    sharing the configured budgets (worker pool).
+    """
+    for cache in list(_caches):
+        cache.resize(cache.budget // processes)
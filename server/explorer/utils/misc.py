@@ -16,8 +16,12 @@
     @author: Pravin Gohite, Cisco Systems, Inc.
 """
 import os
+import json
+import multiprocessing
 import lxml.etree as ET
+from collections import OrderedDict
 from django.conf import settings
+import explorer.utils.jsonxml as jsonxml
 
 
 class Response(object):
@@ -26,9 +30,28 @@ class Response(object):
     """
 
     @staticmethod
-    def _build(_type, tag, msg, xml):
+    def format(request):
+        """ Returns response format requested by client (xml or json) """
+        return 'json' if request.GET.get('format', '') == 'json' else 'xml'
+
+    @staticmethod
+    def content_type(fmt):
+        """ Returns HTTP content type for response format """
+        return 'application/json' if fmt == 'json' else None
+
+    @staticmethod
+    def _build(_type, tag, msg, xml, fmt='xml'):
         """ Create HTTP response """
 
+        if fmt == 'json':
+            response = OrderedDict()
+            if _type:
+                response['type'] = _type
+            response[tag] = msg
+            if xml is not None:
+                response['data'] = jsonxml.encode(xml)
+            return json.dumps(response, separators=(',', ':'))
+
         response = ET.Element('response')
         if _type:
             response.set('type', _type)
@@ -43,14 +66,14 @@ class Response(object):
         return ET.tostring(response)
 
     @staticmethod
-    def error(_type, msg, xml=None):
+    def error(_type, msg, xml=None, fmt='xml'):
         """ Build error response """
-        return Response._build(_type, 'error', msg, xml)
+        return Response._build(_type, 'error', msg, xml, fmt)
 
     @staticmethod
-    def success(_type, msg, xml=None):
+    def success(_type, msg, xml=None, fmt='xml'):
         """ Build success response """
-        return Response._build(_type, 'success', msg, xml)
+        return Response._build(_type, 'success', msg, xml, fmt)
 
 
 class ServerSettings(object):
@@ -73,6 +96,41 @@ class ServerSettings(object):
         """ Build path to user's yang directory """
         return os.path.join('data', 'users', user, 'cxml')
 
+    @staticmethod
+    def generation_path(user):
+        """ Path to user's module set generation file """
+        return os.path.join('data', 'users', user, 'generation')
+
+    @staticmethod
+    def search_cache_entry_size():
+        """ Search results bigger than this (bytes) are not cached """
+        return getattr(settings, 'SEARCH_CACHE_ENTRY_SIZE', 256 * 1024)
+
+    @staticmethod
+    def lazy_node_budget():
+        """ Maximum number of nodes returned by a multi-level tree request """
+        return getattr(settings, 'LAZY_NODE_BUDGET', 2000)
+
+    @staticmethod
+    def worker_processes():
+        """ Number of worker processes for fan-out work, 0 or 1 runs it inline """
+        return getattr(settings, 'WORKER_PROCESSES', min(multiprocessing.cpu_count(), 4))
+
+    @staticmethod
+    def rpc_bulk_chunk_size():
+        """ Maximum number of table rows (list entries) per bulk generated RPC """
+        return getattr(settings, 'RPC_BULK_CHUNK_SIZE', 500)
+
+    @staticmethod
+    def search_limit():
+        """ Default maximum number of search results per request """
+        return getattr(settings, 'SEARCH_RESULT_LIMIT', 1000)
+
+    @staticmethod
+    def store_path():
+        """ Path to content addressed store of compiled modules """
+        return os.path.join('data', 'store')
+
     @staticmethod
     def schema_path(session):
         """ Path to schema path """
@@ -83,3 +141,13 @@ class ServerSettings(object):
         """ Path to schema path """
         return os.path.join(settings.BASE_DIR, 'data', 'annotation')
 
+    @staticmethod
+    def cxml_cache_size():
+        """ Memory budget (bytes of cxml source) for parsed cxml cache """
+        return getattr(settings, 'CXML_CACHE_SIZE', 256 * 1024 * 1024)
+
+    @staticmethod
+    def cxml_partial_size():
+        """ Size of cxml file above which module subtrees are loaded on demand """
+        return getattr(settings, 'CXML_PARTIAL_SIZE', 64 * 1024 * 1024)
+
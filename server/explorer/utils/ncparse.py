@@ -22,7 +22,7 @@ import lxml.etree as ET
 class NetconfParser(object):
     """ Netconf Utility Class """
     def __init__(self, rpc):
-        if isinstance(rpc, str):
+        if isinstance(rpc, basestring):
             self.rpc = ET.fromstring(rpc, parser=ET.XMLParser(remove_blank_text=True))
         else:
             self.rpc = rpc
@@ -58,7 +58,6 @@ class NetconfParser(object):
         """ Return netconf datastore from rpc """
         op = self.get_operation()
         ns = self.get_namespace()
-        print self
         if op == 'edit-config':
             option = self.rpc.find('{%s}edit-config/{%s}error-option' % (ns,ns))
             if option is not None:
@@ -18,145 +18,253 @@
 """
 
 
+import os
+import csv
+import copy
+import json
+import hashlib
 import logging
+import itertools
+from StringIO import StringIO
+from collections import deque
+import lxml.etree as ET
 import explorer.utils.cxml as cxml
+import explorer.utils.workers as workers
 from explorer.utils.admin import ModuleAdmin
+from explorer.utils.lru import LRUCache
 
 rpc_xmlns = 'urn:ietf:params:xml:ns:netconf:base:1.0'
-rpc_template = '''<rpc message-id="{msg_id}" xmlns="{rpc_ns}">
-{msg_payload}
-</rpc>'''
+rpc_operation = '{%s}operation' % rpc_xmlns
 
+# RPC envelopes, module payloads are added to the innermost last
+# element (filter / config / rpc)
+rpc_templates = {
+    'get-config': '<get-config><source><{source}/></source><filter/></get-config>',
+    'edit-config': '<edit-config><target><{target}/></target>{options}'
+                   '<config xmlns:xc="{rpc_ns}"/></edit-config>',
+    'get': '<get><filter/></get>',
+}
+rpc_template = '<rpc message-id="{msg_id}" xmlns="{rpc_ns}">{msg_payload}</rpc>'
 
-def build_rpc(request, payload, operation):
+_skeleton_cache_size = 16 * 1024 * 1024
+
+# cost of one skeleton element for cache accounting
+_element_cost = 200
+
+
+def build_rpc(request, operation):
+    """
+    Returns (rpc element, element to add module payloads to). Envelope
+    is parsed from a template, so that config element declares the xc
+    prefix used by edit-config operation attributes.
+    """
     source = request.get('source', 'running')
     target = request.get('target', 'candidate')
-
-    if operation == 'get-config':
-        datastore = '<source><' + source + '/></source>\n'
-        payload = '<filter>\n' + payload + '</filter>\n'
-        payload = '<get-config>\n' + datastore + payload + '</get-config>'
-    elif operation == 'edit-config':
+    options = ''
+    if operation == 'edit-config':
         err_option = request.get('err-option', '')
-        datastore = '<target><' + target + '/></target>\n'
-        options = ''
         if err_option != '':
-            options = '<error-option>%s</error-option>\n' % err_option
-        payload = '<config xmlns:xc="' + rpc_xmlns  + '">\n' +  payload + '</config>\n'
-        payload = '<edit-config>\n'+ datastore + options + payload + '</edit-config>'
-        if target == 'candidate':
-            payload += '<commit/>\n'
-    elif operation == 'get':
-        payload = '<filter>\n' + payload + '</filter>\n'
-        payload = '<get>\n' + payload + '</get>'
+            options = '<error-option>%s</error-option>' % err_option
+
+    payload = rpc_templates.get(operation, '').format(source=source, target=target,
+                                                      options=options, rpc_ns=rpc_xmlns)
+    rpc = ET.fromstring(rpc_template.format(msg_id='101', rpc_ns=rpc_xmlns, msg_payload=payload))
+    parent = rpc
+    while len(parent):
+        parent = parent[-1]
 
-    return rpc_template.format(msg_id='101', rpc_ns=rpc_xmlns, msg_payload=payload)
+    if operation == 'edit-config' and target == 'candidate':
+        ET.SubElement(rpc, '{%s}commit' % rpc_xmlns)
+    return rpc, parent
 
 
 def get_namespace(tree, prefix=''):
-    module_prefix = tree.get('prefix', '')
+    """ Returns namespace of prefix (module prefix if empty) or None """
     if prefix == '':
-        prefix = module_prefix
-    ns = ''
+        prefix = tree.get('prefix', '')
     for child in tree:
         if child.tag == 'namespace':
-            pfx = child.get('prefix', '')
-            if pfx == prefix:
-                if module_prefix == pfx:
-                    ns += ' xmlns="%s"' % child.text
-                else:
-                    ns += ' xmlns:%s="%s"' % (pfx, child.text)
+            if child.get('prefix', '') == prefix:
+                return child.text
         else:
             break
-    return ns
+    return None
+
+
+def get_nsmap(tree, prefixes):
+    """ Returns nsmap of module default namespace and derived prefixes """
+    nsmap = {}
+    module_prefix = tree.get('prefix', '')
+    for child in tree:
+        if child.tag != 'namespace':
+            break
+        pfx = child.get('prefix', '')
+        if pfx == module_prefix:
+            nsmap[None] = child.text
+        elif pfx in prefixes:
+            nsmap[pfx] = child.text
+    return nsmap
 
 
-def pop_keyvalue(d, path, mode):
-    """ Extract path, value pair from dictionary and
-        delete the list entry as we will processing
+class KeyValueMap(object):
+    """
+    Request key-values of a module as path -> values multimap, values
+    of a path are kept in request order. prefixes is the set of key
+    paths and all of their ancestor paths, schema nodes outside of it
+    can not produce any RPC content. slots collects (element, request
+    index) of leaves that got a value and lists the list entry elements.
+    """
+    def __init__(self, keyvalues):
+        self.values = {}
+        self.prefixes = set()
+        self.slots = []
+        self.lists = []
+        for path, obj in keyvalues:
+            # leaf-list has '=' in path, extract path in this case
+            path = path.split('=')[0]
+            self.values.setdefault(path, deque()).append(obj)
+            start = path.find('/')
+            while start != -1:
+                self.prefixes.add(path[:start])
+                start = path.find('/', start + 1)
+            self.prefixes.add(path)
+
+
+def pop_keyvalue(kv, path, mode):
+    """ Extract path, value pair from key-value map and
+        delete the entry as we will processing
         this pair in current step
 
-        Returns value and netconf operation pair.
+        Returns value, netconf operation, found and request index.
+    """
+    values = kv.values.get(path, None)
+    if not values:
+        return '', '', False, -1
+
+    obj = values.popleft()
+    val = obj.value
+    option = ''
+    # ignore default edit config operation
+    if mode == 'edit-config' and (obj.option not in ['', 'merge']):
+        option = obj.option
+    return val, option, True, obj.index
+
+
+def qualify(tree, name, ns, nsmap):
+    """
+    Returns (tag, nsmap) of element for schema node name, names of
+    augmented nodes (pfx:name) are in the namespace of their prefix
+    which is added to nsmap.
     """
-    index = 0
-    for key in d:
-        # leaf-list has '='' in path, extact path in this case
-        _key = key[0].split('=')[0] if '=' in key[0] else key[0]
-        if _key == path:
-            obj = key[1]
-            val = obj.value
-            option = ''
-            # ignore default edit config operation
-            if mode == 'edit-config' and (obj.option not in ['', 'merge']):
-                option = ' xc:operation="' + obj.option + '"'
-
-            d.pop(index)
-            return val, option, True
-        index += 0
-    return '', '', False
-
-
-def process_terminal(tree, d, node, prefix, ns, mode):
-    (val, option, found) = pop_keyvalue(d, prefix, mode)
+    if ':' not in name:
+        return ns + name, nsmap
+    pfx, _, local = name.partition(':')
+    uri = get_namespace(tree, pfx)
+    if uri is None:
+        return ns + local, nsmap
+    nsmap = dict(nsmap or {})
+    nsmap[pfx] = uri
+    return '{%s}%s' % (uri, local), nsmap
+
+
+def process_terminal(tree, d, node, parent, prefix, ns, nsmap, mode):
+    (val, option, found, index) = pop_keyvalue(d, prefix, mode)
     if not found:
-        return ''
+        return False
 
+    tag, nsmap = qualify(tree, node.get('name', ''), ns, nsmap)
     if ':' in val:
-        pfx = val.split(':')
-        if len(pfx) > 1:
-            ns = get_namespace(tree, pfx[0])
-
-    name = node.get('name', '')
+        # identity value, declare its prefix on the leaf
+        pfx = val.split(':')[0]
+        uri = get_namespace(tree, pfx)
+        if uri is not None:
+            nsmap = dict(nsmap or {})
+            nsmap[pfx] = uri
+
+    elem = ET.SubElement(parent, tag, nsmap=nsmap)
+    if option:
+        elem.set(rpc_operation, option)
     if val != '':
-        msg = '<' + name + ns + option + '>' + val + '</' + name + '>\n'
-    else:
-        msg = '<' + name + ns + option +'/>\n'
+        elem.text = val
+    d.slots.append((elem, index))
+    return True
 
-    return msg
 
+def process_leaflist(tree, d, node, parent, prefix, ns, nsmap, mode):
+    while process_terminal(tree, d, node, parent, prefix, ns, nsmap, mode):
+        pass
 
-def process_leaflist(tree, d, node, prefix, ns, mode):
-    msg = ''
-    _msg = process_terminal(tree, d, node, prefix, ns, mode)
-    while _msg != '':
-        msg += _msg
-        _msg = process_terminal(tree, d, node, prefix, ns, mode)
-    return msg
 
-
-def process_xml(tree, d, node, prefix, ns, mode):
+def process_xml(tree, d, node, parent, prefix, ns, nsmap, mode):
+    """
+    Add elements for key-values below schema node to parent, ns is
+    the module namespace in {uri} form and nsmap is declared on
+    added elements only (module top level nodes).
+    """
     name = node.get('name', '')
     type_ = node.get('type', '')
     prefix = prefix + '/' + name
-    msg = ''
+
+    # prune subtrees without requested key-values
+    if prefix not in d.prefixes:
+        return
 
     if type_ == 'leaf-list':
-        msg = process_leaflist(tree, d, node, prefix, ns, mode)
+        process_leaflist(tree, d, node, parent, prefix, ns, nsmap, mode)
     elif type_ in ['leaf', 'leafref']:
-        msg = process_terminal(tree, d, node, prefix, ns, mode)
+        process_terminal(tree, d, node, parent, prefix, ns, nsmap, mode)
     elif type_ in ['module','choice', 'case', 'input', 'output']:
         for child in node:
-            msg += process_xml(tree, d, child, prefix, '', mode)
+            process_xml(tree, d, child, parent, prefix, ns, nsmap, mode)
     elif type_ in ['list', 'container', 'rpc']:
-        (val, option, found) = pop_keyvalue(d, prefix, mode)
+        (val, option, found, _) = pop_keyvalue(d, prefix, mode)
 
+        tag, _nsmap = qualify(tree, name, ns, nsmap)
+        elem = ET.SubElement(parent, tag, nsmap=_nsmap)
+        if option:
+            elem.set(rpc_operation, option)
         for child in node:
-            msg += process_xml(tree, d, child, prefix, '', mode)
+            process_xml(tree, d, child, elem, prefix, ns, None, mode)
 
-        if msg != '':
-            msg = '<' + name + ns + option + '>\n' + msg + '</' + name + '>\n'
-        elif found:
-            msg = '<' + name + ns + option + '/>\n'
+        if not found and len(elem) == 0:
+            parent.remove(elem)
+        elif type_ == 'list':
+            d.lists.append(elem)
     else:
         logging.debug('processXML: UnknownType: ' + type_)
 
-    return msg
-
 
 class ValueObject:
     pass
 
 
+class RPCSkeleton(object):
+    """
+    Generated RPC of a request shape, slots are (element ordinal in
+    rpc.iter() order, request key-value index) of leaf values, lists
+    is the set of ordinals of list entries.
+    """
+    __slots__ = ('rpc', 'slots', 'lists', 'size')
+
+    def __init__(self, rpc, slots, lists=()):
+        ordinals = {}
+        for ordinal, elem in enumerate(rpc.iter()):
+            ordinals[elem] = ordinal
+        self.rpc = rpc
+        self.slots = [(ordinals[elem], index) for elem, index in slots]
+        self.lists = set(ordinals[elem] for elem in lists if elem in ordinals)
+        self.size = len(ordinals)
+
+    def fill(self, values):
+        """ Returns copy of RPC with values (list by request index) """
+        rpc = copy.deepcopy(self.rpc)
+        if self.slots:
+            elements = list(rpc.iter())
+            for ordinal, index in self.slots:
+                elements[ordinal].text = values[index] or None
+        return rpc
+
+
 class RPCRequestModule:
     def __init__(self, name):
         self.name = name
@@ -179,7 +287,7 @@ def parseRequest(request):
     keyvalue = request.find('keyvalue')
     modules = {}
 
-    for child in keyvalue:
+    for index, child in enumerate(keyvalue):
         logging.info('Node : <%s %s>%s' , child.tag, child.attrib, child.text)
         if child.tag != 'node':
             logging.error('Invalid node in the request data : %s' % child.tag)
@@ -197,6 +305,7 @@ def parseRequest(request):
         obj = ValueObject()
         obj.option = child.get('option', '')
         obj.value = ''
+        obj.index = index
         if flag in ['get-config', 'get', 'empty']:
             module.add_keyvalue(path, obj)
         else:
@@ -227,56 +336,276 @@ def convert_rpc(rpc, mode):
     return rpc
 
 
-def gen_netconf(username, request, mode):
-    msg = ''
-    rpc = ''
+def gen_module_payload(tree, name, module, mode, parent):
+    """
+    Add RPC payload of one module for request key-values to parent
+    element, only schema nodes along the paths of key-values are visited.
+
+    Returns: KeyValueMap with value slots and list entries of payload
+    """
+    kvDict = KeyValueMap(module.get_keyvalues())
+    logging.info("Root node %s" % tree.get('name'))
+
+    # module namespace and derived namespaces
+    nsmap = get_nsmap(tree, module.get_namespace_pfx())
+    ns = '{%s}' % nsmap[None] if None in nsmap else ''
+
+    # start processing CXML
+    for child in tree:
+        if child.tag != 'namespace':
+            process_xml(tree, kvDict, child, parent, name, ns, nsmap, mode)
+    return kvDict
 
-    _format = request.get('format', 'xpath')    
+
+_skeleton_cache = LRUCache(_skeleton_cache_size, 'rpc')
+
+
+def shape_key(request, mode, modules, files):
+    """
+    Returns (key, tag) of request shape: envelope options, paths and
+    options of key-values in request order, namespace prefixes declared
+    per module and module CXML files. Prefix of identity values is part
+    of the shape as it adds a namespace.
+    """
+    keyvalues = []
+    for module in modules.values():
+        keyvalues.extend(module.get_keyvalues())
+    keyvalues.sort(key=lambda kv: kv[1].index)
+
+    shape = [mode, request.get('source', 'running'), request.get('target', 'candidate'),
+             request.get('err-option', '')]
+    for path, obj in keyvalues:
+        pfx = obj.value.split(':')[0] if ':' in obj.value else ''
+        shape.append('%s\t%s\t%s' % (path, obj.option, pfx))
+    for name in sorted(modules):
+        shape.append('%s\t%s' % (name, ','.join(sorted(modules[name].get_namespace_pfx()))))
+
+    tag = []
+    for name in sorted(files):
+        filename = files[name]
+        if filename is None:
+            tag.append((name, None))
+        else:
+            st = os.stat(filename)
+            tag.append((filename, st.st_mtime, st.st_size))
+
+    digest = hashlib.sha1(u'\n'.join(shape).encode('utf-8')).hexdigest()
+    return (digest, tuple(sorted(files.items()))), tuple(tag)
+
+
+def gen_netconf(username, request, mode):
+    """ Returns netconf RPC element for request """
+    _format = request.get('format', 'xpath')
     if mode == '': mode = request.get('operation', '')
 
     logging.debug('Generating netconf RPC, operation : "%s" format: %s' % (mode, _format))
-    
+
     if _format == 'raw':
         rpc = request.find('rpc').text
+        if not rpc:
+            return None
         rpc = rpc.replace('&gt;','>')
         rpc = rpc.replace('&lt;','<')
-        return convert_rpc(rpc, mode)
+        rpc = convert_rpc(rpc, mode)
+        return ET.fromstring(rpc, parser=ET.XMLParser(remove_blank_text=True))
+
     # Parse test-payload key-values pairs for each modules and
     # create a dictionary of modules.
     modules =  parseRequest(request)
+    skeleton, values = get_skeleton(username, request, mode, modules)
+    return skeleton.fill(values)
+
+
+def get_skeleton(username, request, mode, modules):
+    """
+    Returns (RPCSkeleton, values by request index) for parsed request
+    modules, skeleton is generated only for a new request shape.
+    """
+    files = {}
+    values = {}
+    for name in modules:
+        files[name] = ModuleAdmin.cxml_path(username, name)
+        for _, obj in modules[name].get_keyvalues():
+            values[obj.index] = obj.value
+    values = [values.get(index, '') for index in range(max(values) + 1)] if values else []
+
+    # Requests of same shape only differ in leaf values, reuse skeleton
+    key, tag = shape_key(request, mode, modules, files)
+    skeleton = _skeleton_cache.get(key, tag)
+    if skeleton is not None:
+        logging.debug('Generated netconf RPC from skeleton')
+        return skeleton, values
+
+    # Build RPC header, module payloads are added in place
+    rpc, parent = build_rpc(request, mode)
 
     # Process each module key-value separatly
+    slots = []
+    lists = []
     for name in modules:
         module = modules[name]
-        kvDict = module.get_keyvalues()
         logging.debug('Opening file %s.xml' % name)
-        
-        filename = ModuleAdmin.cxml_path(username, name)
+
+        filename = files[name]
         if filename is None:
             logging.debug('file %s.xml not found !!' % name)
             continue
 
         cx = cxml.get_cxml(filename)
-        tree = cx.getroot()
-        logging.info("Root node %s" % tree.get('name'))
+        kv = gen_module_payload(cx.getroot(), name, module, mode, parent)
+        slots.extend(kv.slots)
+        lists.extend(kv.lists)
 
-        ns = get_namespace(tree)
+    skeleton = RPCSkeleton(rpc, slots, lists)
+    _skeleton_cache.put(key, skeleton, _element_cost * skeleton.size, tag)
+    logging.debug('Generated netconf RPC')
+    return skeleton, values
 
-        # get derived namespaces
-        prefixes = module.get_namespace_pfx()
-        for pfx in prefixes:
-            ns += get_namespace(tree, pfx)
 
-        # start processing CXML
-        for child in tree:
-            if child.tag != 'namespace':
-                msg += process_xml(tree, kvDict, child, name, ns, mode)
+def parse_table(text):
+    """
+    Returns dict of column -> list of values of a value table, either a
+    JSON object of column arrays {"name": ["Gi1", ..], "mtu": [..]} or
+    CSV text with a header row.
+    """
+    text = text.strip()
+    if text.startswith('{'):
+        table = json.loads(text)
+        columns = {}
+        for name, values in table.items():
+            if not isinstance(values, list):
+                raise ValueError('Column %s is not an array' % name)
+            columns[name] = [u'' if v is None else unicode(v) for v in values]
+    else:
+        if isinstance(text, unicode):
+            text = text.encode('utf-8')
+        try:
+            rows = list(csv.reader(StringIO(text)))
+        except csv.Error as e:
+            raise ValueError('Invalid CSV table: %s' % e)
+        header = [name.decode('utf-8').strip() for name in (rows[0] if rows else [])]
+        columns = dict((name, []) for name in header)
+        for line, row in enumerate(rows[1:], 2):
+            if not row:
+                continue
+            if len(row) != len(header):
+                raise ValueError('Line %d has %d values, expected %d' % (line, len(row), len(header)))
+            for name, value in zip(header, row):
+                columns[name].append(value.decode('utf-8'))
+
+    if len(set(len(values) for values in columns.values())) > 1:
+        raise ValueError('Columns have different lengths')
+    return columns
+
+
+def gen_netconf_bulk(username, request, columns, chunk):
+    """
+    Generate netconf RPCs for a template request and a value table.
+    Template key-values with a column attribute take their value from
+    the table, every table row adds one entry of the innermost list that
+    contains all column leaves. Template is generated (or taken from
+    skeleton cache) once, entries are copies of its list entry.
 
-    # Finally build RPC header
-    rpc += build_rpc(request, msg, mode)
-    logging.debug('Generated netconf RPC')
-    logging.debug(rpc)
-    return rpc
+    Returns: list of RPC elements with at most chunk entries each
+    """
+    mode = request.get('operation', '') or 'edit-config'
+    chunk = max(chunk, 1)
+    keyvalue = request.find('keyvalue')
+    if keyvalue is None:
+        raise ValueError('Template has no key-values')
+
+    bound = {}
+    for index, child in enumerate(keyvalue):
+        column = child.get('column', None)
+        if column is None:
+            continue
+        if column not in columns:
+            raise ValueError('Column %s not in table' % column)
+        bound[index] = column
+
+    count = max([len(values) for values in columns.values()] or [0])
+    if not bound or not count:
+        raise ValueError('Template has no table columns or table is empty')
+
+    # first row fills the template, identity value prefixes of all rows
+    # are declared on module top level elements
+    modules = parseRequest(request)
+    for module in modules.values():
+        for _, obj in module.get_keyvalues():
+            if obj.index in bound:
+                cells = columns[bound[obj.index]]
+                obj.value = cells[0]
+                module.add_namespace_pfx(set(v.split(':')[0] for v in cells if ':' in v))
+
+    skeleton, values = get_skeleton(username, request, mode, modules)
+    template = skeleton.fill(values)
+    elements = list(template.iter())
+    ordinals = dict((elem, ordinal) for ordinal, elem in enumerate(elements))
+    slots = [(ordinal, bound[index]) for ordinal, index in skeleton.slots if index in bound]
+    if not slots:
+        raise ValueError('Template columns do not match schema leaves')
+
+    # innermost list entry containing all column leaves
+    common = None
+    for ordinal, _ in slots:
+        chain = [ordinal] + [ordinals[elem] for elem in elements[ordinal].iterancestors()]
+        common = chain if common is None else [o for o in common if o in chain]
+    start = next((ordinal for ordinal in common if ordinal in skeleton.lists), None)
+    if start is None:
+        raise ValueError('Template columns are not in a list')
+
+    # entry subtree follows its element in iter() order
+    slots = [(ordinal - start, column) for ordinal, column in slots]
+    entry = elements[start]
+    parent = entry.getparent()
+    position = parent.index(entry)
+    target = ordinals[parent]
+    parent.remove(entry)
+
+    rpcs = []
+    for first in range(0, count, chunk):
+        rpc = copy.deepcopy(template)
+        container = next(itertools.islice(rpc.iter(), target, None))
+        for row in range(first, min(first + chunk, count)):
+            item = copy.deepcopy(entry)
+            items = list(item.iter())
+            for ordinal, column in slots:
+                items[ordinal].text = columns[column][row] or None
+            container.insert(position + row - first, item)
+        rpcs.append(rpc)
+
+    logging.debug('Generated %d netconf RPCs for %d entries' % (len(rpcs), count))
+    return rpcs
+
+
+def gen_netconf_task(username, payloads):
+    """
+    Generate netconf RPCs for a list of (key, payload text) in one pass,
+    module CXML and skeletons are shared through process caches. RPCs
+    are serialized only when run in a worker process.
+
+    Returns: list of (key, rpc element (text in worker) or None, error message)
+    """
+    results = []
+    for key, payload in payloads:
+        try:
+            rpc = gen_netconf(username, ET.fromstring(payload), '')
+        except Exception as e:
+            logging.exception('Failed to generate netconf RPC')
+            results.append((key, None, str(e) or e.__class__.__name__))
+            continue
+        if rpc is None:
+            results.append((key, None, 'Empty RPC'))
+        elif workers.in_worker():
+            results.append((key, ET.tostring(rpc), ''))
+        else:
+            results.append((key, rpc, ''))
+    return results
+
+
+def get_cache_stats():
+    """ Returns RPC skeleton cache counters """
+    return _skeleton_cache.stats()
 
 
 def get_rpc_from_request(request):
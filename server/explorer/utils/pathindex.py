@@ -0,0 +1,502 @@
+"""
+    Copyright 2016, Cisco Systems, Inc
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+
+    @author: Pravin Gohite, Cisco Systems, Inc.
+
+    Per module xpath search index (.xidx), written next to cxml file at
+    compile time.
+
+    Nodes are numbered in document order (same order as CxmlIterator),
+    each node is stored as (parent id, name token id, subtree end), so
+    descendants of a node are the id range [node, end). Path tokens are
+    the node names, a token maps to the list of nodes (postings) with
+    that name.
+
+    A substring query is answered by scanning the token vocabulary for
+    the longest '/' free piece of the query, the piece must be inside
+    the name of one node along a matching path. Paths of nodes in the
+    subtrees of matching names are verified against full query.
+
+    Regex, glob, fuzzy and token queries are ranked. Token names are
+    narrowed with a trigram index of the vocabulary (built on first use),
+    a fuzzy piece with k edits must share all but 3k trigrams with a
+    matching name. A path scores one point per query term plus one for
+    every term equal to a whole path segment, ties go to shorter paths.
+
+    Full text (text mode) queries are answered from per field inverted
+    indexes of words in node description, datatype, values, default
+    and key. Words are lower case alphanumeric runs (no stemming). Type
+    and access are indexed by whole value. Free words must appear in any
+    of the text fields, a field:value term restricts a word to one field
+    (key:name) or matches whole type / access value (type:leaf does not
+    match leaf-list).
+"""
+
+import os
+import re
+import json
+import heapq
+import fnmatch
+import logging
+import sre_parse
+from collections import defaultdict
+import lxml.etree as ET
+from explorer.utils.lru import LRUCache
+
+_index_cache_size = 64 * 1024 * 1024
+
+# bump when index layout changes, older artifacts are rebuilt
+INDEX_VERSION = 3
+
+# modes answered by PathIndex.rank, anything else is a substring search
+RANKED_MODES = ('regex', 'glob', 'fuzzy', 'token', 'text')
+
+# full text fields, free words of a text query match TEXT_FIELDS
+TEXT_FIELDS = ('description', 'datatype', 'values', 'default', 'key')
+# fields indexed and filtered by whole (lower case) value
+VALUE_FIELDS = ('type', 'access')
+FIELDS = TEXT_FIELDS + VALUE_FIELDS
+
+_word_split = re.compile(r'[-_:./\s]+')
+_text_split = re.compile(r'[^0-9a-z]+')
+
+
+def index_path(filename):
+    """ Returns path of search index artifact for a cxml file """
+    return os.path.splitext(os.path.realpath(filename))[0] + '.xidx'
+
+
+def _index_cxml(filename):
+    """ Returns index dictionary for a cxml file """
+    root = ET.parse(filename).getroot()
+    tokens = {}
+    names = []
+    parents = []
+    text = dict((field, defaultdict(list)) for field in FIELDS)
+
+    def token(name):
+        tid = tokens.get(name, None)
+        if tid is None:
+            tid = tokens[name] = len(tokens)
+        return tid
+
+    stack = [(root, -1)]
+    while stack:
+        element, parent = stack.pop()
+        nid = len(names)
+        names.append(token(element.get('name', '')))
+        parents.append(parent)
+        for field in FIELDS:
+            if field == 'description':
+                value = element.findtext('description')
+            else:
+                value = element.get(field)
+            if not value:
+                continue
+            if field in VALUE_FIELDS:
+                text[field][value.lower()].append(nid)
+            else:
+                for word in set(_text_words(value)):
+                    text[field][word].append(nid)
+        children = [c for c in element if c.tag == 'node']
+        for child in reversed(children):
+            stack.append((child, nid))
+
+    ends = list(range(1, len(names) + 1))
+    for nid in range(len(names) - 1, 0, -1):
+        if ends[nid] > ends[parents[nid]]:
+            ends[parents[nid]] = ends[nid]
+
+    vocabulary = [None] * len(tokens)
+    for name, tid in tokens.items():
+        vocabulary[tid] = name
+    return {
+        'version': INDEX_VERSION,
+        'size': os.path.getsize(filename),
+        'tokens': vocabulary,
+        'names': names,
+        'parents': parents,
+        'ends': ends,
+        'text': text,
+    }
+
+
+def build_index(filename):
+    """ Build search index for a cxml file, returns PathIndex or None """
+    target = index_path(filename)
+    try:
+        index = _index_cxml(filename)
+    except:
+        logging.error('build_index: Failed to parse %s' % filename)
+        return None
+
+    try:
+        with open(target, 'w') as f:
+            f.write(json.dumps(index, separators=(',', ':')))
+    except (IOError, OSError):
+        logging.exception('build_index: Failed to write %s' % target)
+    logging.debug('build_index: %s -> %d nodes' % (target, len(index['names'])))
+    return PathIndex(index)
+
+
+class PathIndex(object):
+    """ Loaded search index of one module """
+    def __init__(self, index):
+        self.tokens = index['tokens']
+        self.names = index['names']
+        self.parents = index['parents']
+        self.ends = index['ends']
+        self.text = index['text']
+        self._paths = {}
+        self._postings = None
+        self._trigrams = None
+        self._words = None
+
+    def __len__(self):
+        return len(self.names)
+
+    def postings(self):
+        """ Returns list of node ids per token id """
+        if self._postings is None:
+            postings = [[] for _ in self.tokens]
+            for nid, tid in enumerate(self.names):
+                postings[tid].append(nid)
+            self._postings = postings
+        return self._postings
+
+    def path(self, nid):
+        """ Returns slash joined path of a node """
+        path = self._paths.get(nid, None)
+        if path is None:
+            name = self.tokens[self.names[nid]]
+            parent = self.parents[nid]
+            path = self.path(parent) + '/' + name if parent >= 0 else name
+            self._paths[nid] = path
+        return path
+
+    def trigrams(self):
+        """ Returns dict of trigram -> ids of tokens containing it """
+        if self._trigrams is None:
+            trigrams = defaultdict(list)
+            for tid, token in enumerate(self.tokens):
+                for gram in _trigrams(token):
+                    trigrams[gram].append(tid)
+            self._trigrams = dict(trigrams)
+        return self._trigrams
+
+    def words(self):
+        """ Returns dict of lower case word -> ids of tokens containing it """
+        if self._words is None:
+            words = defaultdict(list)
+            for tid, token in enumerate(self.tokens):
+                for word in set(_words(token)):
+                    words[word].append(tid)
+            self._words = dict(words)
+        return self._words
+
+    def tokens_containing(self, piece):
+        """ Returns ids of tokens containing piece """
+        grams = _trigrams(piece)
+        if not grams:
+            return [tid for tid, token in enumerate(self.tokens) if piece in token]
+
+        trigrams = self.trigrams()
+        lists = sorted((trigrams.get(gram, []) for gram in grams), key=len)
+        tids = set(lists[0])
+        for tlist in lists[1:]:
+            if not tids:
+                break
+            tids.intersection_update(tlist)
+        return [tid for tid in sorted(tids) if piece in self.tokens[tid]]
+
+    def tokens_near(self, piece, errors):
+        """ Returns ids of tokens containing piece with at most errors edits """
+        grams = _trigrams(piece)
+        threshold = len(grams) - 3 * errors
+        if threshold > 0:
+            trigrams = self.trigrams()
+            counts = defaultdict(int)
+            for gram in grams:
+                for tid in trigrams.get(gram, []):
+                    counts[tid] += 1
+            tids = sorted(tid for tid, count in counts.items() if count >= threshold)
+        else:
+            tids = range(len(self.tokens))
+        return [tid for tid in tids if _within(piece, self.tokens[tid], errors)]
+
+    def subtrees(self, tids):
+        """ Returns ids of nodes (in document order) in subtrees of nodes named by tids """
+        postings = self.postings()
+        ranges = []
+        for tid in tids:
+            ranges.extend((nid, self.ends[nid]) for nid in postings[tid])
+        ranges.sort()
+
+        # merge nested subtree ranges
+        result = []
+        last = 0
+        for start, end in ranges:
+            start = max(start, last)
+            if start < end:
+                result.extend(range(start, end))
+                last = end
+        return result
+
+    def candidates(self, query):
+        """ Returns ids of nodes (in document order) whose path may contain query """
+        pieces = [piece for piece in query.split('/') if piece]
+        if not pieces:
+            return range(len(self.names))
+        return self.subtrees(self.tokens_containing(max(pieces, key=len)))
+
+    def search(self, query, limit=None):
+        """ Returns paths (excluding module root) containing query """
+        result = []
+        for nid in self.candidates(query):
+            if nid == 0:
+                continue
+            path = self.path(nid)
+            if query in path:
+                result.append(path)
+                if limit is not None and len(result) >= limit:
+                    break
+        return result
+
+    def rank(self, query, mode, limit=None):
+        """
+        Returns [(score, path)] of best limit paths (excluding module root)
+        matching a regex, glob, fuzzy, token or text query, best first.
+        Raises re.error for an invalid regex.
+        """
+        nodes, terms, match = _plans[mode](self, query)
+        if nodes is None:
+            nodes = range(len(self.names))
+        matches = ((score(terms, path), path)
+                   for path in (self.path(nid) for nid in nodes if nid != 0)
+                   if match(path))
+        key = lambda item: (-item[0], item[1])
+        if limit is None:
+            return sorted(matches, key=key)
+        return heapq.nsmallest(limit, matches, key=key)
+
+
+def _trigrams(text):
+    return set(text[i:i + 3] for i in range(len(text) - 2))
+
+
+def _words(text):
+    return [word for word in _word_split.split(text.lower()) if word]
+
+
+def _text_words(text):
+    return [word for word in _text_split.split(text.lower()) if word]
+
+
+def _within(piece, text, errors):
+    """ Returns True if a substring of text is at most errors edits from piece """
+    if errors == 0:
+        return piece in text
+    if len(piece) <= errors:
+        return True
+
+    # edit distance of piece prefixes to best substring ending at each char
+    column = list(range(len(piece) + 1))
+    for char in text:
+        previous, column[0] = column[0], 0
+        for i in range(1, len(column)):
+            cost = 0 if piece[i - 1] == char else 1
+            previous, column[i] = column[i], min(previous + cost, column[i] + 1, column[i - 1] + 1)
+        if column[-1] <= errors:
+            return True
+    return False
+
+
+def _errors(piece):
+    """ Returns number of edits allowed for a fuzzy query piece """
+    if len(piece) < 4:
+        return 0
+    return 1 if len(piece) < 8 else 2
+
+
+def _regex_literals(query):
+    """ Returns literal strings every match of a regex must contain """
+    parsed = sre_parse.parse(query)
+    if parsed.pattern.flags & sre_parse.SRE_FLAG_IGNORECASE:
+        return []
+
+    literals = []
+    run = []
+    for op, av in parsed:
+        if op == sre_parse.LITERAL:
+            run.append(unichr(av))
+            continue
+        literals.append(u''.join(run))
+        run = []
+    literals.append(u''.join(run))
+    return literals
+
+
+def _pieces(literals):
+    return [piece for literal in literals for piece in literal.split('/') if piece]
+
+
+def _narrow(index, pieces):
+    """ Returns candidate nodes for longest piece, None if there is no piece """
+    if not pieces:
+        return None
+    return index.subtrees(index.tokens_containing(max(pieces, key=len)))
+
+
+def _plan_regex(index, query):
+    pattern = re.compile(query)
+    pieces = _pieces(_regex_literals(query))
+    return _narrow(index, pieces), pieces, lambda path: pattern.search(path) is not None
+
+
+def _plan_glob(index, query):
+    pattern = re.compile(fnmatch.translate(query))
+    pieces = _pieces(re.split(r'\[[^\]]*\]|[*?]', query))
+    return _narrow(index, pieces), pieces, lambda path: pattern.match(path) is not None
+
+
+def _plan_fuzzy(index, query):
+    pieces = [piece for piece in query.split('/') if piece]
+    if not pieces:
+        return None, [], lambda path: True
+
+    postings = index.postings()
+    names = []
+    narrowest = None
+    for piece in pieces:
+        tids = index.tokens_near(piece, _errors(piece))
+        names.append(set(index.tokens[tid] for tid in tids))
+        # narrow to piece with fewest candidate nodes
+        size = sum(index.ends[nid] - nid for tid in tids for nid in postings[tid])
+        if narrowest is None or size < narrowest[0]:
+            narrowest = (size, tids)
+
+    def match(path):
+        # pieces must match path segments in order
+        i = 0
+        for segment in path.split('/'):
+            if segment in names[i]:
+                i += 1
+                if i == len(names):
+                    return True
+        return False
+    return index.subtrees(narrowest[1]), pieces, match
+
+
+def _plan_token(index, query):
+    words = set(_words(query))
+    if not words:
+        return None, [], lambda path: True
+
+    index_words = index.words()
+    tids = min((index_words.get(word, []) for word in words), key=len)
+    return index.subtrees(tids), list(words), lambda path: words.issubset(_words(path))
+
+
+def _plan_text(index, query):
+    words = []
+    postings = []
+    for term in query.split():
+        field, _, value = term.partition(':')
+        field = field.lower()
+        if value and field in VALUE_FIELDS:
+            postings.append(set(index.text[field].get(value.lower(), [])))
+            continue
+        if value and field in FIELDS:
+            fields = [field]
+        else:
+            fields, value = TEXT_FIELDS, term
+        for word in _text_words(value):
+            nodes = set()
+            for field in fields:
+                nodes.update(index.text[field].get(word, []))
+            postings.append(nodes)
+            if fields is TEXT_FIELDS:
+                words.append(word)
+
+    if not postings:
+        return [], [], lambda path: True
+
+    # nodes with every word, smallest set first
+    postings.sort(key=len)
+    nodes = postings[0]
+    for other in postings[1:]:
+        nodes = nodes.intersection(other)
+    return sorted(nodes), words, lambda path: True
+
+
+_plans = {
+    'regex': _plan_regex,
+    'glob': _plan_glob,
+    'fuzzy': _plan_fuzzy,
+    'token': _plan_token,
+    'text': _plan_text,
+}
+
+
+def score(terms, path):
+    """
+    Returns relevance of a matching path for query terms, one point per
+    term and one more for a term equal to a path segment, the fraction
+    is higher for shorter paths.
+    """
+    segments = set(path.split('/'))
+    points = len(terms) + sum(1 for term in terms if term in segments)
+    return round(points + 1.0 / (1 + len(path)), 6)
+
+
+_index_cache = LRUCache(_index_cache_size, 'pathindex')
+
+
+def load_index(filename):
+    """
+    Returns PathIndex for a cxml file from cache or index artifact,
+    index is (re)built if artifact is missing or stale.
+    """
+    path = os.path.realpath(filename)
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+
+    tag = (st.st_mtime, st.st_size)
+    index = _index_cache.get(path, tag)
+    if index is not None:
+        return index
+
+    target = index_path(filename)
+    try:
+        if os.path.getmtime(target) < st.st_mtime:
+            raise ValueError('stale index')
+        with open(target, 'r') as f:
+            data = json.loads(f.read())
+        if data.get('size', -1) != st.st_size or data.get('version') != INDEX_VERSION:
+            raise ValueError('stale index')
+        index = PathIndex(data)
+    except (OSError, IOError, ValueError):
+        index = build_index(filename)
+
+    if index is not None:
+        _index_cache.put(path, index, 100 * len(index), tag)
+    return index
+
+
+def get_cache_stats():
+    """ Returns search index cache counters """
+    return _index_cache.stats()
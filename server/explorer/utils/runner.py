@@ -94,11 +94,12 @@ class NCClient(object):
             reply.text = 'NetConf Session could not be established\n{%s}' % str(self)
             return reply
 
+        # rpc element is handed to ncclient as is, no text round trip
         parser = NetconfParser(rpc)
-        logging.debug("SEND: \n========\n%s\n========\n" % str(parser))
+        logging.debug("SEND: \n========\n%s\n========\n", parser)
 
         op = parser.get_operation()
-        data = ET.tostring(parser.get_data(), pretty_print=True)
+        data = parser.get_data()
         datastore = parser.get_datastore()
         try:
             if op == 'get':
@@ -117,7 +118,7 @@ class NCClient(object):
                                                 error_option=eoption,
                                                 config=data).xml
             else:
-                response = self.handle.dispatch(ET.fromstring(data)).xml
+                response = self.handle.dispatch(data).xml
             """
             reply = 'NETCONF REQUEST:\n'
             reply += '================\n\n'
@@ -16,42 +16,123 @@
     @author: Pravin Gohite, Cisco Systems, Inc.
 """
 
+import re
+import heapq
+import hashlib
 import logging
 import lxml.etree as ET
-from explorer.utils.cxml import CxmlIterator
+from django.core.cache import caches
+from django.core.cache.backends.base import InvalidCacheBackendError
+from explorer.utils.pathindex import load_index, score, RANKED_MODES
 from explorer.utils.admin import ModuleAdmin
+from explorer.utils.misc import ServerSettings
+import explorer.utils.workers as workers
 
 
-def search_module(username, module, query):
-    """ Search query in one module """
-    result = []
+def _cache():
+    """ Returns django cache for search results ('search' if configured) """
+    try:
+        return caches['search']
+    except InvalidCacheBackendError:
+        return caches['default']
+
+
+def search_module(username, module, query, limit=None, mode=None):
+    """
+    Search query in one module, returns at most limit (score, path).
+    Ranked modes return best paths first, substring matches are in
+    document order.
+    """
     filename = ModuleAdmin.cxml_path(username, module)
-    cxml_i = CxmlIterator(filename)
-    for path, _ in cxml_i:
-        if query in path:
-            result.append(path)
-    return result
+    if filename is None:
+        return []
+    index = load_index(filename)
+    if index is None:
+        return []
+    if mode in RANKED_MODES:
+        return index.rank(query, mode, limit)
+
+    terms = [piece for piece in query.split('/') if piece]
+    return [(score(terms, path), path) for path in index.search(query, limit)]
 
 
-def search(username, query):
+def search(username, query, limit=None, offset=0, mode=None):
     """
     Search query text in user modules
     Args:
         username: Request username
         query: Search String
+        limit: Maximum number of paths to return (None for all)
+        offset: Number of matching paths to skip
+        mode: regex, glob, fuzzy, token or text, substring search otherwise
 
     Returns: An XML object with result XPATHs
+
+    Results are cached by user module set generation, which changes
+    with every module set change, so a stale result is never returned.
     """
-    logging.debug('Searching query %s in user (%s) modules' % (query, username))
+    key = '|'.join([username, ModuleAdmin.get_generation(username), mode or '',
+                    str(limit), str(offset), query])
+    key = 'search:' + hashlib.sha1(key.encode('utf-8')).hexdigest()
+    cache = _cache()
+    content = cache.get(key, None)
+    if content is not None:
+        logging.debug('Search result for %s (%s) from cache' % (query, username))
+        return True, ET.fromstring(content)
+
+    rc, response = _search(username, query, limit, offset, mode)
+    if rc:
+        content = ET.tostring(response)
+        if len(content) <= ServerSettings.search_cache_entry_size():
+            cache.set(key, content)
+    return rc, response
+
+
+def _search(username, query, limit, offset, mode):
+    logging.debug('Searching query %s (%s) in user (%s) modules' % (query, mode, username))
+    if mode == 'regex':
+        try:
+            re.compile(query)
+        except re.error as e:
+            return False, 'Invalid regex: %s' % e
+
     response = ET.Element('result')
 
+    # modules are searched in parallel, no module needs to return more
+    # than offset + limit (+1 to find if there are more results)
+    cap = offset + limit + 1 if limit is not None else None
     modulenames = ModuleAdmin.get_modulelist(username)
-    for module in modulenames:
-        result = search_module(username, module, query)
-        for xpath in result:
-            path = ET.Element('path')
-            path.set('module', module)
-            path.text = xpath
-            response.append(path)
+    tasks = [(username, module, query, cap, mode) for module in modulenames]
+    results = workers.imap(search_module, tasks)
+
+    if mode in RANKED_MODES:
+        # best paths of all modules, merge of per module ranked lists
+        ranked = [[(-value, path, modulenames[i]) for value, path in result]
+                  for i, result in enumerate(results)]
+        matches = ((module, -value, path) for value, path, module in heapq.merge(*ranked))
+    else:
+        matches = ((modulenames[i], value, path)
+                   for i, result in enumerate(results) for value, path in result)
+
+    skipped = count = 0
+    more = False
+    for module, value, xpath in matches:
+        if skipped < offset:
+            skipped += 1
+            continue
+        if limit is not None and count >= limit:
+            more = True
+            break
+        path = ET.Element('path')
+        path.set('module', module)
+        path.set('score', '%g' % value)
+        path.text = xpath
+        response.append(path)
+        count += 1
 
+    # stop submitting remaining modules
+    results.close()
+    response.set('offset', str(offset))
+    if more:
+        response.set('more', 'true')
     return True, response
@@ -0,0 +1,99 @@
+"""
+    Copyright 2016, Cisco Systems, Inc
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+
+    @author: Pravin Gohite, Cisco Systems, Inc.
+
+    Content addressed store of compiled modules. A compiled cxml is
+    stored once under data/store/<hash[:2]>/<hash>.xml where hash covers
+    the yang source, its resolved dependency set and the cxml plugin.
+    User and session cxml entries are symbolic links into the store, so
+    artifacts derived from cxml (located through realpath) and caches
+    keyed on realpath are shared by all users of the same module.
+"""
+
+import os
+import hashlib
+import logging
+from django.conf import settings
+from explorer.utils.misc import ServerSettings
+
+
+def _update(sha, filename):
+    sha.update(os.path.basename(filename).encode('utf-8') + b'\0')
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha.update(chunk)
+    sha.update(b'\0')
+
+
+def content_hash(yangfile, dependencies):
+    """ Returns hash of yang file, its dependency files and cxml plugin """
+    sha = hashlib.sha1()
+    _update(sha, os.path.join(settings.BASE_DIR, 'explorer', 'plugins', 'cxml.py'))
+    _update(sha, yangfile)
+    for dependency in sorted(set(dependencies), key=os.path.basename):
+        _update(sha, dependency)
+    return sha.hexdigest()
+
+
+def object_path(digest):
+    """ Returns path of stored cxml for a content hash """
+    return os.path.join(ServerSettings.store_path(), digest[:2], digest + '.xml')
+
+
+def lookup(digest):
+    """ Returns path of stored cxml or None """
+    path = object_path(digest)
+    return path if os.path.exists(path) else None
+
+
+def link(digest, cxmlfile):
+    """ Replace cxmlfile with a reference to stored cxml """
+    target = os.path.abspath(object_path(digest))
+    try:
+        if os.path.lexists(cxmlfile):
+            os.remove(cxmlfile)
+        os.symlink(target, cxmlfile)
+    except (OSError, AttributeError):
+        logging.exception('store: Failed to link %s -> %s' % (cxmlfile, target))
+        return False
+    return True
+
+
+def add(digest, cxmlfile):
+    """
+    Move compiled cxml into store and replace it with a reference,
+    cxmlfile is left untouched if store is not usable.
+    """
+    target = object_path(digest)
+    try:
+        if not os.path.exists(os.path.dirname(target)):
+            os.makedirs(os.path.dirname(target))
+        os.rename(cxmlfile, target)
+    except OSError:
+        logging.exception('store: Failed to add %s' % cxmlfile)
+        return False
+
+    if not link(digest, cxmlfile):
+        os.rename(target, cxmlfile)
+        return False
+
+    logging.debug('store: %s -> %s' % (cxmlfile, target))
+    return True
+
+
+def is_reference(cxmlfile):
+    """ Returns True if cxmlfile refers to a stored cxml """
+    return os.path.islink(cxmlfile)
@@ -21,6 +21,8 @@ import tempfile
 import lxml.etree as ET
 from explorer.utils.yang import Parser, Compiler
 from explorer.utils.misc import ServerSettings
+from explorer.utils.admin import ModuleAdmin
+import explorer.utils.store as store
 
 ignore_list = ['tailf-common', 'ietf-yang-types', 'ietf-inet-types', 'xmas']
 
@@ -160,6 +162,10 @@ def commit_files(user, session):
             _clean_oldfiles(yangdst, base)
             _clean_oldfiles(cxmldst, base)
             os.rename(yang_src_path, yang_dst_path)
+            if not store.is_reference(cxmlpath):
+                for src, dst in zip(Compiler.artifacts(cxmlpath), Compiler.artifacts(cxml_dst_path)):
+                    if os.path.exists(src):
+                        os.rename(src, dst)
             os.rename(cxmlpath, cxml_dst_path)
             module = ET.Element('module')
             module.text = base + '.yang'
@@ -179,6 +185,7 @@ def commit_files(user, session):
 
         # added module might affect existing module, recompile them
         _compile_dependecies(user, [m.text for m in modules], None)
+        ModuleAdmin.bump_generation(user)
 
     logging.debug('Committed ' + str(count) + ' file(s)')
     return True, modules
@@ -0,0 +1,114 @@
+"""
+    Copyright 2016, Cisco Systems, Inc
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+
+    @author: Pravin Gohite, Cisco Systems, Inc.
+
+    Process pool shared by server requests for CPU bound fan-out work
+    (search across modules, batch RPC generation). Pool is created on
+    first use and reused until number of processes is changed, it is
+    terminated at exit. Worker processes keep their own module caches,
+    their cache budgets are divided by the number of workers.
+"""
+
+import atexit
+import logging
+import threading
+import multiprocessing
+from collections import deque
+from explorer.utils.misc import ServerSettings
+from explorer.utils.lru import share_budgets
+
+_pool = None
+_pool_processes = 0
+_pool_lock = threading.Lock()
+
+# set in worker processes of the pool
+_in_worker = False
+
+
+def _init_worker(processes):
+    global _in_worker
+    _in_worker = True
+    share_budgets(processes)
+
+
+def in_worker():
+    """ Returns True in a worker process, results must be picklable there """
+    return _in_worker
+
+
+def get_pool():
+    """ Returns shared worker pool, None if workers are disabled """
+    global _pool, _pool_processes
+    processes = ServerSettings.worker_processes()
+
+    with _pool_lock:
+        if _pool is not None and _pool_processes != processes:
+            # running tasks of old pool complete before its workers exit
+            logging.debug('Closing worker pool with %d processes' % _pool_processes)
+            _pool.close()
+            _pool = None
+
+        if _pool is None and processes > 1:
+            logging.debug('Starting worker pool with %d processes' % processes)
+            _pool = multiprocessing.Pool(processes, _init_worker, (processes,))
+            _pool_processes = processes
+    return _pool
+
+
+def terminate():
+    """ Terminate shared worker pool, next use starts a new one """
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.terminate()
+            _pool = None
+
+
+atexit.register(terminate)
+
+
+def imap(func, tasks, window=None):
+    """
+    Apply func to each argument tuple in tasks using worker pool and
+    yield results in task order.
+
+    At most window tasks are outstanding at any time, when caller stops
+    iterating (break / close) remaining tasks are never submitted. func
+    must be a module level function (picklable). Tasks run in calling
+    process if workers are disabled or there is only one task.
+    """
+    pool = get_pool() if len(tasks) > 1 else None
+    if pool is None:
+        for args in tasks:
+            yield func(*args)
+        return
+
+    if window is None:
+        window = 2 * ServerSettings.worker_processes()
+
+    pending = deque()
+    tasks = iter(tasks)
+    for args in tasks:
+        pending.append(pool.apply_async(func, args))
+        if len(pending) >= window:
+            break
+
+    while pending:
+        result = pending.popleft().get()
+        for args in tasks:
+            pending.append(pool.apply_async(func, args))
+            break
+        yield result
@@ -16,43 +16,66 @@
 
 
 class XPathTree(object):
+    """
+    Tree of xpath segments, children are keyed by name. Nodes created
+    by an insert share the attrib of that insert, existing nodes keep
+    their attrib.
+    """
+    __slots__ = ('name', 'attrib', 'children')
+
     def __init__(self, name, attrib):
         self.name = name
         self.attrib = attrib
-        self.children = set()
+        # created on first child, most nodes are leaves
+        self.children = None
 
     def __str__(self):
         return self.name
 
-    def _insert(self, names, attrib):
-        for child in self.children:
-            if child.name == names[0]:
-                break
-        else:
-            child = XPathTree(names[0], attrib)
-            self.children.add(child)
-
-        if len(names) > 1:
-            child._insert(names[1:], attrib)
+    def _child(self, name, attrib):
+        """ Returns child by name, created with attrib if not present """
+        if self.children is None:
+            self.children = {}
+        child = self.children.get(name, None)
+        if child is None:
+            child = self.children[name] = XPathTree(name, attrib)
+        return child
 
     def insert(self, xpath, attrib):
         if not xpath:
             return
-        self._insert(xpath.strip().split('/'), attrib)
+        node = self
+        for name in xpath.strip().split('/'):
+            node = node._child(name, attrib)
+
+    def bulk_insert(self, xpaths, attrib):
+        """
+        Insert many xpaths, parent of previous xpath is reused when next
+        xpath is its sibling, so sorted input walks each parent once.
+        """
+        last, parent = None, self
+        for xpath in xpaths:
+            xpath = xpath.strip()
+            if not xpath:
+                continue
+            prefix, _, name = xpath.rpartition('/')
+            if prefix != last:
+                parent = self
+                if prefix:
+                    for segment in prefix.split('/'):
+                        parent = parent._child(segment, attrib)
+                last = prefix
+            parent._child(name, attrib)
 
     def search(self, xpath):
+        """ Returns node matching xpath or None """
         if not xpath:
             return None
-        return self._search(xpath.strip().split('/'))
-
-    def _search(self, names):
-        if not names:
-            return None
-
-        for child in self.children:
-            if child.name == names[0]:
-                if len(names) == 1:
-                    return self
-                return child._search(names[1:])
-
-        return None
\ No newline at end of file
+        node = self
+        for name in xpath.strip().split('/'):
+            if node.children is None:
+                return None
+            node = node.children.get(name, None)
+            if node is None:
+                return None
+        return node
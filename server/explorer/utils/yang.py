@@ -23,6 +23,10 @@ import lxml.etree as ET
 from django.conf import settings
 from explorer.utils.dygraph import DYGraph
 from explorer.utils.misc import ServerSettings
+from explorer.utils.cxb import compile_cxb, cxb_path
+from explorer.utils.cxml import build_offsets, offsets_path
+from explorer.utils.pathindex import build_index, index_path
+import explorer.utils.store as store
 
 
 class Parser(object):
@@ -154,7 +158,41 @@ class Compiler(object):
                 fd.write(ET.tostring(node))
             logging.debug('compile_cxml: Empty output from pyang, created default cxml!!')
 
-        return Compiler.invoke_compile(command, cxmlfile, empty_callback)
+        # identical module + dependency set compiled earlier (by any user)
+        closure = Compiler.get_dependencies(username, [filename], session, transitive=True)
+        digest = store.content_hash(yangfile, closure)
+        if store.lookup(digest) is not None and store.link(digest, cxmlfile):
+            logging.debug('compile_cxml: %s found in store (%s)' % (modulename, digest))
+            return True, ET.Element('messages')
+
+        # never write through a reference into shared store
+        if store.is_reference(cxmlfile):
+            os.remove(cxmlfile)
+
+        (rc, msgs) = Compiler.invoke_compile(command, cxmlfile, empty_callback)
+        if rc and os.path.exists(cxmlfile):
+            store.add(digest, cxmlfile)
+            Compiler.compile_artifacts(cxmlfile)
+        return rc, msgs
+
+    @staticmethod
+    def compile_artifacts(cxmlfile):
+        """
+        Build read-only artifacts derived from cxml file (binary schema,
+        subtree offsets, search index)
+        """
+        compile_cxb(cxmlfile)
+        build_offsets(cxmlfile)
+        build_index(cxmlfile)
+
+    @staticmethod
+    def artifacts(cxmlfile):
+        """
+        Returns list of artifact paths derived from cxml file, artifacts
+        must be moved / deleted along with cxml file unless cxml file is
+        a reference into store (artifacts are shared)
+        """
+        return [cxb_path(cxmlfile), offsets_path(cxmlfile), index_path(cxmlfile)]
 
     @staticmethod
     def compile_pyimport(username, session=None):
@@ -200,9 +238,10 @@ class Compiler(object):
         return Compiler.invoke_compile(command, depfile)
 
     @staticmethod
-    def get_dependencies(username, modules, session):
+    def get_dependencies(username, modules, session, transitive=False):
         """
-        return dependencies for given yang models
+        return dependencies for given yang models, with transitive set
+        imports and includes of dependencies are also returned
         """
         session_dir = ''
         logging.debug("get_dependencies: Target Modules " + str(modules))
@@ -235,6 +274,9 @@ class Compiler(object):
             for name in module.depends:
                 dmodules.add(name)
 
+        if transitive:
+            dmodules = dgraph.closure(dmodules)
+
         dmodules_list = list(dmodules)
 
         deplist = []
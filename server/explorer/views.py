@@ -18,13 +18,19 @@ limitations under the License.
 from __future__ import print_function
 
 import os
+import gzip
 import logging
 import shutil
+import hashlib
 import lxml.etree as ET
 from django.contrib.auth import authenticate, login, logout
-from django.http import HttpResponse
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
 from django.shortcuts import render_to_response
 from django.template import RequestContext
+from django.template.loader import render_to_string
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags, quote_etag
 from django.views.decorators.csrf import csrf_exempt
 from explorer.utils.misc import Response
 from explorer.utils.adapter import Adapter
@@ -34,8 +40,12 @@ from explorer.utils.admin import ModuleAdmin
 from explorer.utils.schema import get_schema, download_schema, add_schema
 import explorer.utils.uploader as Uploader
 import explorer.utils.search as Search
+import explorer.utils.complete as Complete
 import explorer.utils.cxml as cxml
-from  explorer.utils.annotations import annotate
+import explorer.utils.jsonxml as jsonxml
+import explorer.utils.pathindex as pathindex
+import explorer.utils.annotations as annotations
+import explorer.utils.netconf as netconf
 
 logging.basicConfig(level=logging.WARNING)
 logger = logging.getLogger(__name__)
@@ -159,11 +169,13 @@ def upload_handler(request):
 def admin_handler(request):
     """ HTTP Request handler function to handle actions on yang modules """
 
+    fmt = Response.format(request)
+    ctype = Response.content_type(fmt)
     if not request.user.is_authenticated():
-        return HttpResponse(Response.error(None, 'User must be logged in'))
+        return HttpResponse(Response.error(None, 'User must be logged in', fmt=fmt), content_type=ctype)
 
     if request.method != 'GET':
-        return HttpResponse(Response.error(None, 'Invalid admin Request'))
+        return HttpResponse(Response.error(None, 'Invalid admin Request', fmt=fmt), content_type=ctype)
 
     action = request.GET.get('action', '')
     logger.info('Received admin request %s for user %s' % (action, request.user.username))
@@ -173,13 +185,24 @@ def admin_handler(request):
         print(str(payload))
         (rc, msg) = ModuleAdmin.admin_action(request.user.username, payload, action)
         if not rc:
-            return HttpResponse(Response.error(action, msg))
+            return HttpResponse(Response.error(action, msg, fmt=fmt), content_type=ctype)
 
     if action == 'graph':
-        return HttpResponse(Response.success(action, msg))
+        return HttpResponse(Response.success(action, msg, fmt=fmt), content_type=ctype)
+
+    if action == 'stats':
+        stats = ET.Element('stats')
+        for counters in [cxml.get_cache_stats(), pathindex.get_cache_stats(),
+                         Complete.get_cache_stats(), annotations.get_cache_stats(),
+                         netconf.get_cache_stats()]:
+            stats_cache = ET.Element('cache')
+            for key, value in counters.items():
+                stats_cache.set(key, str(value))
+            stats.append(stats_cache)
+        return HttpResponse(Response.success(action, 'ok', xml=stats, fmt=fmt), content_type=ctype)
 
     modules = ModuleAdmin.get_modules(request.user.username)
-    return HttpResponse(Response.success(action, 'ok', xml=modules))
+    return HttpResponse(Response.success(action, 'ok', xml=modules, fmt=fmt), content_type=ctype)
 
 
 def request_handler(request):
@@ -245,6 +268,48 @@ def request_handler(request):
     return HttpResponse(Response.success(mode, 'ok', reply_xml))
 
 
+@csrf_exempt
+def generate_handler(request):
+    """
+    Handle bulk (gen-rpc-bulk) and batch (gen-rpc-batch) RPC generation
+    requests, parameters may be POSTed as value tables and payload lists
+    do not fit in a GET request.
+    """
+    if not request.user.is_authenticated():
+        return HttpResponse(Response.error(None, 'User must be logged in'))
+
+    params = request.POST if request.method == 'POST' else request.GET
+    mode = params.get('mode', '')
+    logger.info('generate_handler: Received Request: (%s)' % mode)
+
+    if mode == 'gen-rpc-bulk':
+        try:
+            chunk = params.get('chunk', '')
+            chunk = int(chunk) if chunk else None
+            reply_xml = Adapter.gen_rpc_bulk(request.user.username, params.get('payload', ''),
+                                             params.get('table', ''), chunk)
+        except (ValueError, ET.XMLSyntaxError) as e:
+            return HttpResponse(Response.error(mode, str(e)))
+    elif mode == 'gen-rpc-batch':
+        # either a collection name or <payloads> with many payloads
+        collection = params.get('collection', '')
+        if collection:
+            reply_xml = Collection.load_batch(request.user.username, collection)
+            if reply_xml is None:
+                return HttpResponse(Response.error(mode, 'Collection %s not found' % collection))
+        else:
+            try:
+                payloads = ET.fromstring(params.get('payloads', ''))
+            except ET.XMLSyntaxError as e:
+                return HttpResponse(Response.error(mode, str(e)))
+            entries = [(str(index), ET.tostring(payload)) for index, payload in enumerate(payloads)]
+            reply_xml = Adapter.gen_rpc_batch(request.user.username, entries)
+    else:
+        return HttpResponse(Response.error(mode, 'Invalid mode'))
+
+    return HttpResponse(Response.success(mode, 'ok', reply_xml))
+
+
 node_t = '<node name="{0}" path="{0}" type="module"><node name="Loading .." type="__yang_placeholder" /></node>'
 
 
@@ -258,6 +323,15 @@ def module_handler(request):
     if request.user.is_authenticated():
         path = request.GET.get('node', '')
         deep = request.GET.get('deep', '')
+        try:
+            depth = max(int(request.GET.get('depth', '1')), 1)
+        except ValueError:
+            depth = 1
+        lean = request.GET.get('lean', '') in ['1', 'true']
+        layers = request.GET.get('layers', None)
+        if layers is not None:
+            layers = [layer for layer in layers.split(',') if layer]
+        fmt = Response.format(request)
         username = request.user.username
         if path == 'root':
             # Request for root models
@@ -266,21 +340,133 @@ def module_handler(request):
             for m in modules:
                 lst.append(node_t.format(m.split('@')[0]))
         else:
-            modules = [path.split('/')[0]]
-            for module in modules:
-                filename = ModuleAdmin.cxml_path(username, module)
-                if filename is not None:
-                    logger.debug("module_handler: loading " + filename)
-                    module = cxml.get_cxml(filename)
-                    nodes = module.get_lazy_subtree(path, deep)
-                    lst.extend([ET.tostring(node) for node in annotate(nodes)])
-                else:
-                    logger.error("module_handler: %s not found !!" + module)
+            module = path.split('/')[0]
+            filename = ModuleAdmin.cxml_path(username, module)
+            if filename is not None:
+                logger.debug("module_handler: loading " + filename)
+                return module_fragment(request, filename, path, deep, depth, lean, fmt, layers)
+            else:
+                logger.error("module_handler: %s not found !!" % module)
+
+        if fmt == 'json':
+            return HttpResponse(module_json([ET.fromstring(node) for node in lst]),
+                                content_type=Response.content_type(fmt))
 
     logger.debug("module_handler: exit")
     return render_to_response('loader.xml', {'nodes': lst}, RequestContext(request))
 
 
+def module_json(nodes):
+    """ Compact json form of loader.xml for given lazy nodes """
+    module = ET.Element('module')
+    for node in nodes:
+        module.append(node)
+    return jsonxml.dumps(module)
+
+
+def module_fragment(request, filename, path, deep, depth=1, lean=False, fmt='xml', layers=None):
+    """
+    Build lazy tree response for a module node. Response for a given
+    (cxml content, annotation layers & versions, node, deep, depth, lean,
+    format) is deterministic, so it is cached (across users) and
+    validated by client using strong ETag. layers is list of annotation
+    layer names, None for all layers.
+    """
+    module = cxml.get_cxml(filename)
+    key = '|'.join([module.get_digest() or '', annotations.get_annotation_version(layers), path, deep,
+                    str(depth), str(ServerSettings.lazy_node_budget()), str(lean), fmt])
+    key = hashlib.sha1(key.encode('utf-8')).hexdigest()
+    etag = quote_etag(key)
+
+    if key in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+        response = HttpResponseNotModified()
+    else:
+        content = cache.get('ui_tree:' + key, None)
+        if content is None:
+            overlay = annotations.get_overlay(module.modulename, layers)
+            nodes = module.get_lazy_subtree(path, deep, depth, lean, overlay)
+            if fmt == 'json':
+                content = module_json(list(nodes))
+            else:
+                lst = [ET.tostring(node) for node in nodes]
+                content = render_to_string('loader.xml', {'nodes': lst})
+            cache.set('ui_tree:' + key, content)
+        response = HttpResponse(content, content_type=Response.content_type(fmt))
+
+    response['ETag'] = etag
+    patch_cache_control(response, no_cache=True)
+    patch_vary_headers(response, ['Cookie'])
+    logger.debug("module_handler: exit")
+    return response
+
+
+def descriptions_handler(request):
+    """
+    Handle batched description request from UI. Request carries '|'
+    separated node paths of lean mode lazy nodes, response contains
+    description of each node found.
+    """
+    if not request.user.is_authenticated():
+        return HttpResponse(Response.error('descriptions', 'User must be logged in'))
+
+    paths = [p for p in request.GET.get('paths', '').split('|') if p]
+    modules = {}
+    for path in paths:
+        modules.setdefault(path.split('/')[0], []).append(path)
+
+    descriptions = ET.Element('descriptions')
+    for module, mpaths in modules.items():
+        filename = ModuleAdmin.cxml_path(request.user.username, module)
+        if filename is None:
+            logger.error("descriptions_handler: %s not found !!" % module)
+            continue
+        for path, text in cxml.get_descriptions(filename, mpaths):
+            if text is None:
+                continue
+            desc = ET.Element('description')
+            desc.set('path', path)
+            desc.text = text
+            descriptions.append(desc)
+
+    return HttpResponse(Response.success('descriptions', 'ok', xml=descriptions))
+
+
+@csrf_exempt
+def annotation_handler(request):
+    """
+    Handle annotation layer requests. GET lists installed layers, POST
+    ingests uploaded JSON lines file (Filedata, may be gzipped) as layer
+    named by 'layer' parameter, file is streamed and never held in memory.
+    """
+    if not request.user.is_authenticated():
+        return HttpResponse(Response.error('annotation', 'User must be logged in'))
+
+    if request.method == 'POST':
+        if not request.user.is_staff:
+            return HttpResponse(Response.error('annotation', 'User does not have permission to upload annotations !!'))
+
+        name = request.GET.get('layer', request.POST.get('layer', ''))
+        upload = request.FILES.get('Filedata', None)
+        if upload is None:
+            return HttpResponse(Response.error('annotation', 'Missing annotation file'))
+
+        lines = gzip.GzipFile(fileobj=upload) if upload.name.endswith('.gz') else upload
+        try:
+            count, modules = annotations.ingest(name, lines)
+        except (ValueError, IOError) as e:
+            logger.error('annotation_handler: failed to ingest %s: %s' % (name, e))
+            return HttpResponse(Response.error('annotation', str(e)))
+        return HttpResponse(Response.success('annotation', 'Ingested %d xpaths of %d modules' % (count, modules)))
+
+    layers = ET.Element('layers')
+    for name, source in sorted(annotations.get_layers().items()):
+        layer = ET.Element('layer')
+        layer.set('name', name)
+        layer.set('type', 'ingested' if os.path.isdir(source) else 'file')
+        layers.append(layer)
+    return HttpResponse(Response.success('annotation', 'ok', xml=layers))
+
+
 def schema_handler(request):
     """
     Handle schema request from UI.
@@ -310,17 +496,51 @@ def search_handler(request):
 
     Returns: HTTP response with search results
     """
+    fmt = Response.format(request)
+    ctype = Response.content_type(fmt)
     if not request.user.is_authenticated():
-        return HttpResponse(Response.error(None, 'User must be logged in'))
+        return HttpResponse(Response.error(None, 'User must be logged in', fmt=fmt), content_type=ctype)
 
     query = request.GET.get('query', '')
     mode = request.GET.get('mode', '')
+    try:
+        limit = int(request.GET.get('limit', ServerSettings.search_limit()))
+        offset = max(int(request.GET.get('offset', '0')), 0)
+    except ValueError:
+        limit, offset = ServerSettings.search_limit(), 0
+
     if not query:
         rc, result = False, 'Invalid or empty query'
     else:
-        rc, result = Search.search(request.user.username, query)
+        rc, result = Search.search(request.user.username, query,
+                                   limit if limit > 0 else None, offset, mode)
+
+    if not rc:
+        return HttpResponse(Response.error(mode, result, fmt=fmt), content_type=ctype)
+
+    return HttpResponse(Response.success(mode, 'ok', xml=result, fmt=fmt), content_type=ctype)
+
+
+def complete_handler(request):
+    """
+    Args:
+        request: Django HTTP request header
+
+    Returns: HTTP response with next path segments for partial xpath
+    """
+    fmt = Response.format(request)
+    ctype = Response.content_type(fmt)
+    if not request.user.is_authenticated():
+        return HttpResponse(Response.error(None, 'User must be logged in', fmt=fmt), content_type=ctype)
+
+    xpath = request.GET.get('xpath', '')
+    try:
+        limit = min(max(int(request.GET.get('limit', '20')), 1), 100)
+    except ValueError:
+        limit = 20
 
+    rc, result = Complete.complete(request.user.username, xpath, limit)
     if not rc:
-        return HttpResponse(Response.error(mode, result))
+        return HttpResponse(Response.error('complete', result, fmt=fmt), content_type=ctype)
 
-    return HttpResponse(Response.success(mode, 'ok', xml=result))
+    return HttpResponse(Response.success('complete', 'ok', xml=result, fmt=fmt), content_type=ctype)
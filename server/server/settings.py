@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/1.8/ref/settings/
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 import os
+import multiprocessing
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -87,9 +88,46 @@ CACHES = {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
         'LOCATION': 'yxcache',
         'TIMEOUT': 600
+    },
+    # search results, at most MAX_ENTRIES x SEARCH_CACHE_ENTRY_SIZE bytes
+    'search': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'yxsearch',
+        'TIMEOUT': 3600,
+        'OPTIONS': {
+            'MAX_ENTRIES': 200
+        }
     }
 }
 
+# search results bigger than this are not cached
+SEARCH_CACHE_ENTRY_SIZE = 256 * 1024
+
+# Budget for process wide cache of parsed cxml modules, in bytes of
+# cxml file size (parsed trees take a few times more memory)
+CXML_CACHE_SIZE = 256 * 1024 * 1024
+
+# cxml files bigger than this are not parsed as whole, subtrees are
+# loaded on demand using byte offsets recorded at compile time
+CXML_PARTIAL_SIZE = 64 * 1024 * 1024
+
+# maximum number of nodes returned when client requests multiple levels
+# of explorer tree (depth > 1) in one request
+LAZY_NODE_BUDGET = 2000
+
+# worker processes used to fan out search and batch RPC generation (one
+# module group per task). 0 or 1 disables fan-out, everything runs in
+# request thread. Each worker keeps its own cxml, index and trie caches,
+# their budgets (CXML_CACHE_SIZE ..) are divided between the workers.
+WORKER_PROCESSES = min(multiprocessing.cpu_count(), 4)
+
+# default maximum number of paths returned by a search request
+SEARCH_RESULT_LIMIT = 1000
+
+# maximum number of table rows (list entries) in one RPC generated by
+# a bulk (template + value table) request, larger tables are chunked
+RPC_BULK_CHUNK_SIZE = 500
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/1.8/topics/i18n/
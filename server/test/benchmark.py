@@ -0,0 +1,944 @@
+"""
+    Performance benchmarks for YangExplorer server utilities
+
+    Run from server directory:
+        python -m test.benchmark [name ...]
+
+    @author: Pravin Gohite, Cisco Systems, Inc.
+"""
+from __future__ import print_function
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import lxml.etree as ET
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "server.settings")
+
+import django
+django.setup()
+
+import explorer.utils.cxml as cxml
+
+
+def synthetic_cxml(filename, containers=100, leaves=100):
+    """
+    Write a synthetic cxml module with containers x leaves nodes, each
+    container also has a list with a choice of two cases.
+    """
+    with open(filename, 'w') as f:
+        f.write('<node name="bench" prefix="b" type="module">')
+        f.write('<namespace import="false" module="bench" prefix="b">urn:bench</namespace>')
+        for c in range(containers):
+            f.write('<node access="read-write" name="container-%d" type="container">' % c)
+            f.write('<description>Container %d</description>' % c)
+            f.write('<node access="read-write" key="name" name="entry" type="list">')
+            f.write('<node access="read-write" datatype="string" is_key="true" name="name" type="leaf"/>')
+            f.write('<node name="kind" type="choice"><node name="first" type="case">')
+            f.write('<node access="read-write" datatype="uint32" name="first-value" type="leaf"/>')
+            f.write('</node><node name="second" type="case">')
+            f.write('<node access="read-write" datatype="string" name="second-value" type="leaf"/>')
+            f.write('</node></node></node>')
+            for l in range(leaves):
+                f.write('<node access="read-write" datatype="string" name="leaf-%d" type="leaf">' % l)
+                f.write('<description>Leaf %d of container %d</description></node>' % (l, c))
+            f.write('</node>')
+        f.write('</node>')
+
+
+def timeit(func, repeat=1):
+    start = time.time()
+    for _ in range(repeat):
+        func()
+    return (time.time() - start) / repeat
+
+
+def _linear_lookup(root, path):
+    """ Lookup as done by Cxml.get_lazy_node before path index """
+    for name in path.split('/')[1:]:
+        for child in root:
+            if child.get('name', '') == name:
+                root = child
+                break
+    return root
+
+
+def bench_path_index(tempdir):
+    filename = os.path.join(tempdir, 'bench.xml')
+    synthetic_cxml(filename, 200, 100)
+    module = cxml.Cxml(filename)
+    count = sum(1 for _ in module.getroot().iter('node'))
+
+    paths = ['bench/container-%d/leaf-%d' % (c, l)
+             for c in range(0, 200, 7) for l in range(0, 100, 3)]
+    paths += ['bench/container-%d/entry/kind/second/second-value' % c
+              for c in range(0, 200, 11)]
+
+    build = timeit(module.get_index)
+    linear = timeit(lambda: [_linear_lookup(module.getroot(), p) for p in paths], 5)
+    indexed = timeit(lambda: [module.find_node(p) for p in paths], 5)
+    expand = timeit(lambda: [module.get_lazy_node('bench/container-%d' % c)
+                             for c in range(200)], 3)
+
+    print('path-index: %d nodes, %d lookups' % (count, len(paths)))
+    print('  index build      : %8.2f ms' % (build * 1000))
+    print('  linear lookup    : %8.2f ms' % (linear * 1000))
+    print('  indexed lookup   : %8.2f ms' % (indexed * 1000))
+    print('  200 expansions   : %8.2f ms' % (expand * 1000))
+
+
+def bench_lazy_tree(tempdir):
+    filename = os.path.join(tempdir, 'bench.xml')
+    synthetic_cxml(filename, 200, 100)
+    module = cxml.Cxml(filename)
+
+    pathvalues = [('bench/container-%d/leaf-%d' % (c, l), {'value': str(l)})
+                  for c in range(0, 200, 5) for l in range(0, 100, 10)]
+    pathvalues += [('bench/container-%d/entry/kind/first/first-value' % c, {'value': '1'})
+                   for c in range(0, 200, 5)]
+
+    lazy = timeit(lambda: module.get_lazy_tree(pathvalues), 3)
+    print('lazy-tree: %d set leaves' % len(pathvalues))
+    print('  get_lazy_tree    : %8.2f ms' % (lazy * 1000))
+
+
+def bench_partial_load(tempdir):
+    from django.conf import settings
+    filename = os.path.join(tempdir, 'bench.xml')
+    synthetic_cxml(filename, 1000, 100)
+    size = os.path.getsize(filename)
+
+    def first_expand(partial_size):
+        settings.CXML_PARTIAL_SIZE = partial_size
+        module = cxml.Cxml(filename)
+        module.get_lazy_node('bench')
+        module.get_lazy_node('bench/container-500')
+        module.get_lazy_node('bench/container-500/entry/kind')
+
+    offsets = timeit(lambda: cxml.build_offsets(filename))
+    full = timeit(lambda: first_expand(size + 1))
+    partial = timeit(lambda: first_expand(0), 3)
+    # compiled schema is preferred over offsets once it exists
+    import explorer.utils.cxb as cxb
+    compiled = timeit(lambda: cxb.compile_cxb(filename))
+    schema = timeit(lambda: first_expand(size + 1), 3)
+    print('partial-load: %.1f MB cxml' % (size / 1024.0 / 1024.0))
+    print('  build offsets    : %8.2f ms' % (offsets * 1000))
+    print('  compile cxb      : %8.2f ms' % (compiled * 1000))
+    print('  full parse       : %8.2f ms' % (full * 1000))
+    print('  partial load     : %8.2f ms' % (partial * 1000))
+    print('  cxb load         : %8.2f ms' % (schema * 1000))
+
+
+def bench_search_index(tempdir):
+    import explorer.utils.pathindex as pathindex
+    filename = os.path.join(tempdir, 'bench.xml')
+    synthetic_cxml(filename, 200, 100)
+    queries = ['leaf-42', 'container-1', 'entry/kind', 'value']
+
+    def scan():
+        paths = [path for path, _ in cxml.CxmlIterator(filename)]
+        return [[p for p in paths if q in p] for q in queries]
+
+    linear = timeit(scan)
+    build = timeit(lambda: pathindex.build_index(filename))
+    load = timeit(lambda: pathindex.load_index(filename))
+    index = pathindex.load_index(filename)
+    indexed = timeit(lambda: [index.search(q) for q in queries], 3)
+    assert [index.search(q) for q in queries] == scan()
+
+    print('search-index: %d nodes, %d queries' % (len(index), len(queries)))
+    print('  iterator scan    : %8.2f ms' % (linear * 1000))
+    print('  index build      : %8.2f ms' % (build * 1000))
+    print('  index load       : %8.2f ms' % (load * 1000))
+    print('  indexed search   : %8.2f ms' % (indexed * 1000))
+
+
+def bench_search_modes(tempdir):
+    import explorer.utils.pathindex as pathindex
+    filename = os.path.join(tempdir, 'bench.xml')
+    synthetic_cxml(filename, 500, 100)
+    index = pathindex.load_index(filename)
+    paths = [index.path(nid) for nid in range(1, len(index))]
+    queries = [('regex', r'container-4\d/leaf-7$'), ('glob', '*/container-42/*value'),
+               ('fuzzy', 'contaner-42/secnd'), ('token', 'second value 42')]
+
+    print('search-modes: %d nodes, top 20' % len(index))
+    for mode, query in queries:
+        plan = pathindex._plans[mode]
+        # same matcher over every path, without trigram / word narrowing
+        scan = timeit(lambda: (lambda match: [p for p in paths if match(p)])(plan(index, query)[2]))
+        match = plan(index, query)[2]
+        ranked = timeit(lambda: index.rank(query, mode, 20), 3)
+        found = len(index.rank(query, mode))
+        assert found == len([p for p in paths if match(p)])
+        print('  %-6s %-24s: scan %8.2f ms, ranked %8.2f ms (%d matches)'
+              % (mode, query, scan * 1000, ranked * 1000, found))
+
+    # full text query against a traversal of the parsed tree
+    query = 'leaf 7 container 42 type:leaf'
+
+    def traverse():
+        root = ET.parse(filename).getroot()
+        result = []
+        for element in root.iter('node'):
+            words = set(pathindex._text_words(element.findtext('description') or ''))
+            if element.get('type') == 'leaf' and words.issuperset(['leaf', '7', 'container', '42']):
+                result.append(element)
+        return result
+
+    scan = timeit(traverse)
+    ranked = timeit(lambda: index.rank(query, 'text', 20), 3)
+    found = len(index.rank(query, 'text'))
+    assert found == len(traverse())
+    print('  %-6s %-24s: traversal %8.2f ms, indexed %8.2f ms (%d matches)'
+          % ('text', query, scan * 1000, ranked * 1000, found))
+
+
+def bench_complete(tempdir):
+    import explorer.utils.complete as complete
+    filename = os.path.join(tempdir, 'bench.xml')
+    synthetic_cxml(filename, 1000, 100)
+
+    first = timeit(lambda: complete.ModuleTrie(filename).complete(['container-500'], 'leaf-4', 20))
+    trie = complete.get_trie(filename)
+    queries = [([], 'container-'), ([], 'container-99'), (['container-7'], 'leaf-'),
+               (['container-7', 'entry'], ''), (['container-7'], 'xyz')]
+    warm = timeit(lambda: [trie.complete(names, prefix, 20) for names, prefix in queries], 10)
+
+    print('complete: %d top-level nodes' % len(trie.root.names))
+    print('  cold trie + query: %8.2f ms' % (first * 1000))
+    print('  %d warm queries   : %8.2f ms' % (len(queries), warm * 1000))
+
+
+def _search_file(filename, query, limit):
+    import explorer.utils.pathindex as pathindex
+    return pathindex.load_index(filename).search(query, limit)
+
+
+def bench_parallel_search(tempdir):
+    import explorer.utils.pathindex as pathindex
+    import explorer.utils.workers as workers
+    from django.conf import settings
+
+    files = []
+    for m in range(300):
+        filename = os.path.join(tempdir, 'bench-%d.xml' % m)
+        synthetic_cxml(filename, 20, 50)
+        pathindex.build_index(filename)
+        files.append(filename)
+
+    def run(limit):
+        tasks = [(f, 'leaf-1', limit) for f in files]
+        found = 0
+        results = workers.imap(_search_file, tasks)
+        for result in results:
+            found += len(result)
+            if limit is not None and found >= limit:
+                results.close()
+                break
+        return found
+
+    print('parallel-search: %d modules' % len(files))
+    for processes in [0, settings.WORKER_PROCESSES]:
+        settings.WORKER_PROCESSES = processes
+        cold = timeit(lambda: run(None))
+        warm = timeit(lambda: run(None), 3)
+        limited = timeit(lambda: run(100), 3)
+        print('  %2d workers: cold %8.2f ms, warm %8.2f ms, limit 100 %8.2f ms'
+              % (processes, cold * 1000, warm * 1000, limited * 1000))
+
+
+class LegacyCxmlIterator(object):
+    """ Recursive CxmlIterator as before generator rewrite (for comparison) """
+    def __init__(self, filename, cxml=None, options={}):
+        if cxml:
+            self.handle = cxml
+        else:
+            self.handle = ET.parse(filename)
+        self.inc_keys = options.get('include-keys', False)
+        self.inc_prefixes = options.get('include-prefixes', [])
+        self.inc_default = options.get('include-default', False)
+        self.add_root_prefix = options.get('add-root-prefix', False)
+        self.current = self.handle.getroot()
+        self.prefix = self.current.get('prefix', None)
+        self.path = [self.current.get('name')]
+
+    def __iter__(self):
+        return self
+
+    def reset(self):
+        self.current = self.handle.getroot()
+        self.prefix = self.current.get('prefix', None)
+        self.path = [self.current.get('name')]
+
+    def _get_next_parent(self):
+        _parent = self.current.getparent()
+        while _parent is not None:
+            uncle = _parent.getnext()
+            if uncle is None:
+                _parent = _parent.getparent()
+                self.path.pop()
+                continue
+            if self._filter(uncle):
+                _parent = _parent.getparent()
+                continue
+            return uncle
+        return _parent
+
+    def _set_xpath(self):
+        _name = self.current.get('name', None)
+
+        # add keys in xpath if required
+        if self.inc_keys and self.current.get('type', '') == 'list':
+            _keys = self.current.get('key', '')
+            _name += '[' + _keys + ']'
+
+        # add default prefix in xpath if required
+        if self.add_root_prefix and ':' not in _name:
+            _name = self.prefix + ':' + _name
+
+        # append to xpath list
+        self.path.append(_name)
+
+    def _get_prefix(self, node):
+        name = node.get('name', None)
+        return name.split(':')[0] if ':' in name else None
+
+    def _filter(self, node):
+        """ Filter xpath """
+        if not self.inc_prefixes:
+            return False
+
+        pfx = self._get_prefix(node)
+        if pfx is not None:
+            return pfx not in self.inc_prefixes
+        return False
+
+    def next(self):
+        # Depth First Traversal
+
+        # Look for children first
+        if len(self.current):
+            for child in self.current.findall('node'):
+                if self._filter(child):
+                    continue
+                self.current = child
+                self._set_xpath()
+                if self.has_prefix():
+                    return '/'.join(self.path), self.current
+                return self.next()
+
+        # Look for siblings next
+        _next = self.current.getnext()
+        self.path.pop()
+        while _next is not None:
+            if self._filter(_next):
+                _next = _next.getnext()
+                continue
+            self.current = _next
+            self._set_xpath()
+            if self.has_prefix():
+                return '/'.join(self.path), self.current
+            return self.next()
+
+        # Look for parent last
+        _parent = self._get_next_parent()
+        if _parent is None:
+            raise StopIteration()
+
+        self.path.pop()
+        if not self._filter(_parent):
+            self.current = _parent
+            self._set_xpath()
+
+        if self.has_prefix():
+            return '/'.join(self.path), self.current
+        return self.next()
+
+    def has_prefix(self):
+        if not self.inc_prefixes:
+            return True
+
+        if self.inc_default:
+            if self.add_root_prefix:
+                if not any(not elem.startswith(self.prefix + ':') for elem in self.path[1:]):
+                    return True
+            else:
+                if not any(':' in elem for elem in self.path[1:]):
+                    return True
+
+        for i_pfx in self.inc_prefixes:
+            if any(elem.startswith(i_pfx + ':') for elem in self.path):
+                return True
+        return False
+
+
+def bench_iterator(tempdir):
+    filename = os.path.join(tempdir, 'bench.xml')
+    synthetic_cxml(filename, 1000, 492)
+    handle = ET.parse(filename)
+
+    def count(cls, options):
+        return sum(1 for _ in cls(filename, handle, options))
+
+    cases = [('default', {}),
+             ('keys + root prefix', {'include-keys': True, 'add-root-prefix': True}),
+             ('prefix rejects all', {'include-prefixes': ['x']})]
+
+    print('iterator: %d nodes' % sum(1 for _ in handle.iter('node')))
+    for title, options in cases:
+        new = timeit(lambda: count(cxml.CxmlIterator, options))
+        try:
+            old = '%8.2f ms' % (timeit(lambda: count(LegacyCxmlIterator, options)) * 1000)
+        except RuntimeError:
+            old = 'recursion limit'
+        print('  %-20s: legacy %s, generator %8.2f ms' % (title, old, new * 1000))
+
+
+class LegacyXPathTree(object):
+    """ XPathTree with set of children as before dict rewrite (for comparison) """
+    def __init__(self, name, attrib):
+        self.name = name
+        self.attrib = attrib
+        self.children = set()
+
+    def insert(self, names, attrib):
+        for child in self.children:
+            if child.name == names[0]:
+                break
+        else:
+            child = LegacyXPathTree(names[0], attrib)
+            self.children.add(child)
+        if len(names) > 1:
+            child.insert(names[1:], attrib)
+
+    def search(self, names):
+        for child in self.children:
+            if child.name == names[0]:
+                if len(names) == 1:
+                    return self
+                return child.search(names[1:])
+        return None
+
+
+def bench_xpath_tree(tempdir):
+    import json
+    import random
+    from explorer.utils.xpath import XPathTree
+    filename = os.path.join(tempdir, 'covered.json')
+    xpaths = ['bench/container-%d/entry/leaf-%d' % (c, l) for c in range(50) for l in range(1000)]
+    random.Random(1).shuffle(xpaths)
+    with open(filename, 'w') as f:
+        json.dump({'annotate': {'covered': 'true'}, 'data': xpaths}, f)
+
+    def load():
+        with open(filename, 'r') as f:
+            return json.load(f)
+
+    def legacy():
+        profile = load()
+        tree = LegacyXPathTree('/', None)
+        for line in profile['data']:
+            tree.insert(line.strip().split('/'), profile['annotate'])
+        return tree
+
+    def insert():
+        profile = load()
+        tree = XPathTree('/', None)
+        for line in profile['data']:
+            tree.insert(line, profile['annotate'])
+        return tree
+
+    def bulk():
+        profile = load()
+        tree = XPathTree('/', None)
+        tree.bulk_insert(sorted(profile['data']), profile['annotate'])
+        return tree
+
+    parse = timeit(load)
+    old = timeit(legacy)
+    one = timeit(insert)
+    many = timeit(bulk)
+    old_tree, tree = legacy(), bulk()
+    queries = xpaths[:10000]
+    old_search = timeit(lambda: [old_tree.search(q.split('/')) for q in queries])
+    new_search = timeit(lambda: [tree.search(q) for q in queries])
+    assert all(tree.search(q).name == q.split('/')[-1] for q in queries)
+
+    print('xpath-tree: %d xpaths in covered.json' % len(xpaths))
+    print('  json load        : %8.2f ms' % (parse * 1000))
+    print('  legacy build     : %8.2f ms' % (old * 1000))
+    print('  insert build     : %8.2f ms' % (one * 1000))
+    print('  sorted bulk build: %8.2f ms' % (many * 1000))
+    print('  %d lookups    : legacy %8.2f ms, dict %8.2f ms' % (len(queries), old_search * 1000, new_search * 1000))
+
+
+def legacy_annotate(nodes, tree):
+    """ Annotation post-pass over lazy nodes as before overlays (for comparison) """
+    for node in nodes:
+        instance = tree.search(node.get('path', ''))
+        if instance is None or not instance.attrib:
+            continue
+        for attr, value in instance.attrib.items():
+            node.set(attr, value)
+        legacy_annotate(list(node), tree)
+    return nodes
+
+
+def bench_annotation(tempdir):
+    import json
+    import pickle
+    import explorer.utils.annotations as annotations
+    from explorer.utils.xpath import XPathTree
+    from django.conf import settings
+    filename = os.path.join(tempdir, 'bench.xml')
+    synthetic_cxml(filename, 200, 100)
+    module = cxml.Cxml(filename)
+
+    directory = os.path.join(tempdir, 'data', 'annotation')
+    os.makedirs(directory)
+    covered = os.path.join(directory, 'covered.json')
+    xpaths = ['bench/container-%d/leaf-%d' % (c, l) for c in range(200) for l in range(0, 100, 2)]
+    with open(covered, 'w') as f:
+        json.dump({'annotate': {'covered': 'true'}, 'data': xpaths}, f)
+    settings.BASE_DIR = tempdir
+
+    tree = XPathTree('/', None)
+    tree.bulk_insert(sorted(xpaths), {'covered': 'true'})
+    requests = ['bench'] + ['bench/container-%d' % c for c in range(0, 200, 10)]
+
+    def legacy():
+        # tree came from locmem cache, which pickles entries
+        cached = pickle.loads(pickle.dumps(tree, pickle.HIGHEST_PROTOCOL))
+        return [legacy_annotate(list(module.get_lazy_node(path, depth=3)), cached) for path in requests]
+
+    def overlay():
+        layer = annotations.get_overlay('bench')
+        return [module.get_lazy_node(path, depth=3, overlay=layer) for path in requests]
+
+    compile_ = timeit(lambda: annotations.compile_layer(covered))
+    plain = timeit(lambda: [module.get_lazy_node(path, depth=3) for path in requests], 3)
+    old = timeit(legacy, 3)
+    new = timeit(overlay, 3)
+
+    print('annotation: %d annotated xpaths, %d tree requests (depth 3)' % (len(xpaths), len(requests)))
+    print('  layer compile    : %8.2f ms' % (compile_ * 1000))
+    print('  no annotation    : %8.2f ms' % (plain * 1000))
+    print('  post-pass        : %8.2f ms' % (old * 1000))
+    print('  overlay          : %8.2f ms' % (new * 1000))
+
+
+def _peak_rss(func, *args):
+    """ Run func in a child process, returns its peak resident memory in MB """
+    import resource
+    pid = os.fork()
+    if pid == 0:
+        try:
+            func(*args)
+        finally:
+            os._exit(0)
+    _, _, usage = os.wait4(pid, 0)
+    return usage.ru_maxrss / 1024.0
+
+
+def bench_ingest(tempdir):
+    import json
+    import explorer.utils.annotations as annotations
+    from django.conf import settings
+    settings.BASE_DIR = tempdir
+    directory = os.path.join(tempdir, 'data', 'annotation')
+    os.makedirs(directory)
+
+    xpaths = ['module-%d/container-%d/entry/leaf-%d' % (m, c, l)
+              for m in range(100) for c in range(60) for l in range(50)]
+    source = os.path.join(tempdir, 'coverage.jsonl')
+    with open(source, 'w') as f:
+        f.write(json.dumps({'annotate': {'covered': 'true'}}) + '\n')
+        for xpath in xpaths:
+            f.write(xpath + '\n')
+    covered = os.path.join(tempdir, 'covered.json')
+    with open(covered, 'w') as f:
+        json.dump({'annotate': {'covered': 'true'}, 'data': xpaths}, f)
+    del xpaths
+
+    def whole():
+        return annotations.compile_layer(covered)
+
+    def stream():
+        with open(source, 'r') as f:
+            return annotations.ingest('coverage', f)
+
+    full = timeit(whole)
+    ingest = timeit(stream)
+    first = timeit(lambda: annotations.get_overlay('module-42', ['coverage']))
+    full_rss = _peak_rss(whole)
+    stream_rss = _peak_rss(stream)
+
+    print('ingest: %d xpaths, %d modules (%.1f MB jsonl)' % (300000, 100, os.path.getsize(source) / 1048576.0))
+    print('  json load + compile: %8.2f ms, peak rss %6.1f MB' % (full * 1000, full_rss))
+    print('  streamed ingest    : %8.2f ms, peak rss %6.1f MB' % (ingest * 1000, stream_rss))
+    print('  first module overlay after ingest: %8.2f ms' % (first * 1000))
+
+
+def legacy_get_namespace(tree, prefix=''):
+    """ Returns xmlns attribute text of prefix as before RPC elements """
+    module_prefix = tree.get('prefix', '')
+    if prefix == '':
+        prefix = module_prefix
+    for child in tree:
+        if child.tag != 'namespace':
+            break
+        if child.get('prefix', '') == prefix:
+            if module_prefix == prefix:
+                return ' xmlns="%s"' % child.text
+            return ' xmlns:%s="%s"' % (prefix, child.text)
+    return ''
+
+
+def legacy_build_rpc(request, payload, operation):
+    """ String RPC envelope as before RPC elements (edit-config only) """
+    import explorer.utils.netconf as netconf
+    target = request.get('target', 'candidate')
+    payload = '<config xmlns:xc="' + netconf.rpc_xmlns + '">\n' + payload + '</config>\n'
+    payload = '<edit-config>\n<target><' + target + '/></target>\n' + payload + '</edit-config>'
+    if target == 'candidate':
+        payload += '<commit/>\n'
+    return '<rpc message-id="101" xmlns="%s">\n%s\n</rpc>' % (netconf.rpc_xmlns, payload)
+
+
+def string_process_xml(tree, d, node, prefix, ns, mode):
+    """ Pruned process_xml building text as before RPC elements """
+    import explorer.utils.netconf as netconf
+    name = node.get('name', '')
+    type_ = node.get('type', '')
+    prefix = prefix + '/' + name
+    msg = ''
+    if prefix not in d.prefixes:
+        return msg
+
+    def terminal():
+        (val, option, found, _) = netconf.pop_keyvalue(d, prefix, mode)
+        if not found:
+            return ''
+        option = ' xc:operation="%s"' % option if option else ''
+        if val != '':
+            return '<' + name + ns + option + '>' + val + '</' + name + '>\n'
+        return '<' + name + ns + option + '/>\n'
+
+    if type_ == 'leaf-list':
+        _msg = terminal()
+        while _msg != '':
+            msg += _msg
+            _msg = terminal()
+    elif type_ in ['leaf', 'leafref']:
+        msg = terminal()
+    elif type_ in ['module', 'choice', 'case', 'input', 'output']:
+        for child in node:
+            msg += string_process_xml(tree, d, child, prefix, '', mode)
+    elif type_ in ['list', 'container', 'rpc']:
+        (val, option, found, _) = netconf.pop_keyvalue(d, prefix, mode)
+        option = ' xc:operation="%s"' % option if option else ''
+        for child in node:
+            msg += string_process_xml(tree, d, child, prefix, '', mode)
+        if msg != '':
+            msg = '<' + name + ns + option + '>\n' + msg + '</' + name + '>\n'
+        elif found:
+            msg = '<' + name + ns + option + '/>\n'
+    return msg
+
+
+def string_run_rpc(tree, request, module):
+    """ Text RPC pipeline: generate, parse in gen_rpc, parse and serialize in NCClient.run """
+    import explorer.utils.netconf as netconf
+    from explorer.utils.ncparse import NetconfParser
+    d = netconf.KeyValueMap(module.get_keyvalues())
+    ns = legacy_get_namespace(tree)
+    msg = ''
+    for child in tree:
+        if child.tag != 'namespace':
+            msg += string_process_xml(tree, d, child, 'bench', ns, 'edit-config')
+    rpc = legacy_build_rpc(request, msg, 'edit-config')
+    rpc = ET.fromstring(rpc, parser=ET.XMLParser(remove_blank_text=True))
+    parser = NetconfParser(ET.tostring(rpc))
+    return ET.tostring(parser.get_data(), pretty_print=True)
+
+
+def element_run_rpc(tree, request, module):
+    """ Element RPC pipeline, data element is handed to ncclient as is """
+    import explorer.utils.netconf as netconf
+    from explorer.utils.ncparse import NetconfParser
+    rpc, parent = netconf.build_rpc(request, 'edit-config')
+    netconf.gen_module_payload(tree, 'bench', module, 'edit-config', parent)
+    return NetconfParser(rpc).get_data()
+
+
+def legacy_pop_keyvalue(d, path, mode):
+    """ Linear scan pop_keyvalue as before key-value map (index bug fixed) """
+    index = 0
+    for key in d:
+        _key = key[0].split('=')[0] if '=' in key[0] else key[0]
+        if _key == path:
+            obj = key[1]
+            option = ''
+            if mode == 'edit-config' and (obj.option not in ['', 'merge']):
+                option = ' xc:operation="' + obj.option + '"'
+            d.pop(index)
+            return obj.value, option, True
+        index += 1
+    return '', '', False
+
+
+def legacy_process_xml(tree, d, node, prefix, ns, mode):
+    """ Full schema walk of process_xml as before pruning (for comparison) """
+    import explorer.utils.netconf as netconf
+    name = node.get('name', '')
+    type_ = node.get('type', '')
+    prefix = prefix + '/' + name
+    msg = ''
+
+    def terminal():
+        (val, option, found) = legacy_pop_keyvalue(d, prefix, mode)
+        if not found:
+            return ''
+        _ns = ns
+        if ':' in val:
+            pfx = val.split(':')
+            if len(pfx) > 1:
+                _ns = legacy_get_namespace(tree, pfx[0])
+        if val != '':
+            return '<' + name + _ns + option + '>' + val + '</' + name + '>\n'
+        return '<' + name + _ns + option + '/>\n'
+
+    if type_ == 'leaf-list':
+        _msg = terminal()
+        while _msg != '':
+            msg += _msg
+            _msg = terminal()
+    elif type_ in ['leaf', 'leafref']:
+        msg = terminal()
+    elif type_ in ['module', 'choice', 'case', 'input', 'output']:
+        for child in node:
+            msg += legacy_process_xml(tree, d, child, prefix, '', mode)
+    elif type_ in ['list', 'container', 'rpc']:
+        (val, option, found) = legacy_pop_keyvalue(d, prefix, mode)
+        for child in node:
+            msg += legacy_process_xml(tree, d, child, prefix, '', mode)
+        if msg != '':
+            msg = '<' + name + ns + option + '>\n' + msg + '</' + name + '>\n'
+        elif found:
+            msg = '<' + name + ns + option + '/>\n'
+    return msg
+
+
+def legacy_module_payload(tree, name, module, mode):
+    d = list(module.get_keyvalues())
+    ns = legacy_get_namespace(tree)
+    for pfx in module.get_namespace_pfx():
+        ns += legacy_get_namespace(tree, pfx)
+    msg = ''
+    for child in tree:
+        if child.tag != 'namespace':
+            msg += legacy_process_xml(tree, d, child, name, ns, mode)
+    return msg
+
+
+def keyvalue_request(pairs, operation='edit-config'):
+    """ Returns netconf request element for (path, value) pairs """
+    request = ET.Element('payload')
+    request.set('operation', operation)
+    keyvalue = ET.SubElement(request, 'keyvalue')
+    for path, value in pairs:
+        node = ET.SubElement(keyvalue, 'node')
+        node.set('path', path)
+        if value is not None:
+            node.text = value
+    return request
+
+
+def bench_netconf(tempdir):
+    import explorer.utils.netconf as netconf
+    filename = os.path.join(tempdir, 'bench.xml')
+    synthetic_cxml(filename, 2000, 100)
+    tree = ET.parse(filename).getroot()
+
+    requests = []
+    for count in [2, 20, 200]:
+        pairs = [('bench/container-%d/leaf-%d' % (i * 7 % 2000, i % 100), str(i)) for i in range(count)]
+        pairs += [('bench/container-5/entry/name', 'e'), ('bench/container-5/entry/kind/second/second-value', 'v')]
+        requests.append((count, keyvalue_request(pairs)))
+
+    print('netconf: %d schema nodes' % (2000 * 106))
+    def pruned():
+        rpc, parent = netconf.build_rpc(request, 'edit-config')
+        netconf.gen_module_payload(tree, 'bench', module, 'edit-config', parent)
+        return rpc
+
+    for count, request in requests:
+        module = netconf.parseRequest(request)['bench']
+        legacy = timeit(lambda: legacy_module_payload(tree, 'bench', module, 'edit-config'))
+        elapsed = timeit(pruned, 10)
+        text = legacy_build_rpc(request, legacy_module_payload(tree, 'bench', module, 'edit-config'), 'edit-config')
+        text = ET.fromstring(text, parser=ET.XMLParser(remove_blank_text=True))
+        assert ET.tostring(text, method='c14n') == ET.tostring(pruned(), method='c14n')
+        print('  %3d key-values: full walk %8.2f ms, pruned %8.2f ms' % (count + 2, legacy * 1000, elapsed * 1000))
+
+
+def bench_rpc(tempdir):
+    import explorer.utils.netconf as netconf
+    filename = os.path.join(tempdir, 'bench.xml')
+    synthetic_cxml(filename, 2000, 100)
+    tree = ET.parse(filename).getroot()
+
+    print('rpc: edit-config through gen_rpc and NCClient.run')
+    for count in [20, 200, 2000]:
+        pairs = [('bench/container-%d/leaf-%d' % (i % 2000, i * 7 % 100), str(i)) for i in range(count)]
+        request = keyvalue_request(pairs)
+        module = netconf.parseRequest(request)['bench']
+        text = timeit(lambda: string_run_rpc(tree, request, module), 3)
+        elements = timeit(lambda: element_run_rpc(tree, request, module), 3)
+        assert string_run_rpc(tree, request, module) == \
+            ET.tostring(element_run_rpc(tree, request, module), pretty_print=True)
+        print('  %5d key-values: text %8.2f ms, elements %8.2f ms' % (count, text * 1000, elements * 1000))
+
+
+def bench_skeleton(tempdir):
+    import explorer.utils.netconf as netconf
+    from explorer.utils.misc import ServerSettings
+    cwd = os.getcwd()
+    os.chdir(tempdir)
+    try:
+        cxmldir = ServerSettings.cxml_path('bench')
+        os.makedirs(cxmldir)
+        synthetic_cxml(os.path.join(cxmldir, 'bench.xml'), 2000, 100)
+
+        print('skeleton: edit-config of same shape with new values')
+        for count in [20, 200, 2000]:
+            paths = ['bench/container-%d/leaf-%d' % (i % 2000, i * 7 % 100) for i in range(count)]
+            requests = [keyvalue_request([(path, '%s-%d' % (path, n)) for path in paths]) for n in range(5)]
+
+            def generate():
+                for request in requests:
+                    netconf.gen_netconf('bench', request, '')
+
+            def uncached():
+                for request in requests:
+                    netconf._skeleton_cache.clear()
+                    netconf.gen_netconf('bench', request, '')
+
+            generate()
+            walk = timeit(uncached) / len(requests)
+            generate()
+            filled = timeit(generate) / len(requests)
+            print('  %4d key-values: schema walk %8.2f ms, skeleton %8.2f ms' % (count, walk * 1000, filled * 1000))
+    finally:
+        os.chdir(cwd)
+
+
+def bench_bulk(tempdir):
+    import explorer.utils.netconf as netconf
+    from explorer.utils.misc import ServerSettings
+    cwd = os.getcwd()
+    os.chdir(tempdir)
+    try:
+        cxmldir = ServerSettings.cxml_path('bulk')
+        os.makedirs(cxmldir)
+        synthetic_cxml(os.path.join(cxmldir, 'bench.xml'), 2000, 100)
+
+        template = keyvalue_request([('bench/container-5/entry/name', None),
+                                     ('bench/container-5/entry/kind/second/second-value', 'v')])
+        template[0][0].set('column', 'name')
+        print('bulk: edit-config list entries from a value table')
+        for count in [200, 2000]:
+            columns = {'name': ['Gi0/%d' % i for i in range(count)]}
+            requests = [keyvalue_request([('bench/container-5/entry/name', name),
+                                          ('bench/container-5/entry/kind/second/second-value', 'v')])
+                        for name in columns['name']]
+
+            def single():
+                for request in requests:
+                    netconf._skeleton_cache.clear()
+                    netconf.gen_netconf('bulk', request, '')
+
+            netconf.gen_netconf_bulk('bulk', template, columns, 500)
+            separate = timeit(single)
+            bulk = timeit(lambda: netconf.gen_netconf_bulk('bulk', template, columns, 500), 3)
+            print('  %4d entries: separate requests %8.2f ms, bulk %8.2f ms' % (count, separate * 1000, bulk * 1000))
+    finally:
+        os.chdir(cwd)
+
+
+def bench_batch(tempdir):
+    import explorer.utils.netconf as netconf
+    import explorer.utils.workers as workers
+    from explorer.utils.misc import ServerSettings
+    from django.conf import settings
+    cwd = os.getcwd()
+    os.chdir(tempdir)
+    try:
+        cxmldir = ServerSettings.cxml_path('batch')
+        os.makedirs(cxmldir)
+        for m in range(10):
+            synthetic_cxml(os.path.join(cxmldir, 'bench-%d.xml' % m), 200, 50)
+
+        payloads = []
+        for i in range(400):
+            pairs = [('bench-%d/container-%d/leaf-%d' % (i % 10, (i + k) % 200, k), str(i)) for k in range(20)]
+            payloads.append((i, ET.tostring(keyvalue_request(pairs))))
+
+        def separate():
+            for _, payload in payloads:
+                ET.tostring(netconf.gen_netconf('batch', ET.fromstring(payload), ''))
+
+        def batch():
+            tasks = [('batch', payloads[start:start + 64]) for start in range(0, len(payloads), 64)]
+            for results in workers.imap(netconf.gen_netconf_task, tasks):
+                for _, rpc, _ in results:
+                    if isinstance(rpc, basestring):
+                        ET.fromstring(rpc)
+
+        print('batch: %d payloads over 10 modules' % len(payloads))
+        separate()
+        print('  one request per payload %8.2f ms' % (timeit(separate) * 1000))
+        for processes in [0, settings.WORKER_PROCESSES]:
+            settings.WORKER_PROCESSES = processes
+            batch()
+            print('  batch, %2d workers       %8.2f ms' % (processes, timeit(batch) * 1000))
+    finally:
+        os.chdir(cwd)
+
+
+BENCHMARKS = [
+    ('path-index', bench_path_index),
+    ('lazy-tree', bench_lazy_tree),
+    ('partial-load', bench_partial_load),
+    ('search-index', bench_search_index),
+    ('search-modes', bench_search_modes),
+    ('complete', bench_complete),
+    ('parallel-search', bench_parallel_search),
+    ('iterator', bench_iterator),
+    ('xpath-tree', bench_xpath_tree),
+    ('annotation', bench_annotation),
+    ('ingest', bench_ingest),
+    ('netconf', bench_netconf),
+    ('rpc', bench_rpc),
+    ('skeleton', bench_skeleton),
+    ('bulk', bench_bulk),
+    ('batch', bench_batch),
+]
+
+
+def main(names):
+    tempdir = tempfile.mkdtemp()
+    try:
+        for name, func in BENCHMARKS:
+            if not names or name in names:
+                func(tempdir)
+    finally:
+        shutil.rmtree(tempdir)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,905 @@
+"""
+    Unit Test Automation for YangExplorer Application
+
+    @author: Pravin Gohite, Cisco Systems, Inc.
+"""
+import os
+import json
+import pickle
+import time
+import shutil
+import struct
+import tempfile
+from StringIO import StringIO
+import lxml.etree as ET
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+import explorer.utils.cxml as cxml
+import explorer.utils.cxb as cxb
+import explorer.utils.store as store
+import explorer.utils.jsonxml as jsonxml
+import explorer.utils.pathindex as pathindex
+import explorer.utils.complete as complete
+import explorer.utils.workers as workers
+import explorer.utils.search as search
+import explorer.utils.netconf as netconf
+from explorer.utils.admin import ModuleAdmin, is_browsable
+from explorer.utils.xpath import XPathTree
+import explorer.utils.annotations as annotations
+from explorer.utils.misc import ServerSettings, Response
+from explorer.utils.lru import LRUCache
+
+CXML = '''<node name="test-module" prefix="tm" type="module">
+<namespace import="false" module="test-module" prefix="tm">urn:test-module</namespace>
+<node access="read-write" name="interfaces" type="container">
+<description>Interface configuration</description>
+<node access="read-write" key="name" name="interface" type="list">
+<node access="read-write" datatype="string" is_key="true" name="name" type="leaf"/>
+<node access="read-write" datatype="string" name="description" type="leaf"/>
+<node name="mode" type="choice">
+<node name="routed" type="case">
+<node access="read-write" datatype="string" name="address" type="leaf"/>
+</node>
+</node>
+</node>
+</node>
+</node>'''
+
+
+def _square(value):
+    return value * value
+
+
+def _worker_state(_):
+    return workers.in_worker(), cxml._cxml_cache.budget
+
+
+class CxmlTestCase(SimpleTestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tempdir, 'test-module@2016-01-01.xml')
+        with open(self.filename, 'w') as f:
+            f.write(CXML)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_01_lru(self):
+        """ Verify LRU eviction and tag invalidation """
+        cache = LRUCache(10)
+        cache.put('a', 1, 4, tag=1)
+        cache.put('b', 2, 4, tag=1)
+        self.assertEqual(cache.get('a', 1), 1)
+        cache.put('c', 3, 4, tag=1)
+        self.assertEqual(cache.get('b', 1), None)
+        self.assertEqual(cache.get('a', 1), 1)
+        self.assertEqual(cache.get('a', 2), None)
+        self.assertEqual(cache.get('a', 1), None)
+        self.assertFalse(cache.put('d', 4, 11))
+
+        stats = cache.stats()
+        self.assertEqual(stats['evictions'], 1)
+        self.assertEqual(stats['hits'], 2)
+        self.assertEqual(stats['misses'], 3)
+        self.assertEqual(stats['size'], 4)
+
+        cache.put('e', 5, 4, tag=1)
+        cache.resize(5)
+        self.assertEqual(cache.get('c', 1), None)
+        self.assertEqual(cache.get('e', 1), 5)
+        self.assertEqual(cache.stats()['size'], 4)
+
+    def test_02_get_cxml_cache(self):
+        """ Verify parsed cxml is reused until file changes """
+        first = cxml.get_cxml(self.filename)
+        self.assertTrue(first.cxml is not None)
+        self.assertTrue(cxml.get_cxml(self.filename) is first)
+
+        # lazy node request must not modify cached tree
+        first.get_lazy_node('test-module@2016-01-01')
+        self.assertEqual(len(first.getroot().findall('namespace')), 1)
+
+        time.sleep(0.01)
+        with open(self.filename, 'a') as f:
+            f.write('\n')
+        os.utime(self.filename, (time.time() + 5, time.time() + 5))
+        self.assertFalse(cxml.get_cxml(self.filename) is first)
+
+    def test_03_path_index(self):
+        """ Verify path index lookup with choice / case transparency """
+        module = cxml.Cxml(self.filename)
+        root = module.getroot()
+        self.assertTrue(module.find_node('test-module@2016-01-01') is root)
+
+        node = module.find_node('test-module/interfaces/interface/mode/routed/address')
+        self.assertEqual(node.get('name'), 'address')
+        self.assertTrue(module.find_node('test-module/interfaces/interface/address') is node)
+        self.assertTrue(module.find_node('test-module/interfaces/unknown') is None)
+
+        nodes = module.get_lazy_node('test-module@2016-01-01/interfaces/interface')
+        self.assertEqual([n.get('name') for n in nodes], ['name', 'description', 'mode'])
+
+        tree = module.get_lazy_subtree('test-module@2016-01-01/interfaces', 'interfaces/interface/mode')
+        mode = tree.find('node/node[@name="mode"]')
+        self.assertEqual(mode[0].get('path'), 'test-module@2016-01-01/interfaces/interface/mode/routed')
+
+    def test_04_lazy_tree(self):
+        """ Verify lazy tree expands all requested paths and sets values """
+        module = cxml.Cxml(self.filename)
+        pathvalues = [
+            ('test-module@2016-01-01/interfaces/interface/name', {'value': 'Gi0'}),
+            ('test-module@2016-01-01/interfaces/interface/mode/routed/address', {'value': '1.1.1.1'}),
+        ]
+        tree = module.get_lazy_tree(pathvalues)
+        interface = tree.find('node[@name="interfaces"]/node[@name="interface"]')
+        self.assertEqual(interface.find('node[@name="name"]').get('value'), 'Gi0')
+        self.assertEqual(interface.find('node[@name="description"]').get('value'), None)
+
+        address = interface.find('node[@name="mode"]/node[@name="routed"]/node[@name="address"]')
+        self.assertEqual(address.get('value'), '1.1.1.1')
+        self.assertEqual(len(tree.findall('.//node[@type="__yang_placeholder"]')), 0)
+
+        # lean mode and overlay give same nodes as lazy node requests
+        overlay = {'': {'covered': 'true'}, 'interfaces': {'covered': 'true'},
+                   'interfaces/interface/name': {'owner': 'team-a'}}
+        tree = module.get_lazy_tree(pathvalues, lean=True, overlay=overlay)
+        self.assertEqual(tree.get('covered'), 'true')
+        for parent in tree.iter('node'):
+            children = [c for c in parent if c.get('type') != '__yang_placeholder']
+            if not children:
+                continue
+            nodes = module.get_lazy_node(parent.get('path'), add_ns=False, lean=True, overlay=overlay)
+            for child, node in zip(children, nodes):
+                attrib = dict(child.attrib)
+                attrib.pop('value', None)
+                self.assertEqual(attrib, dict(node.attrib))
+        interfaces = tree.find('node[@name="interfaces"]')
+        self.assertEqual(interfaces.get('has_description'), 'true')
+        self.assertEqual(interfaces.get('description'), None)
+        self.assertEqual(interfaces.find('node/node[@name="name"]').get('owner'), 'team-a')
+
+    def test_05_compiled_schema(self):
+        """ Verify binary compiled schema matches cxml """
+        self.assertTrue(cxb.load(self.filename) is None)
+        self.assertEqual(cxb.compile_cxb(self.filename), cxb.cxb_path(self.filename))
+
+        schema = cxb.load(self.filename)
+        module = cxml.Cxml(self.filename)
+        for element in module.getroot().iter('node'):
+            path = [element.get('name')]
+            for parent in element.iterancestors():
+                path.insert(0, parent.get('name'))
+            node = schema.find('/'.join(path))
+            self.assertEqual(schema.attrib(node), dict(element.attrib))
+            desc = element.find('description')
+            self.assertEqual(schema.description(node), desc.text if desc is not None else '')
+            self.assertEqual(len(schema.children(node)), len(element.findall('node')))
+
+        self.assertEqual(schema.namespaces(), [('tm', 'test-module', 'false', 'urn:test-module')])
+        self.assertEqual(schema.get(0, 'prefix'), 'tm')
+        self.assertEqual(schema.parent(0), -1)
+        schema.close()
+
+        # module is loaded from compiled schema without parsing cxml
+        loaded = cxml.Cxml(self.filename)
+        self.assertTrue(loaded._tree is None)
+        paths = ['test-module@2016-01-01',
+                 'test-module@2016-01-01/interfaces',
+                 'test-module@2016-01-01/interfaces/interface',
+                 'test-module@2016-01-01/interfaces/interface/mode/routed']
+
+        def canonical(root):
+            # attribute order and whitespace of parsed cxml are not kept
+            for e in root.iter():
+                e.tail = None
+            return ET.tostring(root, method='c14n')
+
+        for path in [''] + paths:
+            for depth, lean in [(1, False), (3, True)]:
+                self.assertEqual(canonical(loaded.get_lazy_node(path, depth=depth, lean=lean)),
+                                 canonical(module.get_lazy_node(path, depth=depth, lean=lean)))
+        self.assertEqual(loaded.get_namespaces(), module.get_namespaces())
+        self.assertEqual(loaded.get_digest(), module.get_digest())
+        self.assertEqual(loaded.get_description(paths[1]), 'Interface configuration')
+        self.assertTrue(loaded._tree is None)
+        self.assertTrue(loaded.find_node(paths[2]) is not None)
+
+        # truncated artifact is rejected and its mapping released
+        target = cxb.cxb_path(self.filename)
+        with open(target, 'r+b') as f:
+            f.truncate(8)
+        closed = []
+
+        class Schema(cxb.CompiledSchema):
+            def close(self):
+                closed.append(self)
+                super(Schema, self).close()
+
+        self.assertRaises(struct.error, Schema, target)
+        self.assertEqual(len(closed), 1)
+        self.assertTrue(closed[0]._map is None)
+        self.assertTrue(cxb.load(self.filename) is None)
+
+    @override_settings(CXML_PARTIAL_SIZE=0)
+    def test_06_partial_loading(self):
+        """ Verify partially loaded module returns same lazy nodes """
+        full = cxml.Cxml(self.filename)
+        self.assertTrue(full.cxml is not None)
+
+        self.assertTrue(cxml.build_offsets(self.filename) is not None)
+        partial = cxml.Cxml(self.filename)
+        self.assertTrue(partial._tree is None)
+
+        paths = ['test-module@2016-01-01',
+                 'test-module@2016-01-01/interfaces',
+                 'test-module@2016-01-01/interfaces/interface',
+                 'test-module@2016-01-01/interfaces/interface/mode',
+                 'test-module@2016-01-01/interfaces/interface/mode/routed']
+        for path in paths:
+            self.assertEqual(ET.tostring(partial.get_lazy_node(path)),
+                             ET.tostring(full.get_lazy_node(path)))
+        self.assertEqual(partial.get_namespaces(), full.get_namespaces())
+        self.assertEqual(partial.get_digest(), full.get_digest())
+        self.assertTrue(partial._tree is None)
+
+        # full parse of a cached partial module is charged at file size
+        cached = cxml.get_cxml(self.filename)
+        size = cxml.get_cache_stats()['size']
+        self.assertTrue(cached.getroot() is not None)
+        self.assertEqual(cxml.get_cache_stats()['size'],
+                         size - partial._partial.cost() + os.path.getsize(self.filename))
+
+        # stale offsets are not used
+        os.utime(self.filename, (time.time() + 5, time.time() + 5))
+        self.assertTrue(cxml.Cxml(self.filename)._tree is not None)
+
+    def test_07_store(self):
+        """ Verify compiled modules are shared through content addressed store """
+        store_path = ServerSettings.store_path
+        ServerSettings.store_path = staticmethod(lambda: os.path.join(self.tempdir, 'store'))
+        try:
+            yangfile = os.path.join(self.tempdir, 'test-module@2016-01-01.yang')
+            depfile = os.path.join(self.tempdir, 'test-types.yang')
+            for name in [yangfile, depfile]:
+                with open(name, 'w') as f:
+                    f.write('module %s {}' % os.path.basename(name))
+
+            digest = store.content_hash(yangfile, [depfile])
+            self.assertEqual(store.content_hash(yangfile, [depfile, depfile]), digest)
+            self.assertNotEqual(store.content_hash(yangfile, []), digest)
+            self.assertTrue(store.lookup(digest) is None)
+
+            self.assertTrue(store.add(digest, self.filename))
+            self.assertTrue(store.is_reference(self.filename))
+            self.assertEqual(os.path.realpath(self.filename), os.path.realpath(store.lookup(digest)))
+
+            # second user refers to same stored module
+            other = os.path.join(self.tempdir, 'other')
+            os.mkdir(other)
+            otherfile = os.path.join(other, 'test-module@2016-01-01.xml')
+            self.assertTrue(store.link(digest, otherfile))
+            self.assertTrue(cxml.get_cxml(self.filename) is cxml.get_cxml(otherfile))
+            self.assertEqual(cxml.get_cxml(otherfile).modulename, 'test-module@2016-01-01')
+        finally:
+            ServerSettings.store_path = store_path
+
+    def test_08_depth(self):
+        """ Verify multi-level lazy node expansion within node budget """
+        module = cxml.Cxml(self.filename)
+        base = 'test-module@2016-01-01'
+        placeholder = 'node[@type="__yang_placeholder"]'
+
+        nodes = module.get_lazy_node(base, depth=3)
+        interface = nodes.find('node[@name="interfaces"]/node[@name="interface"]')
+        self.assertEqual([n.get('name') for n in interface], ['name', 'description', 'mode'])
+        self.assertTrue(interface.find('node[@name="mode"]/' + placeholder) is not None)
+        self.assertEqual(len(nodes.findall('.//' + placeholder)), 1)
+
+        with self.settings(LAZY_NODE_BUDGET=2):
+            nodes = module.get_lazy_node(base, depth=3)
+            interface = nodes.find('node[@name="interfaces"]/node[@name="interface"]')
+            self.assertEqual(interface[0].get('type'), '__yang_placeholder')
+
+        tree = module.get_lazy_subtree(base + '/interfaces', 'interfaces/interface', depth=2)
+        mode = tree.find('node/node[@name="mode"]')
+        self.assertEqual(mode[0].get('name'), 'routed')
+        self.assertEqual(mode[0][0].get('type'), '__yang_placeholder')
+
+        # partially loaded module expands the same way
+        cxml.build_offsets(self.filename)
+        with self.settings(CXML_PARTIAL_SIZE=0):
+            partial = cxml.Cxml(self.filename)
+            for path in [base, base + '/interfaces']:
+                self.assertEqual(ET.tostring(partial.get_lazy_node(path, depth=4)),
+                                 ET.tostring(module.get_lazy_node(path, depth=4)))
+
+    def test_09_lean_descriptions(self):
+        """ Verify lean lazy nodes and batched description lookup """
+        module = cxml.Cxml(self.filename)
+        base = 'test-module@2016-01-01'
+        node = module.get_lazy_node(base, lean=True).find('node')
+        self.assertEqual(node.get('has_description'), 'true')
+        self.assertEqual(node.get('description'), None)
+        self.assertEqual(module.get_lazy_node(base).find('node').get('description'), 'Interface configuration')
+
+        paths = [base + '/interfaces', base + '/interfaces/interface', base + '/unknown']
+        expected = [(paths[0], 'Interface configuration'), (paths[1], ''), (paths[2], None)]
+        self.assertEqual(cxml.get_descriptions(self.filename, paths), expected)
+        cxb.compile_cxb(self.filename)
+        self.assertEqual(cxml.get_descriptions(self.filename, paths), expected)
+
+    def test_10_json(self):
+        """ Verify compact json encoding round-trips with xml """
+        def canonical(e):
+            return (e.tag, sorted(e.attrib.items()), e.text, [canonical(c) for c in e])
+
+        module = cxml.Cxml(self.filename)
+        tree = module.get_lazy_subtree('test-module@2016-01-01', 'test-module@2016-01-01/interfaces',
+                                       depth=2)
+        tree.append(ET.Element('node', {'n': 'escaped', 'c': 'x', 'path': 'other/path'}))
+        text = jsonxml.dumps(tree)
+        self.assertEqual(canonical(jsonxml.loads(text)), canonical(tree))
+        self.assertTrue('"path"' not in text and 'Loading' not in text)
+
+        response = json.loads(Response.success('search', 'ok', xml=tree, fmt='json'))
+        self.assertEqual(response['success'], 'ok')
+        self.assertEqual(canonical(jsonxml.decode(response['data'])), canonical(tree))
+
+    def test_11_search_index(self):
+        """ Verify indexed search matches iterator scan """
+        paths = [path for path, _ in cxml.CxmlIterator(self.filename)]
+        self.assertTrue(pathindex.load_index(self.filename) is not None)
+        self.assertTrue(os.path.exists(pathindex.index_path(self.filename)))
+
+        index = pathindex.load_index(self.filename)
+        for query in ['interface', 'face/int', 'mode/routed/', 'test-module', 'ame', '/', 'none']:
+            self.assertEqual(index.search(query), [p for p in paths if query in p])
+
+    def test_12_complete(self):
+        """ Verify ranked prefix completion of next path segment """
+        trie = complete.get_trie(self.filename)
+        self.assertTrue(complete.get_trie(self.filename) is trie)
+
+        result = trie.complete(['interfaces'], 'inter', 10)
+        self.assertEqual(result, [('interface', 'test-module@2016-01-01/interfaces/interface', 'list', 'read-write')])
+
+        result = trie.complete(['interfaces', 'interface'], '', 10)
+        self.assertEqual([r[0] for r in result], ['mode', 'name', 'description'])
+
+        # prefix matches rank before names containing prefix
+        result = trie.complete(['interfaces', 'interface'], 'de', 10)
+        self.assertEqual([r[0] for r in result], ['description', 'mode'])
+        result = trie.complete(['interfaces', 'interface'], 'e', 1)
+        self.assertEqual([r[0] for r in result], ['description'])
+        self.assertEqual(trie.complete(['unknown'], '', 10), [])
+
+    def test_13_workers(self):
+        """ Verify pool results are ordered and submission stops early """
+        tasks = [(i,) for i in range(20)]
+        for processes in [0, 2]:
+            with self.settings(WORKER_PROCESSES=processes):
+                self.assertEqual(list(workers.imap(_square, tasks)), [i * i for i in range(20)])
+
+                results = workers.imap(_square, tasks, window=3)
+                self.assertEqual([next(results) for _ in range(2)], [0, 1])
+                results.close()
+
+        # pool is rebuilt when number of processes changes
+        pools = []
+        for processes in [2, 3, 3]:
+            with self.settings(WORKER_PROCESSES=processes):
+                pools.append(workers.get_pool())
+                budget = cxml._cxml_cache.budget
+                for in_worker, worker_budget in workers.imap(_worker_state, tasks):
+                    self.assertTrue(in_worker)
+                    self.assertEqual(worker_budget, budget // processes)
+        self.assertFalse(pools[0] is pools[1])
+        self.assertTrue(pools[1] is pools[2])
+        with self.settings(WORKER_PROCESSES=0):
+            self.assertTrue(workers.get_pool() is None)
+        self.assertTrue(workers._pool is None)
+        self.assertFalse(workers.in_worker())
+
+        index = pathindex.load_index(self.filename)
+        self.assertEqual(len(index.search('interface', 2)), 2)
+
+    def test_14_iterator(self):
+        """ Verify iterator options and pruning of excluded prefixes """
+        with open(self.filename, 'w') as f:
+            f.write('<node name="m" prefix="m" type="module">'
+                    '<node name="a" type="container">'
+                    '<node name="l" type="list" key="k"><node name="k" type="leaf"/>'
+                    '<node name="ip:v4" type="container"><node name="y" type="leaf"/></node>'
+                    '<node name="x:foo" type="container"><node name="x:bar" type="leaf"/></node>'
+                    '<node name="z" type="leaf"/></node></node></node>')
+
+        def paths(**options):
+            options = dict((k.replace('_', '-'), v) for k, v in options.items())
+            return [p for p, _ in cxml.CxmlIterator(self.filename, options=options)]
+
+        self.assertEqual(paths(), ['m/a', 'm/a/l', 'm/a/l/k', 'm/a/l/ip:v4', 'm/a/l/ip:v4/y',
+                                   'm/a/l/x:foo', 'm/a/l/x:foo/x:bar', 'm/a/l/z'])
+        self.assertEqual(paths(include_prefixes=['ip']), ['m/a/l/ip:v4', 'm/a/l/ip:v4/y'])
+        self.assertEqual(paths(include_prefixes=['ip'], include_default=True, include_keys=True),
+                         ['m/a', 'm/a/l[k]', 'm/a/l[k]/k', 'm/a/l[k]/ip:v4', 'm/a/l[k]/ip:v4/y', 'm/a/l[k]/z'])
+        self.assertEqual(paths(include_prefixes=['ip'], include_default=True, add_root_prefix=True),
+                         ['m/m:a', 'm/m:a/m:l', 'm/m:a/m:l/m:k', 'm/m:a/m:l/ip:v4', 'm/m:a/m:l/ip:v4/m:y',
+                          'm/m:a/m:l/m:z'])
+
+        # no recursion when most nodes are rejected
+        with open(self.filename, 'w') as f:
+            f.write('<node name="m" prefix="m" type="module">%s</node>'
+                    % ''.join('<node name="n%d" type="leaf"/>' % i for i in range(5000)))
+        self.assertEqual(paths(include_prefixes=['ip']), [])
+
+    def test_15_search_modes(self):
+        """ Verify ranked regex, glob, fuzzy and token search """
+        paths = [path for path, _ in cxml.CxmlIterator(self.filename)]
+        index = pathindex.load_index(self.filename)
+
+        # trigram narrowing agrees with vocabulary scan
+        for piece in ['interface', 'ame', 'nterf', 'xyz', 'na']:
+            self.assertEqual(index.tokens_containing(piece),
+                             [tid for tid, token in enumerate(index.tokens) if piece in token])
+
+        def rank(query, mode, limit=None):
+            return [path for _, path in index.rank(query, mode, limit)]
+
+        self.assertEqual(sorted(rank('n.me$', 'regex')), sorted(p for p in paths if p.endswith('/name')))
+        self.assertEqual(sorted(rank('(?i)ADDRESS', 'regex')), [p for p in paths if p.endswith('address')])
+        self.assertEqual(sorted(rank('*/interface/*', 'glob')), sorted(p for p in paths if '/interface/' in p))
+        self.assertEqual(rank('intrface/adress', 'fuzzy'), [p for p in paths if p.endswith('/address')])
+        self.assertEqual(rank('xyzzy', 'fuzzy'), [])
+        self.assertEqual(rank('routed address', 'token'), [p for p in paths if p.endswith('/address')])
+        self.assertEqual(rank('test module', 'token', 1), ['test-module/interfaces'])
+
+        # segment exact match beats substring, then shorter paths
+        result = index.rank('interface', 'fuzzy')
+        self.assertEqual(result[0][1], 'test-module/interfaces/interface')
+        self.assertTrue(result[0][0] > result[1][0])
+        self.assertEqual(rank('interface', 'fuzzy', 2), [p for _, p in result[:2]])
+        self.assertRaises(Exception, index.rank, '(', 'regex')
+
+    def test_16_text_search(self):
+        """ Verify full text search with field filters """
+        index = pathindex.load_index(self.filename)
+        self.assertEqual(index.text['description']['configuration'], [1])
+
+        def rank(query):
+            return sorted(path for _, path in index.rank(query, 'text'))
+
+        base = 'test-module/interfaces'
+        self.assertEqual(rank('Configuration'), [base])
+        self.assertEqual(rank('string type:leaf'), [base + '/interface/description',
+                                                    base + '/interface/mode/routed/address',
+                                                    base + '/interface/name'])
+        self.assertEqual(rank('type:list access:read-write'), [base + '/interface'])
+        self.assertEqual(rank('key:name'), [base + '/interface'])
+        self.assertEqual(rank('configuration type:leaf'), [])
+        self.assertEqual(rank('unknown:string'), [])
+
+        # type and access filters match whole value
+        filename = os.path.join(self.tempdir, 'lists.xml')
+        with open(filename, 'w') as f:
+            f.write('<node name="lists" prefix="l" type="module">'
+                    '<node access="read-only" datatype="string" name="one" type="leaf"/>'
+                    '<node access="read-write" datatype="string" name="many" type="leaf-list"/>'
+                    '</node>')
+        lists = pathindex.load_index(filename)
+        self.assertEqual([p for _, p in lists.rank('type:leaf', 'text')], ['lists/one'])
+        self.assertEqual([p for _, p in lists.rank('type:Leaf-List', 'text')], ['lists/many'])
+        self.assertEqual([p for _, p in lists.rank('access:read', 'text')], [])
+        self.assertEqual([p for _, p in lists.rank('string access:read-write', 'text')], ['lists/many'])
+
+        # old index artifacts are rebuilt
+        with open(pathindex.index_path(self.filename), 'w') as f:
+            f.write(json.dumps({'size': os.path.getsize(self.filename)}))
+        pathindex._index_cache.clear()
+        self.assertEqual(len(pathindex.load_index(self.filename).text), len(pathindex.FIELDS))
+
+    def test_17_search_cache(self):
+        """ Verify search results are cached per module set generation """
+        calls = []
+
+        def _search(username, query, limit, offset, mode):
+            calls.append(query)
+            response = ET.Element('result')
+            ET.SubElement(response, 'path').text = query
+            return True, response
+
+        cwd = os.getcwd()
+        saved = search._search
+        os.chdir(self.tempdir)
+        search._search = _search
+        try:
+            self.assertEqual(ModuleAdmin.get_generation('tester'), '0')
+            generation = ModuleAdmin.bump_generation('tester')
+            self.assertEqual(ModuleAdmin.get_generation('tester'), generation)
+            self.assertTrue(generation.startswith('1-'))
+
+            for _ in range(2):
+                rc, result = search.search('tester', 'interface', 10, 0, 'fuzzy')
+                self.assertEqual(result.find('path').text, 'interface')
+            self.assertEqual(calls, ['interface'])
+
+            search.search('tester', 'interface', 10, 0, 'regex')
+            self.assertEqual(len(calls), 2)
+
+            # model change starts a new generation
+            self.assertTrue(ModuleAdmin.bump_generation('tester').startswith('2-'))
+            search.search('tester', 'interface', 10, 0, 'fuzzy')
+            self.assertEqual(len(calls), 3)
+
+            with self.settings(SEARCH_CACHE_ENTRY_SIZE=10):
+                search.search('tester', 'big', 10, 0, None)
+                search.search('tester', 'big', 10, 0, None)
+            self.assertEqual(calls[3:], ['big', 'big'])
+        finally:
+            search._search = saved
+            os.chdir(cwd)
+
+    def test_18_xpath_tree(self):
+        """ Verify xpath tree lookup returns matched node """
+        xpaths = ['m/a/b', 'm/a/c', 'm/d', 'm/a/b/e']
+        tree = XPathTree('/', None)
+        for xpath in xpaths:
+            tree.insert(xpath, {'covered': 'true'})
+        bulk = XPathTree('/', None)
+        bulk.bulk_insert(sorted(xpaths), {'covered': 'true'})
+
+        for t in [tree, bulk, pickle.loads(pickle.dumps(bulk, pickle.HIGHEST_PROTOCOL))]:
+            self.assertEqual(t.search('m/a/b').name, 'b')
+            self.assertEqual(t.search('m/a/b/e').name, 'e')
+            self.assertEqual(t.search('m/a').attrib, {'covered': 'true'})
+            self.assertTrue(t.search('m/a/x') is None)
+            self.assertTrue(t.search('m/d/x') is None)
+            self.assertTrue(t.search('') is None)
+            self.assertEqual(sorted(t.search('m/a').children), ['b', 'c'])
+
+    def test_19_annotation_layers(self):
+        """ Verify annotation layers are applied while lazy nodes are created """
+        directory = os.path.join(self.tempdir, 'data', 'annotation')
+        os.makedirs(directory)
+        with open(os.path.join(directory, 'covered.json'), 'w') as f:
+            json.dump({'annotate': {'covered': 'true'},
+                       'data': ['test-module/interfaces/interface/name']}, f)
+        with open(os.path.join(directory, 'owner.json'), 'w') as f:
+            json.dump({'propagate': False, 'annotate': {'owner': 'core'},
+                       'data': {'test-module@2016-01-01/interfaces': {},
+                                'test-module/interfaces/interface/name': {'owner': 'mgmt'}}}, f)
+
+        with self.settings(BASE_DIR=self.tempdir):
+            self.assertEqual(sorted(annotations.get_layers()), ['covered', 'owner'])
+            overlay = annotations.get_overlay('test-module@2016-01-01')
+            self.assertEqual(overlay['interfaces'], {'covered': 'true', 'owner': 'core'})
+            self.assertEqual(overlay['interfaces/interface'], {'covered': 'true'})
+            self.assertEqual(overlay['interfaces/interface/name'], {'covered': 'true', 'owner': 'mgmt'})
+            self.assertTrue(annotations.get_overlay('other') is None)
+            self.assertTrue(annotations.get_overlay('test-module', ['unknown']) is None)
+
+            module = cxml.Cxml(self.filename)
+            base = 'test-module@2016-01-01/interfaces'
+            tree = module.get_lazy_node(base, depth=2, overlay=overlay)
+            node = tree.find('node')
+            self.assertEqual((node.get('name'), node.get('covered'), node.get('owner')),
+                             ('interface', 'true', None))
+            name = node.find('node[@name="name"]')
+            self.assertEqual((name.get('covered'), name.get('owner')), ('true', 'mgmt'))
+            self.assertTrue(node.find('node[@name="description"]').get('covered') is None)
+
+            overlay = annotations.get_overlay('test-module', ['owner'])
+            self.assertEqual(sorted(overlay), ['interfaces', 'interfaces/interface/name'])
+            self.assertTrue(annotations.get_overlay('test-module', ['owner']) is overlay)
+
+            version = annotations.get_annotation_version(['owner'])
+            self.assertTrue(version.startswith('owner:'))
+            self.assertNotEqual(version, annotations.get_annotation_version())
+
+    def test_20_ingest_annotation(self):
+        """ Verify streamed annotation layer matches compiled layer file """
+        directory = os.path.join(self.tempdir, 'data', 'annotation')
+        os.makedirs(directory)
+        xpaths = ['test-module/interfaces/interface/name', 'test-module@2016-01-01/interfaces',
+                  'other/a/b']
+        with open(os.path.join(directory, 'covered.json'), 'w') as f:
+            json.dump({'annotate': {'covered': 'true'}, 'data': xpaths}, f)
+
+        with self.settings(BASE_DIR=self.tempdir):
+            expected = annotations.get_overlay('test-module')
+            lines = [json.dumps({'annotate': {'covered': 'true'}}), '',
+                     json.dumps(xpaths[0]), xpaths[1], json.dumps({'xpath': xpaths[2], 'annotate': {'x': '1'}})]
+            self.assertEqual(annotations.ingest('covered', iter(lines)), (3, 2))
+            self.assertTrue(os.path.isdir(annotations.get_layers()['covered']))
+            self.assertEqual(sorted(os.listdir(os.path.join(directory, 'covered.d'))),
+                             ['layer.json', 'other.json', 'test-module.json'])
+            self.assertEqual(annotations.get_overlay('test-module'), expected)
+            self.assertEqual(annotations.get_overlay('other')['a/b'], {'covered': 'true', 'x': '1'})
+
+            # re-ingest replaces layer, through management command
+            source = os.path.join(self.tempdir, 'owner.jsonl')
+            with open(source, 'w') as f:
+                f.write('test-module/interfaces\n')
+            call_command('ingestannotation', '--layer=covered', '--file=' + source,
+                         '--annotate=owner=core', '--no-propagate', stdout=StringIO())
+            self.assertEqual(annotations.get_overlay('test-module'), {'interfaces': {'owner': 'core'}})
+            self.assertTrue(annotations.get_overlay('other') is None)
+            self.assertRaises(ValueError, annotations.ingest, '../covered', iter([]))
+            self.assertEqual([n for n in os.listdir(directory) if n.startswith('.')], [])
+
+    def test_21_netconf_payload(self):
+        """ Verify pruned RPC payload generation """
+        tree = ET.parse(self.filename).getroot()
+        request = ET.fromstring(
+            '<payload operation="edit-config"><keyvalue>'
+            '<node path="test-module/interfaces/interface/mode/routed/address">10.0.0.1</node>'
+            '<node path="test-module/interfaces/interface" option="delete"/>'
+            '<node path="test-module/interfaces/interface/name">eth0</node>'
+            '<node path="test-module/interfaces/interface/name">eth1</node>'
+            '<node path="test-module/interfaces/unknown">x</node>'
+            '</keyvalue></payload>')
+        module = netconf.parseRequest(request)['test-module']
+        rpc, parent = netconf.build_rpc(request, 'edit-config')
+        netconf.gen_module_payload(tree, 'test-module', module, 'edit-config', parent)
+        self.assertEqual(ET.tostring(parent), '<config xmlns:xc="%s" xmlns="%s">'
+                                              '<interfaces xmlns="urn:test-module">'
+                                              '<interface xc:operation="delete">'
+                                              '<name>eth0</name>'
+                                              '<address>10.0.0.1</address>'
+                                              '</interface>'
+                                              '</interfaces>'
+                                              '</config>' % ((netconf.rpc_xmlns,) * 2))
+
+        kv = netconf.KeyValueMap(module.get_keyvalues())
+        self.assertTrue('test-module/interfaces/interface/mode' in kv.prefixes)
+        self.assertFalse('test-module/interfaces/interface/description' in kv.prefixes)
+        # values of a path are popped in request order
+        self.assertEqual(netconf.pop_keyvalue(kv, 'test-module/interfaces/interface/name', 'get')[0], 'eth0')
+        self.assertEqual(netconf.pop_keyvalue(kv, 'test-module/interfaces/interface/name', 'get')[0], 'eth1')
+        self.assertFalse(netconf.pop_keyvalue(kv, 'test-module/interfaces/interface/name', 'get')[2])
+
+    def test_22_netconf_rpc_element(self):
+        """ Verify RPC element envelope and namespaces """
+        from explorer.utils.ncparse import NetconfParser
+        tree = ET.parse(self.filename).getroot()
+        request = ET.fromstring(
+            '<payload operation="edit-config" target="running" err-option="stop-on-error"><keyvalue>'
+            '<node path="test-module/interfaces/interface/name">a&lt;b</node>'
+            '<node path="test-module/interfaces/interface/description">tm:ident</node>'
+            '</keyvalue></payload>')
+        module = netconf.parseRequest(request)['test-module']
+        rpc, parent = netconf.build_rpc(request, 'edit-config')
+        netconf.gen_module_payload(tree, 'test-module', module, 'edit-config', parent)
+
+        parser = NetconfParser(rpc)
+        self.assertEqual(parser.get_operation(), 'edit-config')
+        self.assertEqual(parser.get_datastore(), 'running')
+        self.assertEqual(parser.get_error_option(), 'stop-on-error')
+        self.assertTrue(parser.get_data() is parent)
+        # no commit for running datastore
+        self.assertEqual(len(rpc), 1)
+
+        interface = parent[0][0]
+        self.assertEqual(interface.tag, '{urn:test-module}interface')
+        # values are escaped, identity prefix is declared on the leaf
+        self.assertEqual(interface[0].text, 'a<b')
+        self.assertEqual(interface[1].nsmap['tm'], 'urn:test-module')
+        reparsed = ET.fromstring(ET.tostring(rpc))
+        self.assertEqual(ET.tostring(reparsed, method='c14n'), ET.tostring(rpc, method='c14n'))
+
+        rpc, parent = netconf.build_rpc(request, 'get-config')
+        self.assertEqual(NetconfParser(rpc).get_datastore(), 'running')
+        self.assertEqual(parent.tag, '{%s}filter' % netconf.rpc_xmlns)
+        rpc, parent = netconf.build_rpc(request, '')
+        self.assertTrue(parent is rpc)
+
+    def test_23_rpc_skeleton(self):
+        """ Verify RPC skeletons are reused for requests of same shape """
+        def request(name, address, option='delete'):
+            return ET.fromstring(
+                '<payload operation="edit-config"><keyvalue>'
+                '<node path="test-module/interfaces/interface" option="%s"/>'
+                '<node path="test-module/interfaces/interface/mode/routed/address">%s</node>'
+                '<node path="test-module/interfaces/interface/name">%s</node>'
+                '</keyvalue></payload>' % (option, address, name))
+
+        cwd = os.getcwd()
+        os.chdir(self.tempdir)
+        try:
+            cxmldir = ServerSettings.cxml_path('tester')
+            os.makedirs(cxmldir)
+            shutil.copy(self.filename, cxmldir)
+            netconf._skeleton_cache.clear()
+            hits = lambda: netconf.get_cache_stats()['hits']
+            start = hits()
+
+            netconf.gen_netconf('tester', request('eth0', '10.0.0.1'), '')
+            rpc = netconf.gen_netconf('tester', request('eth1', ''), '')
+            self.assertEqual(hits(), start + 1)
+            interface = rpc[0][1][0][0]
+            self.assertEqual(interface[0].text, 'eth1')
+            self.assertEqual(interface[1].text, None)
+
+            # filled skeleton is same as a generated rpc
+            rpc = netconf.gen_netconf('tester', request('a&amp;b', '10.0.0.2'), '')
+            netconf._skeleton_cache.clear()
+            generated = netconf.gen_netconf('tester', request('a&amp;b', '10.0.0.2'), '')
+            self.assertEqual(ET.tostring(rpc), ET.tostring(generated))
+
+            # options are part of shape
+            start = hits()
+            rpc = netconf.gen_netconf('tester', request('eth0', '10.0.0.1', 'replace'), '')
+            self.assertEqual(hits(), start)
+            self.assertEqual(rpc[0][1][0][0].get('{%s}operation' % netconf.rpc_xmlns), 'replace')
+
+            # module change invalidates skeleton
+            with open(os.path.join(cxmldir, os.path.basename(self.filename)), 'a') as f:
+                f.write('\n')
+            netconf.gen_netconf('tester', request('eth0', '10.0.0.1', 'replace'), '')
+            self.assertEqual(hits(), start)
+        finally:
+            os.chdir(cwd)
+
+    def test_24_rpc_bulk(self):
+        """ Verify table driven bulk RPC generation """
+        template = ET.fromstring(
+            '<payload operation="edit-config" target="running"><keyvalue>'
+            '<node path="test-module/interfaces/interface/name" column="name"/>'
+            '<node path="test-module/interfaces/interface/description">uplink</node>'
+            '<node path="test-module/interfaces/interface/mode/routed/address" column="address"/>'
+            '</keyvalue></payload>')
+        csvtable = netconf.parse_table(u'name,address\neth0,10.0.0.1\neth1,\n"eth,2",10.0.0.3\n')
+        self.assertEqual(csvtable['name'], [u'eth0', u'eth1', u'eth,2'])
+        jsontable = netconf.parse_table('{"name": ["eth0", "eth1", "eth,2"], "address": ["10.0.0.1", null, "10.0.0.3"]}')
+        self.assertEqual(jsontable, csvtable)
+        self.assertRaises(ValueError, netconf.parse_table, 'name,address\neth0\n')
+        self.assertRaises(ValueError, netconf.parse_table, '{"name": ["eth0"], "address": []}')
+
+        cwd = os.getcwd()
+        os.chdir(self.tempdir)
+        try:
+            cxmldir = ServerSettings.cxml_path('tester')
+            os.makedirs(cxmldir)
+            shutil.copy(self.filename, cxmldir)
+
+            rpcs = netconf.gen_netconf_bulk('tester', template, csvtable, 2)
+            self.assertEqual(len(rpcs), 2)
+            entries = [rpc[0][1][0] for rpc in rpcs]
+            self.assertEqual([len(interfaces) for interfaces in entries], [2, 1])
+            self.assertEqual([i.find('{urn:test-module}name').text for i in entries[0]], ['eth0', 'eth1'])
+            self.assertEqual(entries[0][1][1].text, 'uplink')
+
+            # an entry is same as generated for a single row request
+            single = ET.fromstring(
+                '<payload operation="edit-config" target="running"><keyvalue>'
+                '<node path="test-module/interfaces/interface/name">eth,2</node>'
+                '<node path="test-module/interfaces/interface/description">uplink</node>'
+                '<node path="test-module/interfaces/interface/mode/routed/address">10.0.0.3</node>'
+                '</keyvalue></payload>')
+            rpc = netconf.gen_netconf('tester', single, '')
+            self.assertEqual(ET.tostring(rpcs[1], method='c14n'), ET.tostring(rpc, method='c14n'))
+
+            template[0][0].set('column', 'unknown')
+            self.assertRaises(ValueError, netconf.gen_netconf_bulk, 'tester', template, csvtable, 2)
+        finally:
+            os.chdir(cwd)
+
+    def test_25_rpc_batch_task(self):
+        """ Verify batch RPC generation task """
+        def payload(name):
+            return ('<payload format="xpath" operation="edit-config"><keyvalue>'
+                    '<node path="test-module/interfaces/interface/name">%s</node>'
+                    '</keyvalue></payload>' % name)
+
+        cwd = os.getcwd()
+        os.chdir(self.tempdir)
+        try:
+            cxmldir = ServerSettings.cxml_path('tester')
+            os.makedirs(cxmldir)
+            shutil.copy(self.filename, cxmldir)
+
+            payloads = [(i, payload('eth%d' % i)) for i in range(4)] + [(4, '<payload')]
+            # workers resolve module paths in their working directory
+            self._reset_pool()
+            for processes in [0, 2]:
+                with self.settings(WORKER_PROCESSES=processes):
+                    tasks = [('tester', payloads[:2]), ('tester', payloads[2:])]
+                    results = [r for rs in workers.imap(netconf.gen_netconf_task, tasks) for r in rs]
+                    self.assertEqual([key for key, _, _ in results], range(5))
+                    for key, rpc, error in results[:4]:
+                        expected = netconf.gen_netconf('tester', ET.fromstring(payload('eth%d' % key)), '')
+                        # elements are serialized only across process boundary
+                        self.assertEqual(isinstance(rpc, basestring), processes > 1)
+                        self.assertEqual(rpc if processes > 1 else ET.tostring(rpc), ET.tostring(expected))
+                        self.assertEqual(error, '')
+                    self.assertEqual(results[4][1], None)
+                    self.assertTrue(results[4][2])
+        finally:
+            self._reset_pool()
+            os.chdir(cwd)
+
+    def _reset_pool(self):
+        workers.terminate()
+
+    def test_26_netconf_augment(self):
+        """ Verify augmented nodes are generated in their namespace """
+        filename = os.path.join(self.tempdir, 'm.xml')
+        with open(filename, 'w') as f:
+            f.write('<node name="m" prefix="m" type="module">'
+                    '<namespace import="false" module="m" prefix="m">urn:m</namespace>'
+                    '<namespace import="true" module="aug" prefix="aug">urn:aug</namespace>'
+                    '<node name="top" type="container">'
+                    '<node name="aug:extra" type="container">'
+                    '<node name="aug:val" type="leaf"/>'
+                    '</node></node></node>')
+        tree = ET.parse(filename).getroot()
+        request = ET.fromstring('<payload operation="get-config"><keyvalue>'
+                                '<node path="m/top/aug:extra/aug:val">5</node>'
+                                '</keyvalue></payload>')
+        module = netconf.parseRequest(request)['m']
+        rpc, parent = netconf.build_rpc(request, 'get-config')
+        netconf.gen_module_payload(tree, 'm', module, 'get-config', parent)
+        expected = ET.fromstring('<top xmlns="urn:m" xmlns:aug="urn:aug">'
+                                 '<aug:extra><aug:val>5</aug:val></aug:extra></top>')
+        self.assertEqual(ET.tostring(parent[0], method='c14n'), ET.tostring(expected, method='c14n'))
+        self.assertEqual(parent[0].nsmap, {None: 'urn:m', 'aug': 'urn:aug'})
+        self.assertEqual(parent[0][0][0].tag, '{urn:aug}val')
+
+    def test_27_rpc_bulk_identities(self):
+        """ Verify identity prefixes of every table row are declared """
+        template = ET.fromstring(
+            '<payload operation="edit-config" target="running"><keyvalue>'
+            '<node path="ids/ifs/if/name" column="name"/>'
+            '<node path="ids/ifs/if/type" column="type"/>'
+            '</keyvalue></payload>')
+        table = netconf.parse_table('name,type\neth0,eth:ethernet\nlo0,lo:loopback\n')
+
+        cwd = os.getcwd()
+        os.chdir(self.tempdir)
+        try:
+            cxmldir = ServerSettings.cxml_path('tester')
+            os.makedirs(cxmldir)
+            with open(os.path.join(cxmldir, 'ids.xml'), 'w') as f:
+                f.write('<node name="ids" prefix="ids" type="module">'
+                        '<namespace import="false" module="ids" prefix="ids">urn:ids</namespace>'
+                        '<namespace import="true" module="eth-types" prefix="eth">urn:eth</namespace>'
+                        '<namespace import="true" module="loop-types" prefix="lo">urn:lo</namespace>'
+                        '<node name="ifs" type="container">'
+                        '<node key="name" name="if" type="list">'
+                        '<node is_key="true" name="name" type="leaf"/>'
+                        '<node name="type" type="leaf"/>'
+                        '</node></node></node>')
+
+            rpc = netconf.gen_netconf_bulk('tester', template, table, 10)[0]
+            rpc = ET.fromstring(ET.tostring(rpc))
+            types = rpc.findall('.//{urn:ids}type')
+            self.assertEqual([t.text for t in types], ['eth:ethernet', 'lo:loopback'])
+            self.assertEqual([t.nsmap.get(t.text.split(':')[0]) for t in types], ['urn:eth', 'urn:lo'])
+        finally:
+            os.chdir(cwd)
+
+    def test_28_is_browsable(self):
+        """ Verify browsable check agrees with and without compiled schema """
+        cwd = os.getcwd()
+        os.chdir(self.tempdir)
+        try:
+            cxmldir = ServerSettings.cxml_path('tester')
+            os.makedirs(cxmldir)
+            modules = {
+                'leaf-module': ('<node name="leaf-module" prefix="lm" type="module">'
+                                '<namespace import="false" module="leaf-module" prefix="lm">urn:lm</namespace>'
+                                '<node access="read-write" datatype="string" name="name" type="leaf"/>'
+                                '</node>', True),
+                'empty-module': ('<node name="empty-module" prefix="em" type="module">'
+                                 '<namespace import="false" module="empty-module" prefix="em">urn:em</namespace>'
+                                 '</node>', False),
+            }
+            for name, (text, browsable) in modules.items():
+                filename = os.path.join(cxmldir, name + '.xml')
+                with open(filename, 'w') as f:
+                    f.write(text)
+                self.assertEqual(is_browsable('tester', name), browsable)
+                cxb.compile_cxb(filename)
+                self.assertTrue(cxb.load(filename) is not None)
+                self.assertEqual(is_browsable('tester', name), browsable)
+        finally:
+            os.chdir(cwd)
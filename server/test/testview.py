@@ -299,3 +299,48 @@ class UsersTestCase(TestCase):
 
         print("Test: request_handler PASSED")
 
+
+    def test_07_generate_handler(self):
+        """ Verify bulk generation accepts POST with CSRF checks enabled """
+
+        client = Client(enforce_csrf_checks=True)
+        response = client.post('/explorer/login/', {'username': 'demo', 'password': 'demo123', 'action': 'login'})
+        self.assertTrue(response.status_code == 200)
+
+        payload = '''
+<payload version="3" protocol="netconf" format="xpath" operation="edit-config" target="running">
+    <keyvalue>
+        <node path="ietf-interfaces@2013-12-23/interfaces/interface/name" column="name"/>
+        <node path="ietf-interfaces@2013-12-23/interfaces/interface/description" column="description"/>
+    </keyvalue>
+</payload>'''
+        table = 'name,description\n' + ''.join('Gi0/%d,port %d\n' % (i, i) for i in range(3))
+
+        response = client.post('/explorer/generate', {'mode': 'gen-rpc-bulk', 'payload': payload,
+                                                      'table': table, 'chunk': '2'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue('<response type="gen-rpc-bulk">' in response.content)
+        self.assertTrue('entries="3"' in response.content)
+        self.assertEqual(response.content.count('<edit-config>'), 2)
+        for i in range(3):
+            self.assertTrue('<name>Gi0/%d</name>' % i in response.content)
+
+        payloads = '<payloads>%s</payloads>' % ''.join(
+            payload.replace(' column="name"/>', '>Gi0/%d</node>' % i)
+                   .replace(' column="description"/>', '>port %d</node>' % i) for i in range(3))
+        # a failing restconf payload only fails its own entry
+        payloads = payloads.replace('</payloads>',
+                                    '<payload protocol="restconf" format="xpath" operation="get">'
+                                    '<keyvalue><node path="unknown-module/interfaces"/></keyvalue>'
+                                    '</payload></payloads>')
+        response = client.post('/explorer/generate', {'mode': 'gen-rpc-batch', 'payloads': payloads})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue('<response type="gen-rpc-batch">' in response.content)
+        self.assertEqual(response.content.count('<edit-config>'), 3)
+        self.assertEqual(response.content.count('error='), 1)
+        self.assertTrue('<entry name="3" error=' in response.content)
+        for i in range(3):
+            self.assertTrue('<entry name="%d"><rpc' % i in response.content)
+            self.assertTrue('<name>Gi0/%d</name>' % i in response.content)
+
+        print("Test: generate_handler PASSED")